@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import subprocess
+from typing import Dict, List, Optional
+
+# Metrics where a bigger number is better (rates and retrieval quality); everything else is a cost
+HIGHER_IS_BETTER = ("_per_s", "recall", "mrr", "ndcg", "hit_rate")
+
+
+def _leaf(name: str) -> str:
+    return name.rsplit(".", 1)[-1]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def environment_info() -> Dict:
+    """Where and on what the numbers were measured, so baselines aren't compared blindly."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    """Nested results -> {'scenario.stage.metric': value} for the numeric leaves."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def _seconds(name: str, values: Dict[str, float]) -> Optional[float]:
+    """Duration behind a time or rate metric ('x.seconds', 'x.embed_ms', or the 'seconds' next to 'x.pages_per_s')."""
+    if name.endswith("_ms"):
+        return values[name] / 1000
+    if name.endswith("seconds"):
+        return values[name]
+    return values.get(name.rsplit(".", 1)[0] + ".seconds")
+
+
+def compare(
+    current: Dict,
+    baseline: Dict,
+    threshold: float = 0.10,
+    metrics: Optional[List[str]] = None,
+    min_seconds: float = 0.005
+) -> Dict:
+    """
+    Compare two benchmark result sets metric by metric.
+
+    Args:
+        current: Results of this run ('scenarios' section)
+        baseline: Saved results to compare against ('scenarios' section)
+        threshold: Relative change counted as a regression/improvement (0.10 = 10%)
+        metrics: Only compare metrics whose name contains one of these (default: all)
+        min_seconds: Skip timings (and rates derived from them) shorter
+            than this in both runs; sub-millisecond steps are mostly noise
+
+    Returns:
+        Dict with 'regressions', 'improvements' and 'unchanged' lists of
+        {'metric', 'baseline', 'current', 'change'} (change is relative;
+        positive means better)
+    """
+    now, before = flatten(current), flatten(baseline)
+    report = {"regressions": [], "improvements": [], "unchanged": []}
+
+    for name in sorted(set(now) & set(before)):
+        if metrics and not any(part in _leaf(name) for part in metrics):
+            continue
+        old, new = before[name], now[name]
+        if old == 0:
+            continue
+        durations = (_seconds(name, before), _seconds(name, now))
+        if None not in durations and max(durations) < min_seconds:
+            continue
+        change = (new - old) / abs(old)
+        if not any(part in _leaf(name) for part in HIGHER_IS_BETTER):
+            change = -change
+        entry = {"metric": name, "baseline": old, "current": new, "change": round(change, 4)}
+        if change <= -threshold:
+            report["regressions"].append(entry)
+        elif change >= threshold:
+            report["improvements"].append(entry)
+        else:
+            report["unchanged"].append(entry)
+    return report
+
+
+def print_comparison(report: Dict) -> None:
+    for label in ("regressions", "improvements"):
+        entries = report[label]
+        print(f"{label.capitalize()}: {len(entries)}")
+        for entry in entries:
+            print(f"  {entry['metric']}: {entry['baseline']:g} -> {entry['current']:g} ({entry['change']:+.1%})")
+    print(f"Unchanged: {len(report['unchanged'])}")
+
+
+def save_results(results: Dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_results(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
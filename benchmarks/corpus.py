@@ -0,0 +1,138 @@
+import random
+from typing import List
+
+# Small fixed vocabulary: realistic word lengths, deterministic for a seed
+_WORDS = (
+    "system data model query index vector document section policy user account service "
+    "request response network storage cache latency throughput memory process thread "
+    "configuration security access control report analysis result value parameter method "
+    "function module component interface protocol message event error status version "
+    "release update support customer product feature price plan refund invoice payment "
+    "contract term period notice clause party agreement liability warranty schedule "
+    "the a of to and in for with on by from at as is are be this that which each"
+).split()
+
+
+def _paragraph(rng: random.Random, chars: int) -> str:
+    words, size = [], 0
+    while size < chars:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    sentences, sentence = [], []
+    for word in words:
+        sentence.append(word)
+        if len(sentence) >= rng.randint(8, 18):
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            sentence = []
+    if sentence:
+        sentences.append(" ".join(sentence).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def make_pages(
+    pages: int,
+    chars_per_page: int = 3000,
+    duplication: float = 0.0,
+    seed: int = 0,
+    paragraph_chars: int = 600
+) -> List[str]:
+    """
+    Generate page texts of a controlled size.
+
+    Args:
+        pages: Number of pages
+        chars_per_page: Approximate characters per page
+        duplication: Share of paragraphs (0..1) copied from earlier ones,
+            like boilerplate headers and repeated clauses in real documents
+        seed: Random seed; the same arguments always give the same corpus
+        paragraph_chars: Approximate paragraph length
+
+    Returns:
+        List[str]: One text per page, paragraphs separated by blank lines
+    """
+    rng = random.Random(seed)
+    written: List[str] = []
+    result = []
+    for page in range(pages):
+        paragraphs, size = [], 0
+        while size < chars_per_page:
+            if written and rng.random() < duplication:
+                paragraph = rng.choice(written)
+            else:
+                paragraph = _paragraph(rng, min(paragraph_chars, chars_per_page))
+                written.append(paragraph)
+            paragraphs.append(paragraph)
+            size += len(paragraph) + 2
+        result.append(f"Page {page + 1}\n\n" + "\n\n".join(paragraphs))
+    return result
+
+
+def write_txt(path: str, pages: List[str]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(pages))
+
+
+def _wrap(text: str, width: int = 95) -> List[str]:
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+    return lines
+
+
+def _escape_pdf(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[str], font_size: int = 8) -> None:
+    """
+    Write a text PDF (Helvetica, one PDF page per page text) without any
+    PDF library, so corpora can be generated where only the readers are
+    installed. Lines that don't fit the page height are cut off.
+    """
+    leading = font_size + 2
+    max_lines = int((842 - 80) / leading)
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_numbers = []
+    for text in pages:
+        lines = _wrap(text)[:max_lines]
+        ops = [f"BT /F1 {font_size} Tf {leading} TL 40 802 Td"]
+        ops.extend(f"({_escape_pdf(line)}) '" for line in lines)
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_number = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_number
+        )
+        page_numbers.append(len(objects))
+
+    kids = " ".join(f"{number} 0 R" for number in page_numbers)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(bytes(out))
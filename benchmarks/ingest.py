@@ -0,0 +1,227 @@
+"""
+Offline ingestion benchmark.
+
+Generates synthetic TXT/PDF corpora of a controlled size and times the
+ingestion path piece by piece: validate_txt_or_pdf, VectorDB.chunk_text,
+VectorDB.add_document and the full /upload route (through FastAPI's
+TestClient, no server or API key needed). Each scenario runs in its own
+subprocess and scratch directory, so peak RSS is per scenario and the
+project's rag_engine.db, chroma_db/ and data/ are never touched.
+
+    python -m benchmarks.ingest --pages 10 50 --output baseline.json
+    python -m benchmarks.ingest --pages 10 50 --compare baseline.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, List
+
+from .baseline import compare, environment_info, load_results, peak_rss_mb, print_comparison, save_results
+from .corpus import make_pages, write_pdf, write_txt
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Only costs and rates are compared between runs (not counts like chunks/pages)
+COMPARED_METRICS = ("seconds", "_per_s", "_ms", "_mb")
+
+
+def _stage_totals(snapshot: Dict) -> Dict[str, float]:
+    """STAGE_SECONDS snapshot -> total seconds per stage (over models/providers)."""
+    totals: Dict[str, float] = {}
+    for labels, (_, seconds) in snapshot.items():
+        totals[labels[0]] = totals.get(labels[0], 0.0) + seconds
+    return totals
+
+
+def _stages_ms(before: Dict, after: Dict) -> Dict[str, float]:
+    start, end = _stage_totals(before), _stage_totals(after)
+    return {
+        f"{name}_ms": round((seconds - start.get(name, 0.0)) * 1000, 2)
+        for name, seconds in sorted(end.items())
+        if seconds - start.get(name, 0.0) > 0
+    }
+
+
+def _summary(runs: List[Dict], pages: int) -> Dict:
+    """Median of the repeats, with pages/s and chunks/s derived from it."""
+    seconds = statistics.median(run["seconds"] for run in runs)
+    result = {"seconds": round(seconds, 6), "pages_per_s": round(pages / seconds, 2) if seconds else 0.0}
+    if "chunks" in runs[0]:
+        result["chunks"] = runs[0]["chunks"]
+        result["chunks_per_s"] = round(runs[0]["chunks"] / seconds, 2) if seconds else 0.0
+    if "stages" in runs[0]:
+        names = {name for run in runs for name in run["stages"]}
+        result["stages"] = {
+            name: round(statistics.median(run["stages"].get(name, 0.0) for run in runs), 2)
+            for name in sorted(names)
+        }
+    return result
+
+
+def run_scenario(scenario: Dict) -> Dict:
+    """
+    Time one corpus through every ingestion stage. Runs inside the worker
+    process, with the scratch directory as its working directory.
+
+    Args:
+        scenario: 'format', 'pages', 'chars_per_page', 'duplication',
+            'seed' and 'repeat'
+
+    Returns:
+        Dict of per-stage results plus the corpus size and peak RSS
+    """
+    # Imported here: main.py opens rag_engine.db and chroma_db/ relative to the cwd on import
+    from fastapi.testclient import TestClient
+    from src import main
+    from src.metrics import STAGE_SECONDS
+    from src.utils import validate_txt_or_pdf
+    from src.vectordb import VectorDB
+
+    main.UPLOAD_DIR = os.path.join(os.getcwd(), "uploads")
+    os.makedirs(main.UPLOAD_DIR, exist_ok=True)
+    client = TestClient(main.app)
+
+    fmt, pages, repeat = scenario["format"], scenario["pages"], scenario["repeat"]
+    page_texts = make_pages(pages, scenario["chars_per_page"], scenario["duplication"], scenario["seed"])
+    filename = f"corpus.{fmt}"
+    (write_pdf if fmt == "pdf" else write_txt)(filename, page_texts)
+
+    vector_db = VectorDB(collection_name="bench_ingest")
+    # Warm-up: first encode pays for lazy initialisation that isn't ingestion cost
+    vector_db.add_document(page_texts[0], document_id="warmup")
+
+    runs = {"validate": [], "chunk": [], "add_document": [], "upload": []}
+    text = ""
+    for i in range(repeat):
+        start = time.perf_counter()
+        text = validate_txt_or_pdf(filename, filename)
+        runs["validate"].append({"seconds": time.perf_counter() - start})
+
+        start = time.perf_counter()
+        chunks = vector_db.chunk_text(text)
+        runs["chunk"].append({"seconds": time.perf_counter() - start, "chunks": len(chunks)})
+
+        before = STAGE_SECONDS.snapshot()
+        start = time.perf_counter()
+        added = vector_db.add_document(text, document_id=f"bench_{i}")
+        runs["add_document"].append({
+            "seconds": time.perf_counter() - start,
+            "chunks": added,
+            "stages": _stages_ms(before, STAGE_SECONDS.snapshot()),
+        })
+
+        # Different bytes every repeat, or /upload would hit its duplicate-document shortcut
+        salted = f"upload_{i}_{uuid.uuid4().hex[:8]}.{fmt}"
+        salted_pages = [f"Run {uuid.uuid4().hex}\n\n{page_texts[0]}"] + page_texts[1:]
+        (write_pdf if fmt == "pdf" else write_txt)(salted, salted_pages)
+        before = STAGE_SECONDS.snapshot()
+        start = time.perf_counter()
+        with open(salted, "rb") as f:
+            response = client.post("/upload", files={"file": (salted, f)})
+        seconds = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f"/upload failed ({response.status_code}): {response.text}")
+        runs["upload"].append({
+            "seconds": seconds,
+            "chunks": response.json().get("chunk_count", 0),
+            "stages": _stages_ms(before, STAGE_SECONDS.snapshot()),
+        })
+
+    result = {name: _summary(stage_runs, pages) for name, stage_runs in runs.items()}
+    result["corpus"] = {
+        "pages": pages,
+        "characters": len(text),
+        "bytes": os.path.getsize(filename),
+    }
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def _scenario_name(scenario: Dict) -> str:
+    return (
+        f"{scenario['format']}_p{scenario['pages']}"
+        f"_c{scenario['chars_per_page']}_d{scenario['duplication']:g}"
+    )
+
+
+def _run_worker(scenario: Dict, keep: bool) -> Dict:
+    """Run one scenario in a fresh interpreter and scratch directory."""
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.ingest", "--worker", json.dumps(scenario)],
+            cwd=workdir, env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Scenario {_scenario_name(scenario)} failed:\n{proc.stderr[-4000:]}")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark document ingestion on synthetic corpora.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50], help="Corpus sizes in pages (PDF max 100)")
+    parser.add_argument("--chars-per-page", type=int, default=3000)
+    parser.add_argument("--duplication", type=float, default=0.2, help="Share of repeated paragraphs (0-1)")
+    parser.add_argument("--formats", nargs="+", choices=["txt", "pdf"], default=["txt", "pdf"])
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per scenario (median is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON (e.g. to save a new baseline)")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative change counted as a regression")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directories")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_scenario(json.loads(args.worker))))
+        return 0
+
+    scenarios = {}
+    for fmt in args.formats:
+        for pages in args.pages:
+            scenario = {
+                "format": fmt,
+                "pages": pages,
+                "chars_per_page": args.chars_per_page,
+                "duplication": args.duplication,
+                "seed": args.seed,
+                "repeat": max(1, args.repeat),
+            }
+            name = _scenario_name(scenario)
+            print(f"Running {name}...", file=sys.stderr)
+            scenarios[name] = _run_worker(scenario, args.keep)
+            upload = scenarios[name]["upload"]
+            print(
+                f"  upload {upload['seconds']:.3f}s, {upload['pages_per_s']} pages/s, "
+                f"{upload.get('chunks_per_s', 0)} chunks/s, peak RSS {scenarios[name]['peak_rss_mb']} MB",
+                file=sys.stderr
+            )
+
+    results = {"benchmark": "ingest", "environment": environment_info(), "scenarios": scenarios}
+    if args.output:
+        save_results(results, args.output)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        baseline = load_results(args.compare)
+        report = compare(scenarios, baseline.get("scenarios", {}), args.threshold, COMPARED_METRICS)
+        print_comparison(report)
+        return 1 if report["regressions"] else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+Query-path load harness.
+
+Drives /query and /messages through the FastAPI app in-process (httpx's
+ASGI transport, no server or sockets) at a configurable concurrency, with
+the local fake LLM provider standing in for the real one. The provider's
+latency is fixed and known, so throughput and latency changes come from
+our own code: retrieval, caching, admission, database writes, tracing.
+
+    python -m benchmarks.load --concurrency 1 8 32 --requests 200 --output load-baseline.json
+    python -m benchmarks.load --concurrency 1 8 32 --requests 200 --compare load-baseline.json
+
+Runs in a scratch directory, so the project's rag_engine.db, chroma_db/
+and data/ are never touched.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import statistics
+from typing import Dict, List
+
+from .baseline import compare, environment_info, load_results, peak_rss_mb, print_comparison, save_results
+from .corpus import make_pages, write_txt
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPARED_METRICS = ("_per_s", "_ms", "_mb")
+
+_TOPICS = (
+    "refund policy", "payment terms", "account access", "data retention", "service limits",
+    "notice period", "liability", "support hours", "security controls", "price changes",
+)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered), math.ceil(q / 100 * len(ordered))) - 1)]
+
+
+def make_questions(count: int, seed: int = 0) -> List[str]:
+    """Distinct, deterministic questions (distinct so the answer caches stay cold unless asked)."""
+    rng = random.Random(seed)
+    return [
+        f"What does the document say about {rng.choice(_TOPICS)} in case {i}?"
+        for i in range(count)
+    ]
+
+
+def _span_totals(timings: Dict) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for span in timings.get("spans", []):
+        totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+    return totals
+
+
+def _answer_call_ms(timings: Dict) -> float:
+    """Duration of the LLM call that produced the answer (not lost hedges, failed attempts or aux calls)."""
+    return sum(
+        span["duration_ms"] for span in timings.get("spans", [])
+        if span["name"] == "llm_call" and span.get("outcome") == "success"
+    )
+
+
+async def _drive(client, endpoint: str, session_id: str, questions: List[str], concurrency: int, use_cache: bool) -> Dict:
+    """Send every question with `concurrency` requests in flight; return latency/stage stats."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for question in questions:
+        queue.put_nowait(question)
+    latencies, statuses, stages, answer_calls = [], {}, [], []
+
+    async def worker():
+        while True:
+            try:
+                question = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if endpoint == "/messages":
+                body = {"session_id": session_id, "content": question, "use_cache": use_cache}
+            else:
+                body = {"session_id": session_id, "question": question, "use_cache": use_cache}
+            start = time.perf_counter()
+            response = await client.post(endpoint, params={"timings": "true"}, json=body)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(elapsed_ms)
+                timings = response.json().get("timings") or {}
+                stages.append(_span_totals(timings))
+                answer_calls.append(_answer_call_ms(timings))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    names = sorted({name for spans in stages for name in spans})
+    # Everything except the provider call that answered: what this codebase adds per request
+    overhead = [latency - call_ms for latency, call_ms in zip(latencies, answer_calls)]
+    return {
+        "requests": len(questions),
+        "succeeded": len(latencies),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "wall_seconds": round(wall, 3),
+        "requests_per_s": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency": {
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "mean_ms": round(statistics.mean(latencies), 2) if latencies else 0.0,
+        },
+        "overhead": {
+            "p50_ms": round(percentile(overhead, 50), 2),
+            "p95_ms": round(percentile(overhead, 95), 2),
+        },
+        "stages": {
+            name: {
+                "mean_ms": round(statistics.mean(spans.get(name, 0.0) for spans in stages), 2),
+                "p95_ms": round(percentile([spans.get(name, 0.0) for spans in stages], 95), 2),
+            }
+            for name in names
+        },
+    }
+
+
+async def run_load(args) -> Dict:
+    """Upload a synthetic document, select the fake LLM, then run every endpoint x concurrency scenario."""
+    import httpx
+    from src import main
+
+    main.UPLOAD_DIR = os.path.join(os.getcwd(), "uploads")
+    os.makedirs(main.UPLOAD_DIR, exist_ok=True)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        response = await client.post("/api-key", json={"api_key": "fake-key", "model": "fake"})
+        response.raise_for_status()
+
+        write_txt("corpus.txt", make_pages(args.pages, seed=args.seed))
+        with open("corpus.txt", "rb") as f:
+            response = await client.post("/upload", files={"file": ("corpus.txt", f)})
+        response.raise_for_status()
+        session_id = response.json()["session_id"]
+
+        scenarios = {}
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                name = f"{endpoint.strip('/')}_c{concurrency}"
+                questions = make_questions(args.warmup + args.requests, seed=args.seed + len(scenarios))
+                await _drive(client, endpoint, session_id, questions[:args.warmup], concurrency, args.use_cache)
+                print(f"Running {name}...", file=sys.stderr)
+                scenarios[name] = await _drive(
+                    client, endpoint, session_id, questions[args.warmup:], concurrency, args.use_cache
+                )
+                result = scenarios[name]
+                print(
+                    f"  {result['requests_per_s']} req/s, p50 {result['latency']['p50_ms']} ms, "
+                    f"p95 {result['latency']['p95_ms']} ms, p99 {result['latency']['p99_ms']} ms, "
+                    f"overhead p50 {result['overhead']['p50_ms']} ms",
+                    file=sys.stderr
+                )
+    return scenarios
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test /query and /messages against a fake local LLM.")
+    parser.add_argument("--endpoints", nargs="+", choices=["/query", "/messages"], default=["/query", "/messages"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests before each scenario")
+    parser.add_argument("--use-cache", action="store_true", help="Let answers come from the caches")
+    parser.add_argument("--pages", type=int, default=20, help="Size of the synthetic document")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="Fake LLM time to first token")
+    parser.add_argument("--llm-tokens-per-s", type=float, default=0.0, help="Fake LLM token rate (0 = instant)")
+    parser.add_argument("--llm-response-tokens", type=int, default=60)
+    parser.add_argument("--output", help="Write results as JSON (e.g. to save a new baseline)")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative change counted as a regression")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    args = parser.parse_args(argv)
+
+    os.environ.update({
+        "FAKE_LLM_ENABLED": "true",
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_TOKENS_PER_S": str(args.llm_tokens_per_s),
+        "FAKE_LLM_RESPONSE_TOKENS": str(args.llm_response_tokens),
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    # main.py opens rag_engine.db and chroma_db/ relative to the cwd on import
+    sys.path.insert(0, REPO_ROOT)
+    cwd, workdir = os.getcwd(), tempfile.mkdtemp(prefix="rag-load-")
+    os.chdir(workdir)
+    try:
+        scenarios = asyncio.run(run_load(args))
+        rss = peak_rss_mb()
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "benchmark": "load",
+        "environment": environment_info(),
+        "config": {
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_tokens_per_s": args.llm_tokens_per_s,
+            "llm_response_tokens": args.llm_response_tokens,
+            "use_cache": args.use_cache,
+            "pages": args.pages,
+        },
+        "peak_rss_mb": rss,
+        "scenarios": scenarios,
+    }
+    if args.output:
+        save_results(results, args.output)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        baseline = load_results(args.compare)
+        report = compare(scenarios, baseline.get("scenarios", {}), args.threshold, COMPARED_METRICS)
+        print_comparison(report)
+        return 1 if report["regressions"] else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""
+Retrieval quality vs latency benchmark.
+
+Builds a labelled query set from a local corpus (each query is a sentence
+of the corpus with some of its words dropped; the chunks holding that
+sentence are the relevant ones), then indexes the corpus once per
+configuration and reports recall@k, MRR, index build time, index size on
+disk and query latency percentiles side by side.
+
+Swept: chunk size/overlap, HNSW parameters of the Chroma collection and
+the backend. Besides Chroma there is an exact (brute-force cosine)
+backend over the same embeddings: the quality ceiling that HNSW settings
+are traded against. n_results is covered by reporting recall at every k.
+
+    python -m benchmarks.retrieval --corpus handbook.pdf --chunking 1500:150 800:80 \\
+        --hnsw default max_neighbors=32,ef_construction=200,ef_search=100 --output retrieval.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List, Optional
+
+from .baseline import compare, environment_info, load_results, peak_rss_mb, print_comparison, save_results
+from .corpus import make_pages
+from .load import percentile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPARED_METRICS = ("recall", "mrr", "_ms", "seconds", "_mb")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def build_queries(text: str, count: int, keep: float = 0.6, seed: int = 0) -> List[Dict]:
+    """
+    Labelled queries from a corpus: a sentence that occurs exactly once,
+    with a share of its words dropped (order kept), so the query is close
+    to but not a copy of the text it should retrieve.
+
+    Args:
+        text: Corpus text
+        count: Number of queries (fewer if the corpus has fewer usable sentences)
+        keep: Share of each sentence's words kept in its query
+        seed: Random seed
+
+    Returns:
+        List of {'query', 'answer'} where 'answer' is the source sentence
+    """
+    sentences = [_normalize(s) for s in re.split(r"(?<=[.!?])\s+", text)]
+    seen: Dict[str, int] = {}
+    for sentence in sentences:
+        seen[sentence] = seen.get(sentence, 0) + 1
+    candidates = [s for s, n in seen.items() if n == 1 and 8 <= len(s.split()) <= 40]
+
+    rng = random.Random(seed)
+    rng.shuffle(candidates)
+    labelled = []
+    for sentence in candidates[:count]:
+        words = sentence.split()
+        kept = sorted(rng.sample(range(len(words)), max(4, int(len(words) * keep))))
+        labelled.append({"query": " ".join(words[i] for i in kept), "answer": sentence})
+    return labelled
+
+
+def is_relevant(chunk: str, answer: str) -> bool:
+    """True if the chunk holds the answer sentence, or most of it when a chunk boundary splits it."""
+    chunk = _normalize(chunk)
+    if answer in chunk:
+        return True
+    half = len(answer) // 2
+    for length in range(len(answer) - 1, half - 1, -1):
+        if chunk.endswith(answer[:length]) or chunk.startswith(answer[-length:]):
+            return True
+    return False
+
+
+def _score(retrieved: List[List[str]], queries: List[Dict], ks: List[int]) -> Dict:
+    ranks = []
+    for documents, item in zip(retrieved, queries):
+        rank = next((i + 1 for i, doc in enumerate(documents) if is_relevant(doc, item["answer"])), None)
+        ranks.append(rank)
+    total = len(queries) or 1
+    scores = {f"recall_at_{k}": round(sum(1 for r in ranks if r and r <= k) / total, 4) for k in ks}
+    scores["mrr"] = round(sum(1 / r for r in ranks if r) / total, 4)
+    return scores
+
+
+def _dir_size_mb(path: str) -> float:
+    size = 0
+    for root, _, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return round(size / (1024 * 1024), 3)
+
+
+def run_config(config: Dict) -> Dict:
+    """
+    Index the corpus with one configuration and evaluate every query.
+    Runs inside the worker process, in its own scratch directory.
+    """
+    # The retrieval cache would turn repeated timings into dictionary lookups
+    os.environ["RETRIEVAL_CACHE_MAX_ENTRIES"] = "0"
+    import numpy as np
+    from src.vectordb import VectorDB
+
+    with open(config["corpus"], "r", encoding="utf-8") as f:
+        text = f.read()
+    with open(config["queries"], "r", encoding="utf-8") as f:
+        queries = json.load(f)
+    ks = config["k"]
+    n_results = max(ks)
+
+    vector_db = VectorDB(
+        collection_name="bench_retrieval",
+        embedding_model=config.get("embedding_model"),
+        chunk_size=config["chunk_size"],
+        chunk_overlap=config["chunk_overlap"],
+        hnsw=config["hnsw"]
+    )
+    vector_db.encode_queries(["warm-up"])
+
+    start = time.perf_counter()
+    if config["backend"] == "exact":
+        chunks = vector_db.chunk_text(text)
+        matrix = np.asarray(vector_db.embedding_model.encode(chunks), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        chunk_count = len(chunks)
+    else:
+        chunk_count = vector_db.add_document(text, document_id="bench")
+    build_seconds = time.perf_counter() - start
+    index_mb = round(matrix.nbytes / (1024 * 1024), 3) if config["backend"] == "exact" else _dir_size_mb("./chroma_db")
+
+    retrieved, latencies, search_latencies = [], [], []
+    for item in queries:
+        start = time.perf_counter()
+        embedding = vector_db.encode_queries([item["query"]])
+        search_start = time.perf_counter()
+        if config["backend"] == "exact":
+            query = np.asarray(embedding[0], dtype=np.float32)
+            query /= np.linalg.norm(query) + 1e-12
+            top = np.argsort(-(matrix @ query))[:n_results]
+            documents = [chunks[i] for i in top]
+        else:
+            documents = vector_db.search(item["query"], n_results=n_results, query_embeddings=embedding).get("documents", [])
+        end = time.perf_counter()
+        latencies.append((end - start) * 1000)
+        search_latencies.append((end - search_start) * 1000)
+        retrieved.append(documents)
+
+    result = _score(retrieved, queries, ks)
+    result.update({
+        "chunks": chunk_count,
+        "build_seconds": round(build_seconds, 4),
+        "index_mb": index_mb,
+        "query_p50_ms": round(percentile(latencies, 50), 3),
+        "query_p95_ms": round(percentile(latencies, 95), 3),
+        "query_p99_ms": round(percentile(latencies, 99), 3),
+        "search_p50_ms": round(percentile(search_latencies, 50), 3),
+        "search_p95_ms": round(percentile(search_latencies, 95), 3),
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    return result
+
+
+def parse_hnsw(spec: str) -> Optional[Dict]:
+    """'max_neighbors=32,ef_search=100' -> {'max_neighbors': 32, 'ef_search': 100}; 'default' -> None (CHROMA_HNSW_* settings)."""
+    from src.vectordb import HNSW_KEYS
+
+    if spec == "default":
+        return None
+    params = {}
+    for item in spec.split(","):
+        key, _, value = item.partition("=")
+        key = key.strip()
+        if key not in HNSW_KEYS:
+            raise argparse.ArgumentTypeError(f"Unknown HNSW parameter {key!r} (expected one of {', '.join(HNSW_KEYS)})")
+        value = value.strip()
+        params[key] = value if key == "space" else (float(value) if "." in value else int(value))
+    return params
+
+
+def _config_name(config: Dict) -> str:
+    name = f"{config['backend']}_cs{config['chunk_size']}_co{config['chunk_overlap']}"
+    if config["hnsw"]:
+        name += "_" + "_".join(f"{key}{value}" for key, value in config["hnsw"].items())
+    return name
+
+
+def _run_worker(config: Dict, keep: bool) -> Dict:
+    workdir = tempfile.mkdtemp(prefix="rag-retrieval-")
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.retrieval", "--worker", json.dumps(config)],
+            cwd=workdir, env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Configuration {_config_name(config)} failed:\n{proc.stderr[-4000:]}")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def format_table(results: Dict[str, Dict], ks: List[int]) -> str:
+    columns = [f"recall_at_{k}" for k in ks] + [
+        "mrr", "chunks", "build_seconds", "index_mb", "query_p50_ms", "query_p95_ms", "query_p99_ms", "search_p50_ms",
+    ]
+    headers = ["config"] + [c.replace("recall_at_", "R@").replace("_seconds", "_s") for c in columns]
+    rows = [[name] + [f"{result[c]:g}" for c in columns] for name, result in results.items()]
+    widths = [max(len(row[i]) for row in [headers] + rows) for i in range(len(headers))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in [headers] + rows]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+
+def _load_corpus(args) -> str:
+    if args.corpus:
+        from src.utils import validate_txt_or_pdf
+        return validate_txt_or_pdf(os.path.basename(args.corpus), args.corpus)
+    return "\n\n".join(make_pages(args.pages, args.chars_per_page, duplication=0.0, seed=args.seed))
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare retrieval quality and latency across index configurations.")
+    parser.add_argument("--corpus", help="TXT or PDF to build queries from (default: synthetic)")
+    parser.add_argument("--pages", type=int, default=30, help="Synthetic corpus size in pages")
+    parser.add_argument("--chars-per-page", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=200, help="Labelled queries to generate")
+    parser.add_argument("--keep-words", type=float, default=0.6, help="Share of a sentence's words kept in its query")
+    parser.add_argument("--backends", nargs="+", choices=["chroma", "exact"], default=["chroma", "exact"])
+    parser.add_argument("--chunking", nargs="+", default=["1500:150", "800:80", "400:40"], help="size:overlap pairs")
+    parser.add_argument("--hnsw", nargs="+", type=parse_hnsw, default=[None],
+                        help="Chroma HNSW settings per run, e.g. default max_neighbors=32,ef_construction=200,ef_search=100")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10], help="Cut-offs for recall@k (n_results)")
+    parser.add_argument("--embedding-model", help="Embedding model (default: EMBEDDING_MODEL)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-queries", help="Write the labelled queries as JSON")
+    parser.add_argument("--output", help="Write results as JSON (e.g. to save a new baseline)")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Relative change counted as a regression")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directories")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_config(json.loads(args.worker))))
+        return 0
+
+    text = _load_corpus(args)
+    queries = build_queries(text, args.queries, args.keep_words, args.seed)
+    if not queries:
+        parser.error("The corpus has no usable sentences (8-40 words, occurring once) to build queries from")
+    if args.save_queries:
+        save_results(queries, args.save_queries)
+
+    inputs = tempfile.mkdtemp(prefix="rag-retrieval-inputs-")
+    corpus_path, queries_path = os.path.join(inputs, "corpus.txt"), os.path.join(inputs, "queries.json")
+    with open(corpus_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    save_results(queries, queries_path)
+
+    configs = []
+    for chunking in args.chunking:
+        size, _, overlap = chunking.partition(":")
+        for backend in args.backends:
+            # HNSW settings don't apply to exact search: one run per chunking
+            for hnsw in (args.hnsw if backend == "chroma" else [None]):
+                configs.append({
+                    "backend": backend,
+                    "chunk_size": int(size),
+                    "chunk_overlap": int(overlap or 0),
+                    "hnsw": hnsw,
+                    "k": sorted(set(args.k)),
+                    "embedding_model": args.embedding_model,
+                    "corpus": corpus_path,
+                    "queries": queries_path,
+                })
+
+    scenarios = {}
+    try:
+        for config in configs:
+            name = _config_name(config)
+            print(f"Running {name}...", file=sys.stderr)
+            scenarios[name] = _run_worker(config, args.keep)
+    finally:
+        shutil.rmtree(inputs, ignore_errors=True)
+
+    print(format_table(scenarios, sorted(set(args.k))), file=sys.stderr)
+
+    results = {
+        "benchmark": "retrieval",
+        "environment": environment_info(),
+        "config": {"corpus": args.corpus or f"synthetic:{args.pages}p", "queries": len(queries), "seed": args.seed},
+        "scenarios": scenarios,
+    }
+    if args.output:
+        save_results(results, args.output)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        baseline = load_results(args.compare)
+        report = compare(scenarios, baseline.get("scenarios", {}), args.threshold, COMPARED_METRICS)
+        print_comparison(report)
+        return 1 if report["regressions"] else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
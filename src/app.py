@@ -1,16 +1,33 @@
 import os
+import time
+import asyncio
+import logging
+import threading
 import traceback
+from collections import OrderedDict
+from typing import AsyncIterator, Iterator, List, Optional
 from dotenv import load_dotenv
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-from .vectordb import VectorDB
+from .vectordb import VectorDB, embed_queries
 from .utils import validate_txt_or_pdf
 from .database import RAGDatabase
+from .cache import history_digest, make_answer_cache_key, normalize_question, SemanticCache
+from .concurrency import SingleFlight, AdmissionRejected
+from .timing import StageTimer
+from .rewrite import REWRITE_PROMPT, RewriteCache, clean_rewrite, format_history, is_self_contained
+from .summary import NO_HISTORY, SUMMARY_PROMPT, build_prompt_history, clean_summary
+from .expansion import EXPANSION_PROMPT, expand_query, parse_expansions
+from .metrics import CACHE_LOOKUPS, stage
+from .tracing import annotate
+from .providers import ProviderPool, PROVIDER_KEY_ENV, client_key, default_model_for_key, get_llm_client, provider_for_model
 from langchain_openai import ChatOpenAI
 from langchain_groq import ChatGroq
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+logger = logging.getLogger(__name__)
+
 
 # FIX: Create data directory at project root (one level up from src/)
 # If app.py is in src/, this goes to project root
@@ -21,6 +38,13 @@ os.makedirs(DATA_DIR, exist_ok=True)
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(PROJECT_ROOT, ".env"))
 
+# Bump whenever the RAG prompt template changes so cached answers are not reused
+PROMPT_VERSION = "v2"
+
+def cached_history(history: Optional[str]) -> str:
+    """The prompt history answer cache keys depend on ('' when the prompt had none)."""
+    return "" if not history or history == NO_HISTORY else history
+
 def get_data_filepath():
     """
     FIX: Safely get the first file from data directory.
@@ -84,16 +108,69 @@ class RAGAssistant:
         # For backwards compatibility with Streamlit
         self.current_session_id = None
         self.current_collection_name = None
+
+        # Exact-match answer cache settings
+        self.answer_cache_enabled = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+        self.answer_cache_ttl = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+        self.answer_cache_max_entries = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+
+        # Semantic answer cache (paraphrases of earlier questions on the same document)
+        self.semantic_cache_enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        self.semantic_cache = SemanticCache(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            max_per_document=int(os.getenv("SEMANTIC_CACHE_MAX_PER_DOCUMENT", "256")),
+            max_documents=int(os.getenv("SEMANTIC_CACHE_MAX_DOCUMENTS", "1000")),
+        )
+
+        # Follow-up questions are condensed into standalone search queries using recent turns
+        self.query_rewrite_enabled = os.getenv("QUERY_REWRITE_ENABLED", "false").lower() == "true"
+        self.query_rewrite_turns = int(os.getenv("QUERY_REWRITE_HISTORY_TURNS", "3"))
+        self.rewrite_cache = RewriteCache(int(os.getenv("QUERY_REWRITE_CACHE_MAX_ENTRIES", "1024")))
+
+        # Conversation history in the prompt: rolling summary + recent turns within a token budget
+        self.history_enabled = os.getenv("CONVERSATION_HISTORY_ENABLED", "true").lower() == "true"
+        self.history_turns = int(os.getenv("CONVERSATION_HISTORY_TURNS", "3"))
+        self.history_max_tokens = int(os.getenv("CONVERSATION_HISTORY_MAX_TOKENS", "800"))
+        self.summary_every_turns = int(os.getenv("CONVERSATION_SUMMARY_EVERY_TURNS", "4"))
+        self.summary_max_words = int(os.getenv("CONVERSATION_SUMMARY_MAX_WORDS", "200"))
+        self._summarizing = set()
+        self._summarizing_lock = threading.Lock()
+
+        # Multi-query retrieval: sub-queries searched in one batch and fused with RRF
+        self.multi_query_enabled = os.getenv("MULTI_QUERY_ENABLED", "false").lower() == "true"
+        self.multi_query_max = int(os.getenv("MULTI_QUERY_MAX", "4"))
+        self.multi_query_llm = os.getenv("MULTI_QUERY_LLM", "false").lower() == "true"
+        self.multi_query_rrf_k = int(os.getenv("MULTI_QUERY_RRF_K", "60"))
+
+        # Default LLM fan-out for batch questions
+        self.batch_max_concurrency = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+        # Coalesce concurrent identical uploads (by file hash) and questions (by answer cache key)
+        self.ingest_flight = SingleFlight("ingest")
+        self.query_flight = SingleFlight("query")
+
+        # Post-response work (history and cache writes) scheduled by the async query path
+        self._background_tasks = set()
         
         # Create RAG prompt template
         self.prompt_template = ChatPromptTemplate.from_template(
             "Act as a helpful assistant. "
             "Use the following context STRICTLY to answer the question"
             "\nBe inside the scope of the provided context."
+            "\n\nConversation so far:\n{history}"
             "\n\nContext: {context}\n\nQuestion: {question}"
         )
+
+        # Primary LLM plus fallbacks, with timeouts, circuit breakers and hedging
+        self.providers = ProviderPool.from_env()
+        self._load_fallback_providers()
+
+        # Pools for per-request API keys, kept (LRU) so breaker and latency state outlive a request
+        self._key_pools: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._key_pools_lock = threading.Lock()
+        self._key_pools_max = int(os.getenv("LLM_CLIENT_POOL_MAX", "64"))
         
-        print("RAG Assistant initialized successfully (no LLM yet)")
+        logger.info("RAG Assistant initialized successfully (no LLM yet)")
 
     def _initialize_llm(self, require_api_key=True, model=None):
         """
@@ -105,13 +182,12 @@ class RAGAssistant:
                             If False, will return None if no API key is found.
             model: The specified model to use
         """
-        # Debug: Print available environment variables
-        print("Debug: Checking environment variables...")
-        print(f"OPENAI_API_KEY exists: {'OPENAI_API_KEY' in os.environ}")
-        print(f"GROQ_API_KEY exists: {'GROQ_API_KEY' in os.environ}")
-        print(f"GOOGLE_API_KEY exists: {'GOOGLE_API_KEY' in os.environ}")
-        print(f"API_KEY exists: {'API_KEY' in os.environ}")
-        print(f"Requested model: {model}")
+        # Debug: Log which API key variables are set
+        logger.debug(
+            "Checking environment variables: OPENAI_API_KEY=%s GROQ_API_KEY=%s GOOGLE_API_KEY=%s API_KEY=%s, requested model: %s",
+            'OPENAI_API_KEY' in os.environ, 'GROQ_API_KEY' in os.environ,
+            'GOOGLE_API_KEY' in os.environ, 'API_KEY' in os.environ, model
+        )
         
         groq_key = os.getenv("GROQ_API_KEY")
         openai_key = os.getenv("OPENAI_API_KEY")
@@ -120,8 +196,7 @@ class RAGAssistant:
         if os.getenv("GOOGLE_API_KEY"):
             model_name = os.getenv("GOOGLE_MODEL", "gemini-2.0-flash-exp")
             api_key = os.getenv("GOOGLE_API_KEY")
-            print(f"Using Google Gemini model: {model_name}")
-            print(f"API Key (first 5 chars): {api_key[:5]}...")  
+            logger.info("Using Google Gemini model: %s", model_name)
             return ChatGoogleGenerativeAI(
                 google_api_key=api_key,
                 model=model_name,
@@ -130,35 +205,28 @@ class RAGAssistant:
         elif groq_key:
             model_name = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
             api_key = os.getenv("GROQ_API_KEY")
-            print(f"Using Groq model: {model_name}")
-            print(f"API Key (first 5 chars): {api_key[:5]}...") 
+            logger.info("Using Groq model: %s", model_name)
             return ChatGroq(
                 api_key=api_key, model=model_name, temperature=0.1
             )
         elif openai_key:
             model_name = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
             api_key = os.getenv("OPENAI_API_KEY")
-            print(f"Using OpenAI model: {model_name}")
-            print(f"API Key (first 5 chars): {api_key[:5]}...") 
+            logger.info("Using OpenAI model: %s", model_name)
             return ChatOpenAI(
                 api_key=api_key, model=model_name, temperature=0.1
             )
         
         else:
-            print("No API keys found in environment variables")
-            print("Current .env file contents:")
-            try:
-                with open('.env', 'r') as f:
-                    print(f.read())
-            except:
-                print("Could not read .env file")
-                
+            # The .env file holds secrets, so only say where it was looked for
+            logger.warning("No API keys found in environment variables (.env: %s)", os.path.abspath(".env"))
+
             if require_api_key:
                 raise ValueError(
                     "No valid API key found. Please set one of: OPENAI_API_KEY, GROQ_API_KEY, GOOGLE_API_KEY, or API_KEY in your .env file"
                 )
             else:
-                print("Warning: No API key found. RAG functionality will be limited.")
+                logger.warning("No API key found. RAG functionality will be limited.")
                 return None
     
     def set_api_key(self, api_key: str, model: str = None):
@@ -173,64 +241,108 @@ class RAGAssistant:
         if model:
             self.current_model = model
         
-        # FIXED: Use model to determine the correct LLM initialization
-        if self.current_model:
-            if "gemini" in self.current_model.lower():
-                print(f"Setting Google Gemini API key for model: {self.current_model}")
-                self.llm = ChatGoogleGenerativeAI(
-                    google_api_key=api_key,
-                    model=self.current_model,
-                    temperature=0.1
-                )
-            elif "llama" in self.current_model.lower() or "groq" in self.current_model.lower():
-                print(f"Setting Groq API key for model: {self.current_model}")
-                self.llm = ChatGroq(
-                    api_key=api_key,
-                    model=self.current_model,
-                    temperature=0.1
-                )
-            elif "gpt" in self.current_model.lower():
-                print(f"Setting OpenAI API key for model: {self.current_model}")
-                self.llm = ChatOpenAI(
-                    api_key=api_key,
-                    model=self.current_model,
-                    temperature=0.1
-                )
-            else:
-                # Default to OpenAI
-                print(f"Setting generic API key with model: {self.current_model}")
-                self.llm = ChatOpenAI(
-                    api_key=api_key,
-                    model=self.current_model,
-                    temperature=0.1
-                )
-        else:
-            # FIXED: Fallback - try to determine from key format
-            if api_key.startswith("gsk_"):
-                print("Setting Groq API key")
-                self.llm = ChatGroq(
-                    api_key=api_key,
-                    model="llama-3.1-8b-instant",
-                    temperature=0.1
-                )
-            elif api_key.startswith("AIz"):
-                print("Setting Google API key")
-                self.llm = ChatGoogleGenerativeAI(
-                    google_api_key=api_key,
-                    model="gemini-2.0-flash-exp",
-                    temperature=0.1
-                )
-            else:
-                print("Setting OpenAI API key")
-                self.llm = ChatOpenAI(
-                    api_key=api_key,
-                    model="gpt-4o-mini",
-                    temperature=0.1
-                )
+        # Pooled client: the same key/model reuses its warm connections
+        llm = get_llm_client(api_key, self.current_model)
+        if llm is self.llm and self.chain is not None:
+            logger.debug("LLM already initialized for this key/model")
+            return
+        self.llm = llm
         
         # Recreate the chain with the new LLM
         self.chain = self.prompt_template | self.llm | StrOutputParser()
-        print("LLM initialized successfully")
+        logger.info("LLM initialized successfully")
+
+    def _load_fallback_providers(self):
+        """
+        Add the models listed in LLM_FALLBACK_MODELS as fallback providers.
+        Each uses its provider's key from the environment (e.g. GROQ_API_KEY);
+        models without a key are skipped.
+        """
+        for model in os.getenv("LLM_FALLBACK_MODELS", "").split(","):
+            model = model.strip()
+            if not model:
+                continue
+            api_key = os.getenv(PROVIDER_KEY_ENV[provider_for_model(model)])
+            if not api_key:
+                logger.warning("Skipping fallback model %s: no %s set", model, PROVIDER_KEY_ENV[provider_for_model(model)])
+                continue
+            self.add_fallback_provider(api_key, model)
+
+    def add_fallback_provider(self, api_key: str, model: str):
+        """
+        Register an LLM that is tried when the primary is slow or failing.
+
+        Args:
+            api_key: API key for the fallback provider
+            model: Model name (its provider is picked from the name)
+        """
+        llm = get_llm_client(api_key, model)
+        self.providers.add_fallback(llm, self.prompt_template | llm | StrOutputParser(), model)
+        logger.info("Fallback LLM registered: %s", model)
+
+    def _llm_pool(self) -> ProviderPool:
+        """Provider pool with the current primary LLM/chain in front."""
+        self.providers.set_primary(self.llm, self.chain, self._model_name())
+        return self.providers
+
+    def _resolve_llm(self, api_key: str = None, model: str = None):
+        """
+        Pick the LLM for one request.
+
+        Args:
+            api_key: Per-request API key; None uses the server's configured LLM
+            model: Model for the per-request key (default: guessed from the key)
+
+        Returns:
+            (ProviderPool, model_name), or (None, None) if no LLM is configured
+        """
+        if api_key:
+            model = model or default_model_for_key(api_key)
+            return self._key_pool(api_key, model), model
+        if not self.llm:
+            return None, None
+        return self._llm_pool(), self._model_name()
+
+    def _key_pool(self, api_key: str, model: str) -> ProviderPool:
+        """
+        Provider pool for a per-request key/model, reused across requests.
+        Per-request keys go straight to their provider, without the server's fallbacks.
+        """
+        llm = get_llm_client(api_key, model)
+        key = client_key(api_key, model)
+        with self._key_pools_lock:
+            entry = self._key_pools.get(key)
+            if entry is None:
+                entry = {"providers": ProviderPool.from_env(), "llm": None}
+                self._key_pools[key] = entry
+                while len(self._key_pools) > self._key_pools_max:
+                    self._key_pools.popitem(last=False)
+            self._key_pools.move_to_end(key)
+            # A new client (the old one was evicted from the client pool) gets a new chain
+            if entry["llm"] is not llm:
+                entry["providers"].set_primary(llm, self.prompt_template | llm | StrOutputParser(), model)
+                entry["llm"] = llm
+            return entry["providers"]
+
+    def key_pool_stats(self) -> List[dict]:
+        """Provider stats of the per-request key pools (key hashes only)."""
+        with self._key_pools_lock:
+            entries = list(self._key_pools.items())
+        return [
+            dict(entry["providers"].stats(), provider=key[0], model=key[1], key_hash=key[2])
+            for key, entry in entries
+        ]
+
+    @staticmethod
+    def _overloaded(error: AdmissionRejected) -> dict:
+        """Result returned when the LLM provider is saturated."""
+        return {"error": str(error), "status": "overloaded", "retry_after": error.retry_after}
+
+    def _model_name(self) -> str:
+        """Name of the active LLM model (also covers LLMs loaded from .env)."""
+        if self.current_model:
+            return self.current_model
+        return getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None) or "unknown"
     
 
     def upload_document(self, filepath: str) -> dict:
@@ -258,23 +370,38 @@ class RAGAssistant:
             
             # This will raise exceptions if PDF has issues
             try:
-                doc_text = load_document(filename, filepath) 
+                with stage("parse"):
+                    doc_text = load_document(filename, filepath)
             except Exception as load_error:
                 # Catch validation errors from validate_txt_or_pdf
                 return {"error": str(load_error), "status": "error"}
             
             doc_in_bytes = doc_text.encode("utf-8")
-            
-            result = db.process_file_upload(doc_in_bytes, filename)
+
+            def ingest():
+                with stage("db_write", provider="sqlite"):
+                    upload = db.process_file_upload(doc_in_bytes, filename)
+                if upload["was_processed"]:
+                    vector_db = VectorDB(collection_name=upload["collection_name"], document_id=upload["document_id"])
+                    upload["chunk_count"] = vector_db.add_document(doc_text, upload["document_id"])
+                    with stage("db_write", provider="sqlite"):
+                        db.update_chunk_count(upload["document_id"], upload["chunk_count"])
+                return upload
+
+            # Only one concurrent upload of the same content does the embedding
+            result, shared = self.ingest_flight.do(db.compute_checksum(doc_in_bytes), ingest)
+            if shared:
+                # The leader created the document; this caller still needs its own session
+                with stage("db_write", provider="sqlite"):
+                    result = db.process_file_upload(doc_in_bytes, filename)
             
             document_id = result["document_id"]
             session_id = result["session_id"]
             was_processed = result["was_processed"]
+            annotate(session_id=session_id, document_id=document_id, chunk_count=result.get("chunk_count"))
             
             if was_processed:
-                vector_db = VectorDB(collection_name=result["collection_name"])
-                chunk_count = vector_db.add_document(doc_text, document_id)
-                db.update_chunk_count(document_id, chunk_count)
+                chunk_count = result["chunk_count"]
 
                 self.current_session_id = session_id
                 self.current_collection_name = result["collection_name"]
@@ -290,6 +417,7 @@ class RAGAssistant:
             else:
                 doc_info = db.get_document_by_session(session_id)
                 chunk_count = doc_info["chunk_count"] if doc_info else 0
+                annotate(chunk_count=chunk_count)
 
                 self.current_session_id = session_id
                 self.current_collection_name = result["collection_name"]
@@ -311,117 +439,1125 @@ class RAGAssistant:
         finally:
             db.close()
 
-    def query(self, question: str, session_id: str = None, n_results: int = 3) -> dict:
+    def report_semantic_false_hit(self, session_id: str, entry_id: str) -> bool:
         """
-        Query the document (Works with both Streamlit and FastAPI).
+        Flag a semantic cache answer as wrong for its question.
 
         Args:
-            question: User's question
-            session_id: Optional session ID (for FastAPI stateless calls)
-                        If None, uses self.current_session_id (for Streamlit)
-            n_results: Number of relevant chunks to retrieve
+            session_id: Session that received the cached answer
+            entry_id: cache_entry_id from the query response
 
         Returns:
-            Dict containing the answer from the LLM or error message
+            bool: True if the entry was found and removed
         """
         db = RAGDatabase(self.db_path)
         db.connect()
-
         try:
-            if not self.llm:
-                return {"error": "No API key configured. Please add an api key to use the RAG functionality.","status":"error"}
-            
-            active_session_id = session_id or self.current_session_id
+            doc_info = db.get_document_by_session(session_id)
+        finally:
+            db.close()
 
-            if not active_session_id:
-                return {"error": "No active session. Need to upload a document first.", "status": "error"}
-            
+        if not doc_info:
+            return False
+        return self.semantic_cache.report_false_hit(doc_info["document_id"], entry_id)
+
+    def _begin_query(
+        self,
+        question: str,
+        session_id: str,
+        n_results: int,
+        use_cache: bool,
+        api_key: str = None,
+        model: str = None,
+        save_messages: bool = True,
+        defer_rewrite: bool = False
+    ) -> dict:
+        """
+        Validate the request, save the user message, resolve the session's
+        document, condense follow-up questions and check the exact-match
+        answer cache.
+
+        Args:
+            save_messages: If False, leave chat history to the caller: the
+                user message isn't saved and an exact cache hit is returned
+                unfinished, with its 'session_id' alongside 'result'
+            defer_rewrite: If True, a follow-up that needs an LLM rewrite is
+                returned with 'rewrite' set instead of being rewritten here;
+                the caller condenses it and then calls _check_answer_cache
+
+        Returns:
+            Dict with either 'result' (final answer or error, nothing left to do)
+            or the state needed to generate an answer. state['search_question']
+            is the (possibly condensed) question used for retrieval, caching
+            and the prompt
+        """
+        providers, model_name = self._resolve_llm(api_key, model)
+        if providers is None:
+            return {"result": {"error": "No API key configured. Please add an api key to use the RAG functionality.","status":"error"}}
+        
+        active_session_id = session_id or self.current_session_id
+
+        if not active_session_id:
+            return {"result": {"error": "No active session. Need to upload a document first.", "status": "error"}}
+
+        db = RAGDatabase(self.db_path)
+        db.connect()
+
+        try:
             # Save user message
-            try:
-                db.add_message(active_session_id, "user", question)
-                print(f"User message saved")
-            except Exception as e:
-                print(f"Warning: Could not save user message: {e}")
+            if save_messages:
+                self._save_message(active_session_id, "user", question, db=db)
             
             doc_info = db.get_document_by_session(active_session_id)
         
             if not doc_info:
-                return {"error": "Session not found in database.", "status": "error"}
-            
-            collection_name = doc_info["collection_name"]
+                return {"result": {"error": "Session not found in database.", "status": "error"}}
 
-            print(f"STEP: Processing query: {question}")
-            print(f"STEP: Using {n_results} results")
-            
-            # Initialize vector database
-            vector_db = VectorDB(collection_name=collection_name)
+            state = {
+                "session_id": active_session_id,
+                "document_id": doc_info["document_id"],
+                "collection_name": doc_info["collection_name"],
+                "model_name": model_name,
+                "providers": providers,
+                "question": question,
+                "search_question": question,
+                "cache_key": None,
+            }
+            state["history"] = self._prompt_history(state, db)
+            annotate(
+                session_id=active_session_id, document_id=doc_info["document_id"],
+                chunk_count=doc_info["chunk_count"], model=model_name, question=question[:500]
+            )
 
-            # Retrieve relevant context chunks from vector database
-            print("STEP: Searching vector database...")
-            search_results = vector_db.search(question, n_results=n_results)
-            
-            print(f"STEP: Search results type: {type(search_results)}")
-            
-            # FIX: Better error handling for search results
-            if not search_results:
-                return {"error": "No search results returned", "status": "error"}
-            
-            if not isinstance(search_results, dict):
-                return {"error": "Invalid search results format", "status": "error"}
-            
-            documents = search_results.get('documents', [])
-            
-            if not documents:
-                return {
-                    "answer": "I couldn't find any relevant information in the document to answer your question.",
-                    "sources": [],
-                    "status": "no_results",
-                    "session_id": active_session_id
-                }
-            
-            # Combine retrieved document chunks into a single context string
-            context = "\n\n".join(documents)
-            
-            if not context.strip():
-                return {
-                    "answer": "The retrieved context was empty. Please try rephrasing your question.",
-                    "sources": documents,
-                    "status": "empty_context",
-                    "session_id": active_session_id
-                }
-            
-            print(f"STEP: Context length: {len(context)} characters")
-            print(f"STEP: Retrieved {len(documents)} documents")
-            
-            print("STEP: Generating response with LLM...")
-            # Use the chain to generate response with context and question
-            response = self.chain.invoke({
-                "context": context,
-                "question": question
-            })
-
-            # Save assistant message
+            rewrite = self._plan_rewrite(state, db)
+            if rewrite is not None:
+                if defer_rewrite:
+                    state["rewrite"] = rewrite
+                    return state
+                state["search_question"] = self._rewrite_question(state, rewrite)
+
+            return self._check_answer_cache(state, n_results, use_cache, db=db, save_messages=save_messages)
+        finally:
+            db.close()
+
+    def _check_answer_cache(
+        self,
+        state: dict,
+        n_results: int,
+        use_cache: bool,
+        db: RAGDatabase = None,
+        save_messages: bool = True
+    ) -> dict:
+        """
+        Exact-match answer cache lookup for state['search_question'].
+
+        Returns:
+            {'result': ...} on a hit (finished unless save_messages is False),
+            otherwise state with 'cache_key' set
+        """
+        if not (use_cache and self.answer_cache_enabled):
+            return state
+
+        own_db = db is None
+        if own_db:
+            db = RAGDatabase(self.db_path)
+            db.connect()
+
+        try:
+            # Same document + same question + same model/prompt => reuse the answer
+            state["cache_key"] = make_answer_cache_key(
+                state["document_id"], state["search_question"], state["model_name"], n_results, PROMPT_VERSION,
+                cached_history(state.get("history"))
+            )
+            cached = db.get_cached_answer(state["cache_key"], self.answer_cache_ttl)
+            CACHE_LOOKUPS.inc(cache="exact", result="hit" if cached else "miss")
+            if not cached:
+                return state
+
+            logger.debug("Answer cache hit")
+            result = {
+                "answer": cached["answer"],
+                "sources": cached["sources"],
+                "status": "success",
+                "cached": True,
+                "cache": "exact",
+                **self._condensed(state)
+            }
+            if not save_messages:
+                return {"result": result, "session_id": state["session_id"]}
+            return {"result": self._finish_query(state["session_id"], result, db=db)}
+        finally:
+            if own_db:
+                db.close()
+
+    @staticmethod
+    def _condensed(state: dict) -> dict:
+        """'condensed_question' for results whose search query was rewritten."""
+        if state.get("search_question", state.get("question")) != state.get("question"):
+            return {"condensed_question": state["search_question"]}
+        return {}
+
+    def _plan_rewrite(self, state: dict, db: RAGDatabase) -> Optional[dict]:
+        """
+        Decide whether the question needs condensing with recent history.
+
+        Self-contained questions skip the rewrite (fast path) and a rewrite
+        cached for this session turn is applied to state directly.
+
+        Returns:
+            None if no LLM rewrite is needed, else {'history', 'key'} for
+            _rewrite_question / _arewrite_question
+        """
+        if not self.query_rewrite_enabled:
+            return None
+
+        question = state["question"]
+        if is_self_contained(question):
+            self.rewrite_cache.count("fast_path")
+            return None
+
+        turns = self.query_rewrite_turns * 2
+        history = db.get_last_n_messages(state["session_id"], turns + 1)
+        # The current question may already be saved (or be saved concurrently); it isn't history
+        if history and history[-1]["role"] == "user" and history[-1]["content"] == question:
+            history = history[:-1]
+        history = history[-turns:]
+        if not history:
+            return None
+
+        key = RewriteCache.key(state["session_id"], history[-1]["message_id"], question)
+        cached = self.rewrite_cache.get(key)
+        if cached is not None:
+            logger.debug("Condensed question (cached): %s", cached)
+            state["search_question"] = cached
+            return None
+
+        return {"history": format_history(history), "key": key}
+
+    def _finish_rewrite(self, question: str, rewrite: dict, rewritten: str, started: float) -> str:
+        condensed = clean_rewrite(question, rewritten)
+        self.rewrite_cache.put(rewrite["key"], condensed)
+        logger.debug("Condensed question in %.0f ms: %s", (time.perf_counter() - started) * 1000, condensed)
+        return condensed
+
+    def _rewrite_question(self, state: dict, rewrite: dict) -> str:
+        """Condense a follow-up into a standalone search query (falls back to the question)."""
+        question = state["question"]
+        started = time.perf_counter()
+        try:
+            rewritten = state["providers"].invoke(
+                {"history": rewrite["history"], "question": question}, prompt=REWRITE_PROMPT
+            )
+        except Exception as e:
+            self.rewrite_cache.count("failures")
+            logger.warning("Query rewrite failed, using the original question: %s", e)
+            return question
+        return self._finish_rewrite(question, rewrite, rewritten, started)
+
+    async def _arewrite_question(self, state: dict, rewrite: dict) -> str:
+        """Async counterpart of _rewrite_question."""
+        question = state["question"]
+        started = time.perf_counter()
+        try:
+            rewritten = await state["providers"].ainvoke(
+                {"history": rewrite["history"], "question": question}, prompt=REWRITE_PROMPT
+            )
+        except Exception as e:
+            self.rewrite_cache.count("failures")
+            logger.warning("Query rewrite failed, using the original question: %s", e)
+            return question
+        return self._finish_rewrite(question, rewrite, rewritten, started)
+
+    def _prompt_history(self, state: dict, db: RAGDatabase) -> str:
+        """
+        Conversation block for the prompt: the session's rolling summary plus
+        its unsummarized recent messages, within CONVERSATION_HISTORY_MAX_TOKENS.
+
+        Also starts a background summary update once enough turns have piled
+        up, so the prompt stays the same size however long the session runs.
+        """
+        if not self.history_enabled:
+            return NO_HISTORY
+
+        session_id = state["session_id"]
+        summary = db.get_session_summary(session_id)
+        window = (self.history_turns + self.summary_every_turns) * 2
+
+        messages = db.get_messages_after(
+            session_id, summary["last_message_id"] if summary else 0, limit=window + 1
+        )
+        # The current question may already be saved (or be saved concurrently); it isn't history
+        question = state.get("question")
+        if messages and messages[-1]["role"] == "user" and messages[-1]["content"] == question:
+            messages = messages[:-1]
+
+        if self.summary_every_turns > 0 and len(messages) >= window:
+            self._schedule_summary(session_id, state["providers"])
+
+        return build_prompt_history(summary["summary"] if summary else None, messages, self.history_max_tokens)
+
+    def _schedule_summary(self, session_id: str, providers: ProviderPool):
+        """Update a session's summary in a background thread (one at a time per session)."""
+        with self._summarizing_lock:
+            if session_id in self._summarizing:
+                return
+            self._summarizing.add(session_id)
+
+        threading.Thread(
+            target=self._update_summary, args=(session_id, providers), name="summary", daemon=True
+        ).start()
+
+    def _update_summary(self, session_id: str, providers: ProviderPool):
+        """
+        Fold all but the last CONVERSATION_HISTORY_TURNS turns into the
+        session's rolling summary.
+        """
+        db = RAGDatabase(self.db_path)
+        db.connect()
+        try:
+            summary = db.get_session_summary(session_id)
+            messages = db.get_messages_after(session_id, summary["last_message_id"] if summary else 0)
+            keep = self.history_turns * 2
+            # Bounded per update so a long pre-existing history is caught up over several turns
+            fold = (messages[:-keep] if keep else messages)[:40]
+            # Fold whole turns only: a question is summarized together with its answer
+            while fold and fold[-1]["role"] == "user":
+                fold.pop()
+            if not fold:
+                return
+
+            started = time.perf_counter()
+            updated = providers.invoke({
+                "summary": summary["summary"] if summary else "(empty)",
+                "messages": format_history(fold),
+                "max_words": self.summary_max_words,
+            }, prompt=SUMMARY_PROMPT)
+
+            updated = clean_summary(updated, self.summary_max_words)
+            if updated:
+                db.save_session_summary(session_id, updated, fold[-1]["message_id"])
+                logger.debug("Summarized %d messages in %.0f ms", len(fold), (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            logger.warning("Could not update conversation summary: %s", e)
+        finally:
+            db.close()
+            with self._summarizing_lock:
+                self._summarizing.discard(session_id)
+
+    def _begin_batch(
+        self,
+        questions: List[str],
+        session_id: str,
+        n_results: int,
+        use_cache: bool,
+        api_key: str = None,
+        model: str = None
+    ) -> dict:
+        """
+        Resolve the session once for a batch and check the exact-match cache
+        for every question. Batch questions are not written to chat history.
+
+        Returns:
+            Dict with either 'result' (error for the whole batch) or the shared
+            state plus per-question 'cache_keys' and 'cached' hits by index
+        """
+        providers, model_name = self._resolve_llm(api_key, model)
+        if providers is None:
+            return {"result": {"error": "No API key configured. Please add an api key to use the RAG functionality.","status":"error"}}
+
+        active_session_id = session_id or self.current_session_id
+
+        if not active_session_id:
+            return {"result": {"error": "No active session. Need to upload a document first.", "status": "error"}}
+
+        db = RAGDatabase(self.db_path)
+        db.connect()
+
+        try:
+            doc_info = db.get_document_by_session(active_session_id)
+
+            if not doc_info:
+                return {"result": {"error": "Session not found in database.", "status": "error"}}
+
+            document_id = doc_info["document_id"]
+            annotate(
+                session_id=active_session_id, document_id=document_id,
+                chunk_count=doc_info["chunk_count"], model=model_name
+            )
+
+            history = self._prompt_history({"session_id": active_session_id, "providers": providers}, db)
+
+            cache_keys = []
+            cached = {}
+            for i, question in enumerate(questions):
+                cache_key = None
+                if use_cache and self.answer_cache_enabled:
+                    cache_key = make_answer_cache_key(
+                        document_id, question, model_name, n_results, PROMPT_VERSION, cached_history(history)
+                    )
+                    hit = db.get_cached_answer(cache_key, self.answer_cache_ttl)
+                    CACHE_LOOKUPS.inc(cache="exact", result="hit" if hit else "miss")
+                    if hit:
+                        cached[i] = {
+                            "answer": hit["answer"],
+                            "sources": hit["sources"],
+                            "status": "success",
+                            "cached": True,
+                            "cache": "exact"
+                        }
+                cache_keys.append(cache_key)
+
+            logger.debug("Batch of %d questions, %d answer cache hits", len(questions), len(cached))
+
+            return {
+                "session_id": active_session_id,
+                "document_id": document_id,
+                "collection_name": doc_info["collection_name"],
+                "model_name": model_name,
+                "providers": providers,
+                "history": history,
+                "cache_keys": cache_keys,
+                "cached": cached,
+            }
+        finally:
+            db.close()
+
+    def _save_message(self, session_id: str, role: str, content: str, db: RAGDatabase = None):
+        """Append a message to the session's history; failures are logged, not raised."""
+        own_db = db is None
+        if own_db:
+            db = RAGDatabase(self.db_path)
+            db.connect()
+        try:
+            with stage("db_write", provider="sqlite"):
+                db.add_message(session_id, role, content)
+            logger.debug("%s message saved", role.capitalize())
+        except Exception as e:
+            logger.warning("Could not save %s message: %s", role, e)
+        finally:
+            if own_db:
+                db.close()
+
+    def _finish_query(self, session_id: str, result: dict, db: RAGDatabase = None) -> dict:
+        """Save the assistant reply for this session and attach the session ID."""
+        if result.get("status") == "success":
+            self._save_message(session_id, "assistant", result["answer"], db=db)
+
+        if result.get("status") != "error":
+            result["session_id"] = session_id
+        return result
+
+    def _spawn(self, awaitable) -> asyncio.Task:
+        """Run post-response work in the background, keeping a reference until it finishes."""
+        task = asyncio.ensure_future(awaitable)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_done)
+        return task
+
+    def _background_done(self, task: asyncio.Task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Background task failed: %r", task.exception())
+
+    async def drain_background(self, timeout: float = 10.0):
+        """Wait for pending history/cache writes (call on shutdown)."""
+        if self._background_tasks:
+            await asyncio.wait(list(self._background_tasks), timeout=timeout)
+
+    def _finish_in_background(self, session_id: str, result: dict, after: asyncio.Future = None) -> dict:
+        """
+        Async counterpart of _finish_query: the session ID is attached now and
+        the assistant message is written after the response has gone out.
+
+        Args:
+            session_id: Session the answer belongs to
+            result: Query result
+            after: Pending user-message write; the reply is saved after it so
+                   history keeps its order
+        """
+        async def persist():
+            if after is not None:
+                await asyncio.gather(after, return_exceptions=True)
+            if result.get("status") == "success":
+                await asyncio.to_thread(self._save_message, session_id, "assistant", result["answer"])
+
+        self._spawn(persist())
+
+        if result.get("status") != "error":
+            result["session_id"] = session_id
+        return result
+
+    async def _abegin_query(
+        self,
+        question: str,
+        session_id: str,
+        n_results: int,
+        use_cache: bool,
+        api_key: str,
+        model: str,
+        timer: StageTimer
+    ):
+        """
+        Front half of the async query DAG. The user-message write, the
+        session/answer-cache lookup and the question embedding don't depend
+        on each other, so they run concurrently in worker threads.
+
+        Returns:
+            (state, embeddings, user_write): state as from _begin_query (with
+            history left to the caller), the question embedding (None when
+            state already holds a result) and the pending user-message write
+        """
+        active_session_id = session_id or self.current_session_id
+
+        user_write = None
+        if active_session_id and (self.llm or api_key):
+            user_write = asyncio.ensure_future(timer.run(
+                "user_message", asyncio.to_thread(self._save_message, active_session_id, "user", question)
+            ))
+
+        # Speculative: wasted on an exact cache hit, but off the critical path otherwise
+        embedding = asyncio.ensure_future(timer.run("embed", asyncio.to_thread(embed_queries, [question])))
+
+        try:
+            state = await timer.run("session_lookup", asyncio.to_thread(
+                self._begin_query, question, session_id, n_results, use_cache, api_key, model, False, True
+            ))
+            if "rewrite" in state:
+                state["search_question"] = await timer.run(
+                    "rewrite", self._arewrite_question(state, state.pop("rewrite"))
+                )
+                state = await asyncio.to_thread(self._check_answer_cache, state, n_results, use_cache, None, False)
+        except BaseException:
+            embedding.cancel()
+            raise
+
+        if "result" in state:
+            embedding.cancel()
+            return state, None, user_write
+
+        if state["search_question"] != question:
+            # Condensed follow-up: the speculative embedding was for the wrong text
+            embedding.cancel()
+            embeddings = await timer.run(
+                "embed", asyncio.to_thread(embed_queries, [state["search_question"]])
+            )
+            return state, embeddings, user_write
+
+        return state, await embedding, user_write
+
+    def _retrieve_context(self, question: str, state: dict, n_results: int, use_cache: bool) -> dict:
+        """
+        Semantic cache lookup and vector search for a question.
+
+        Returns:
+            Dict with either 'result' (semantic hit or no usable context)
+            or 'context', 'documents' and the embedding used for caching
+        """
+        return self._retrieve_contexts([question], state, n_results, use_cache)[0]
+
+    def _retrieve_contexts(
+        self,
+        questions: List[str],
+        state: dict,
+        n_results: int,
+        use_cache: bool,
+        embeddings: List[List[float]] = None
+    ) -> List[dict]:
+        """
+        Batched form of _retrieve_context: all questions are embedded in one
+        encode call and the semantic-cache misses go to Chroma in one
+        multi-query search.
+
+        Args:
+            embeddings: Question embeddings computed earlier (skips encoding)
+
+        Returns:
+            One dict per question, shaped like _retrieve_context's result
+        """
+        document_id = state["document_id"]
+
+        logger.debug("Processing %d question(s) with %d results each", len(questions), n_results)
+        
+        # Initialize vector database
+        vector_db = VectorDB(collection_name=state["collection_name"], document_id=document_id)
+
+        retrieved: List[dict] = [None] * len(questions)
+        pending = list(range(len(questions)))
+
+        # Embed once: the same vectors feed the semantic cache and the search
+        # Answers depend on the conversation too: different histories never share an entry
+        semantic_namespace = (
+            state["model_name"], n_results, PROMPT_VERSION, history_digest(cached_history(state.get("history")))
+        )
+        if use_cache and self.semantic_cache_enabled:
+            if embeddings is None:
+                embeddings = vector_db.encode_queries(questions)
+            pending = []
+            for i, embedding in enumerate(embeddings):
+                similar = self.semantic_cache.lookup(document_id, embedding, semantic_namespace)
+                if similar:
+                    logger.debug("Semantic cache hit (similarity %s)", similar["similarity"])
+                    retrieved[i] = {"result": {
+                        "answer": similar["answer"],
+                        "sources": similar["sources"],
+                        "status": "success",
+                        "cached": True,
+                        "cache": "semantic",
+                        "cache_similarity": similar["similarity"],
+                        "cache_entry_id": similar["entry_id"],
+                        **self._condensed(state)
+                    }}
+                else:
+                    pending.append(i)
+
+        if not pending:
+            return retrieved
+
+        # Retrieve relevant context chunks from vector database
+        logger.debug("Searching vector database...")
+        if self.multi_query_enabled and self.multi_query_max > 1:
+            search_results = self._multi_query_search(
+                vector_db, [questions[i] for i in pending], state, n_results,
+                [embeddings[i] for i in pending] if embeddings is not None else None
+            )
+        else:
+            search_results = vector_db.search(
+                [questions[i] for i in pending],
+                n_results=n_results,
+                query_embeddings=[embeddings[i] for i in pending] if embeddings is not None else None
+            )
+
+
+        # search() collapses "nothing found" into a single empty dict
+        if isinstance(search_results, dict):
+            search_results = [search_results] * len(pending)
+
+        # Only feed the semantic cache when it was consulted
+        cacheable = use_cache and self.semantic_cache_enabled
+        for i, results in zip(pending, search_results):
+            retrieved[i] = self._context_from_results(results)
+            retrieved[i].setdefault("question_embedding", embeddings[i] if cacheable else None)
+            retrieved[i].setdefault("semantic_namespace", semantic_namespace)
+
+        return retrieved
+
+    def _expand_question(self, question: str, state: dict) -> List[str]:
+        """Sub-queries for a question: LLM expansion if enabled, else local heuristics."""
+        if self.multi_query_llm and state.get("providers") is not None:
             try:
-                db.add_message(active_session_id, "assistant", response)
+                reply = state["providers"].invoke(
+                    {"question": question, "count": self.multi_query_max - 1}, prompt=EXPANSION_PROMPT
+                )
+                return parse_expansions(question, reply, self.multi_query_max)
             except Exception as e:
-                print(f"Warning: Could not save assistant message: {e}")
-            
-            print(f"STEP: Response generated successfully: {len(response)} characters")
-            
-            return {
-                "answer": response,
+                logger.warning("Query expansion failed, using heuristics: %s", e)
+        return expand_query(question, self.multi_query_max)
+
+    def _multi_query_search(
+        self,
+        vector_db: VectorDB,
+        questions: List[str],
+        state: dict,
+        n_results: int,
+        embeddings: List[List[float]] = None
+    ) -> List[dict]:
+        """
+        Expand each question into sub-queries and search them all at once.
+
+        The original questions keep their precomputed embeddings; only the
+        extra sub-queries are encoded, in one batch, and everything goes to
+        Chroma in one multi-query search before RRF fusion per question.
+
+        Returns:
+            One fused search result per question
+        """
+        groups = [self._expand_question(question, state) for question in questions]
+
+        query_embeddings = None
+        if embeddings is not None:
+            extra = [query for group in groups for query in group[1:]]
+            extra_embeddings = iter(vector_db.encode_queries(extra) if extra else [])
+            query_embeddings = []
+            for embedding, group in zip(embeddings, groups):
+                query_embeddings.append(embedding)
+                query_embeddings.extend(next(extra_embeddings) for _ in group[1:])
+
+        logger.debug("Multi-query search with %d sub-queries", sum(len(g) for g in groups))
+        return vector_db.search_fused(
+            groups, n_results=n_results, query_embeddings=query_embeddings, rrf_k=self.multi_query_rrf_k
+        )
+
+    def _context_from_results(self, search_results: dict) -> dict:
+        """Turn one search result into LLM context, or a final result if unusable."""
+        # FIX: Better error handling for search results
+        if not search_results:
+            return {"result": {"error": "No search results returned", "status": "error"}}
+        
+        if not isinstance(search_results, dict):
+            return {"result": {"error": "Invalid search results format", "status": "error"}}
+        
+        documents = search_results.get('documents', [])
+        
+        if not documents:
+            return {"result": {
+                "answer": "I couldn't find any relevant information in the document to answer your question.",
+                "sources": [],
+                "status": "no_results"
+            }}
+        
+        # Combine retrieved document chunks into a single context string
+        context = "\n\n".join(documents)
+        
+        if not context.strip():
+            return {"result": {
+                "answer": "The retrieved context was empty. Please try rephrasing your question.",
                 "sources": documents,
-                "status": "success",
-                "session_id": active_session_id
-            }
+                "status": "empty_context"
+            }}
+        
+        logger.debug("Retrieved %d documents, context length %d characters", len(documents), len(context))
+        annotate(context_chars=len(context))
+
+        return {
+            "context": context,
+            "documents": documents,
+        }
+
+    def _remember_answer(self, question: str, state: dict, retrieved: dict, n_results: int, response: str) -> dict:
+        """Store a fresh LLM answer in the answer caches and build the result."""
+        logger.debug("Response generated successfully: %d characters", len(response))
+        self._cache_answer(question, state, retrieved, n_results, response)
+        return self._answer_result(state, retrieved, response)
+
+    def _cache_answer(self, question: str, state: dict, retrieved: dict, n_results: int, response: str):
+        """Save a fresh LLM answer to the exact and semantic answer caches."""
+        cache_key = state["cache_key"]
+        documents = retrieved["documents"]
+
+        if cache_key:
+            db = RAGDatabase(self.db_path)
+            db.connect()
+            try:
+                with stage("db_write", provider="sqlite"):
+                    db.save_cached_answer(
+                        cache_key, state["document_id"], normalize_question(question), state["model_name"],
+                        n_results, PROMPT_VERSION, response, documents,
+                        max_entries=self.answer_cache_max_entries,
+                        ttl_seconds=self.answer_cache_ttl
+                    )
+            finally:
+                db.close()
+
+        if retrieved["question_embedding"] is not None:
+            self.semantic_cache.store(
+                state["document_id"], retrieved["question_embedding"], retrieved["semantic_namespace"],
+                question, response, documents
+            )
+
+    def _answer_result(self, state: dict, retrieved: dict, response: str) -> dict:
+        """Result payload for an answer that was just generated."""
+        return {
+            "answer": response,
+            "sources": retrieved["documents"],
+            "status": "success",
+            "cached": False,
+            "cache": "miss" if state["cache_key"] else "bypass",
+            **self._condensed(state)
+        }
+
+    def _generate_answer(self, question: str, state: dict, n_results: int, use_cache: bool) -> dict:
+        """
+        Retrieval and LLM call for a question.
+        Session independent, so its result can be shared between callers.
+        """
+        retrieved = self._retrieve_context(question, state, n_results, use_cache)
+        if "result" in retrieved:
+            return retrieved["result"]
+
+        logger.debug("Generating response with LLM...")
+        # Use the chain to generate response with context and question
+        response = state["providers"].invoke({
+            "context": retrieved["context"],
+            "question": question,
+            "history": state["history"]
+        })
+
+        return self._remember_answer(question, state, retrieved, n_results, response)
+
+    async def _agenerate_answer(
+        self,
+        question: str,
+        state: dict,
+        n_results: int,
+        use_cache: bool,
+        embeddings: List[List[float]] = None,
+        timer: StageTimer = None
+    ) -> dict:
+        """
+        Async variant of _generate_answer: blocking stages run in worker
+        threads and the answer-cache writes happen after the result is returned.
+        """
+        timer = timer or StageTimer()
+        retrieved = (await timer.run("retrieval", asyncio.to_thread(
+            self._retrieve_contexts, [question], state, n_results, use_cache, embeddings
+        )))[0]
+        if "result" in retrieved:
+            return retrieved["result"]
+
+        logger.debug("Generating response with LLM...")
+        response = await timer.run("llm", state["providers"].ainvoke({
+            "context": retrieved["context"],
+            "question": question,
+            "history": state["history"]
+        }))
+
+        logger.debug("Response generated successfully: %d characters", len(response))
+        self._spawn(asyncio.to_thread(self._cache_answer, question, state, retrieved, n_results, response))
+        return self._answer_result(state, retrieved, response)
+
+    def query(
+        self,
+        question: str,
+        session_id: str = None,
+        n_results: int = 3,
+        use_cache: bool = True,
+        api_key: str = None,
+        model: str = None
+    ) -> dict:
+        """
+        Query the document (Works with both Streamlit and FastAPI).
+
+        Args:
+            question: User's question
+            session_id: Optional session ID (for FastAPI stateless calls)
+                        If None, uses self.current_session_id (for Streamlit)
+            n_results: Number of relevant chunks to retrieve
+            use_cache: If False, skip the answer cache and always call the LLM
+            api_key: Optional per-request API key (pooled client) instead of the server's LLM
+            model: Model to use with api_key
+
+        Returns:
+            Dict containing the answer from the LLM or error message
+        """
+        try:
+            state = self._begin_query(question, session_id, n_results, use_cache, api_key, model)
+            if "result" in state:
+                return state["result"]
+            question = state["search_question"]
+
+            def generate():
+                return self._generate_answer(question, state, n_results, use_cache)
+
+            # Identical concurrent questions share one retrieval + LLM call
+            if state["cache_key"]:
+                result, shared = self.query_flight.do(state["cache_key"], generate)
+                result = dict(result, coalesced=shared)
+            else:
+                result = generate()
+
+            return self._finish_query(state["session_id"], result)
             
+        except AdmissionRejected as e:
+            return self._overloaded(e)
         except KeyError as e:
             return {"error": f"Key error: {e}. Check your vector database.", "status": "error"}
         except Exception as e:
             traceback.print_exc()
             return {"error": f"Exception: {type(e).__name__}: {str(e)}", "status": "error"}
+
+    async def aquery(
+        self,
+        question: str,
+        session_id: str = None,
+        n_results: int = 3,
+        use_cache: bool = True,
+        api_key: str = None,
+        model: str = None
+    ) -> dict:
+        """
+        Async version of query() for the FastAPI server.
+
+        Runs as a small DAG: the user-message write, session lookup and
+        question embedding overlap; retrieval and the LLM call follow; the
+        assistant message and cache writes happen after the result is
+        returned. SQLite and vector search run in worker threads and the LLM
+        is awaited, so slow providers don't pin a thread.
+
+        Same arguments as query(); the result also carries 'timings' with
+        per-stage milliseconds.
+        """
+        timer = StageTimer()
+        try:
+            state, embeddings, user_write = await self._abegin_query(
+                question, session_id, n_results, use_cache, api_key, model, timer
+            )
+            if "result" in state:
+                result = state["result"]
+                if "session_id" in state:
+                    result = self._finish_in_background(state["session_id"], result, after=user_write)
+                return dict(result, timings=timer.as_dict())
+            question = state["search_question"]
+
+            def generate():
+                return self._agenerate_answer(question, state, n_results, use_cache, embeddings, timer)
+
+            # Identical concurrent questions share one retrieval + LLM call
+            if state["cache_key"]:
+                result, shared = await self.query_flight.do_async(state["cache_key"], generate)
+                result = dict(result, coalesced=shared)
+            else:
+                result = await generate()
+
+            result = self._finish_in_background(state["session_id"], result, after=user_write)
+            result["timings"] = timer.as_dict()
+            logger.debug("Query timings", extra={"fields": {"timings": result["timings"]}})
+            return result
+
+        except AdmissionRejected as e:
+            return self._overloaded(e)
+        except KeyError as e:
+            return {"error": f"Key error: {e}. Check your vector database.", "status": "error"}
+        except Exception as e:
+            traceback.print_exc()
+            return {"error": f"Exception: {type(e).__name__}: {str(e)}", "status": "error"}
+
+    async def abatch_query(
+        self,
+        questions: List[str],
+        session_id: str = None,
+        n_results: int = 3,
+        use_cache: bool = True,
+        max_concurrency: int = None,
+        api_key: str = None,
+        model: str = None
+    ) -> AsyncIterator[dict]:
+        """
+        Answer many questions about one session's document.
+
+        The session is resolved once, all questions are embedded in one pass
+        and searched with one multi-query Chroma call; LLM calls then run
+        concurrently, at most max_concurrency at a time.
+
+        Args:
+            questions: Questions to answer
+            session_id: Session whose document is queried
+            n_results: Number of relevant chunks to retrieve per question
+            use_cache: If False, skip the answer caches
+            max_concurrency: LLM calls in flight (default BATCH_MAX_CONCURRENCY)
+            api_key: Optional per-request API key
+            model: Model to use with api_key
+
+        Yields:
+            One result dict per question, in completion order, with 'index'
+            and 'question' added to the usual query() payload
+        """
+        batch = await asyncio.to_thread(
+            self._begin_batch, questions, session_id, n_results, use_cache, api_key, model
+        )
+        if "result" in batch:
+            yield dict(batch["result"], index=None)
+            return
+
+        active_session_id = batch["session_id"]
+
+        def line(i: int, result: dict) -> dict:
+            if result.get("status") != "error":
+                result = dict(result, session_id=active_session_id)
+            return dict(result, index=i, question=questions[i])
+
+        for i, result in batch["cached"].items():
+            yield line(i, result)
+
+        pending = [i for i in range(len(questions)) if i not in batch["cached"]]
+        if not pending:
+            return
+
+        try:
+            retrieved = await asyncio.to_thread(
+                self._retrieve_contexts, [questions[i] for i in pending], batch, n_results, use_cache
+            )
+        except Exception as e:
+            traceback.print_exc()
+            for i in pending:
+                yield line(i, {"error": f"Exception: {type(e).__name__}: {str(e)}", "status": "error"})
+            return
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or self.batch_max_concurrency))
+
+        async def answer(i: int, item: dict):
+            try:
+                if "result" in item:
+                    return i, item["result"]
+                async with semaphore:
+                    response = await batch["providers"].ainvoke({
+                        "context": item["context"],
+                        "question": questions[i],
+                        "history": batch["history"]
+                    })
+                state = dict(batch, cache_key=batch["cache_keys"][i])
+                return i, await asyncio.to_thread(
+                    self._remember_answer, questions[i], state, item, n_results, response
+                )
+            except AdmissionRejected as e:
+                return i, self._overloaded(e)
+            except Exception as e:
+                traceback.print_exc()
+                return i, {"error": f"Exception: {type(e).__name__}: {str(e)}", "status": "error"}
+
+        tasks = [asyncio.ensure_future(answer(i, item)) for i, item in zip(pending, retrieved)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                i, result = await next_done
+                yield line(i, result)
         finally:
-            db.close()
+            # Client went away mid-batch: don't keep paying for answers nobody reads
+            for task in tasks:
+                task.cancel()
+
+    def stream_query(
+        self,
+        question: str,
+        session_id: str = None,
+        n_results: int = 3,
+        use_cache: bool = True,
+        api_key: str = None,
+        model: str = None
+    ) -> Iterator[dict]:
+        """
+        Sync counterpart of astream_query() (used by the Streamlit frontend).
+
+        Yields the same sources/token/done/error events while the LLM is
+        generating; the assistant message is saved once the stream completes.
+        """
+        try:
+            state = self._begin_query(question, session_id, n_results, use_cache, api_key, model)
+            question = state.get("search_question", question)
+            result = state.get("result")
+            retrieved = None
+
+            if result is None:
+                retrieved = self._retrieve_context(question, state, n_results, use_cache)
+                result = retrieved.get("result")
+                if result is not None:
+                    result = self._finish_query(state["session_id"], result)
+
+            if result is not None:
+                # Cache hit or nothing to generate: replay the final answer as one chunk
+                if result.get("status") == "error":
+                    yield {"event": "error", "data": result}
+                    return
+                yield {"event": "sources", "data": {"sources": result.get("sources", []), "session_id": result.get("session_id")}}
+                yield {"event": "token", "data": {"content": result.get("answer", "")}}
+                yield {"event": "done", "data": result}
+                return
+
+            yield {"event": "sources", "data": {"sources": retrieved["documents"], "session_id": state["session_id"]}}
+
+            logger.debug("Streaming response from LLM...")
+            parts = []
+            for chunk in state["providers"].stream({
+                "context": retrieved["context"],
+                "question": question,
+                "history": state["history"]
+            }):
+                if chunk:
+                    parts.append(chunk)
+                    yield {"event": "token", "data": {"content": chunk}}
+
+            response = "".join(parts)
+            result = self._remember_answer(question, state, retrieved, n_results, response)
+            result = self._finish_query(state["session_id"], result)
+            yield {"event": "done", "data": result}
+
+        except AdmissionRejected as e:
+            yield {"event": "error", "data": self._overloaded(e)}
+        except Exception as e:
+            traceback.print_exc()
+            yield {"event": "error", "data": {"error": f"Exception: {type(e).__name__}: {str(e)}", "status": "error"}}
+
+    async def astream_query(
+        self,
+        question: str,
+        session_id: str = None,
+        n_results: int = 3,
+        use_cache: bool = True,
+        api_key: str = None,
+        model: str = None
+    ) -> AsyncIterator[dict]:
+        """
+        Stream an answer as events while the LLM generates it.
+
+        Yields dicts with 'event' and 'data':
+            sources -> {'sources': [...], 'session_id': str} once retrieval is done
+            token   -> {'content': str} for every generated chunk
+            done    -> the same payload query() returns
+            error   -> {'error': str, 'status': 'error'}
+
+        The assistant message is saved (and cached) only when the stream
+        completes; an aborted stream leaves no partial answer in history.
+        The front half runs concurrently as in aquery(), and the done event
+        carries per-stage 'timings' (including 'first_token_ms').
+        """
+        timer = StageTimer()
+        try:
+            state, embeddings, user_write = await self._abegin_query(
+                question, session_id, n_results, use_cache, api_key, model, timer
+            )
+            question = state.get("search_question", question)
+            result = state.get("result")
+            retrieved = None
+
+            if result is None:
+                retrieved = (await timer.run("retrieval", asyncio.to_thread(
+                    self._retrieve_contexts, [question], state, n_results, use_cache, embeddings
+                )))[0]
+                result = retrieved.get("result")
+                if result is not None:
+                    result = self._finish_in_background(state["session_id"], result, after=user_write)
+            elif "session_id" in state:
+                result = self._finish_in_background(state["session_id"], result, after=user_write)
+
+            if result is not None:
+                # Cache hit or nothing to generate: replay the final answer as one chunk
+                if result.get("status") == "error":
+                    yield {"event": "error", "data": result}
+                    return
+                yield {"event": "sources", "data": {"sources": result.get("sources", []), "session_id": result.get("session_id")}}
+                yield {"event": "token", "data": {"content": result.get("answer", "")}}
+                yield {"event": "done", "data": dict(result, timings=timer.as_dict())}
+                return
+
+            yield {"event": "sources", "data": {"sources": retrieved["documents"], "session_id": state["session_id"]}}
+
+            logger.debug("Streaming response from LLM...")
+            parts = []
+            with timer.stage("llm"):
+                async for chunk in state["providers"].astream({
+                    "context": retrieved["context"],
+                    "question": question,
+                    "history": state["history"]
+                }):
+                    if chunk:
+                        if not parts:
+                            timer.mark("first_token")
+                        parts.append(chunk)
+                        yield {"event": "token", "data": {"content": chunk}}
+
+            response = "".join(parts)
+            logger.debug("Response generated successfully: %d characters", len(response))
+            self._spawn(asyncio.to_thread(self._cache_answer, question, state, retrieved, n_results, response))
+            result = self._finish_in_background(
+                state["session_id"], self._answer_result(state, retrieved, response), after=user_write
+            )
+            result["timings"] = timer.as_dict()
+            logger.debug("Query timings", extra={"fields": {"timings": result["timings"]}})
+            yield {"event": "done", "data": result}
+
+        except AdmissionRejected as e:
+            yield {"event": "error", "data": self._overloaded(e)}
+        except Exception as e:
+            traceback.print_exc()
+            yield {"event": "error", "data": {"error": f"Exception: {type(e).__name__}: {str(e)}", "status": "error"}}
 
 
 def main():
@@ -0,0 +1,360 @@
+import re
+import json
+import time
+import uuid
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question so trivially different phrasings share a cache entry.
+
+    Applies Unicode NFKC, lowercases, collapses whitespace and drops
+    trailing punctuation ("What is X?" == "what is   x").
+
+    Args:
+        question: Raw user question
+
+    Returns:
+        str: Normalized question text
+    """
+    text = unicodedata.normalize("NFKC", question or "").lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!. ")
+
+
+def make_answer_cache_key(
+    document_id: str,
+    question: str,
+    model: str,
+    n_results: int,
+    prompt_version: str,
+    history: str = ""
+) -> str:
+    """
+    Build the exact-match answer cache key.
+
+    Args:
+        document_id: Content-hash based document identifier
+        question: User question (normalized here)
+        model: LLM model name the answer was generated with
+        n_results: Number of chunks retrieved for the context
+        prompt_version: Version tag of the RAG prompt template
+        history: Conversation history the prompt included ('' for none)
+
+    Returns:
+        str: SHA256 hex digest identifying the answer
+    """
+    key = [document_id, normalize_question(question), model or "", int(n_results), prompt_version]
+    # Keys of answers generated without history stay as they were
+    if history:
+        key.append(history_digest(history))
+    payload = json.dumps(key, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def history_digest(history: str) -> str:
+    """
+    Short digest of the conversation history a prompt included, so answers
+    to the same follow-up in different conversations don't share a cache entry.
+
+    Args:
+        history: History text ('' for none)
+
+    Returns:
+        str: Hex digest, '' when there is no history
+    """
+    if not history:
+        return ""
+    return hashlib.sha256(history.encode("utf-8")).hexdigest()[:32]
+
+
+class _DocumentIndex:
+    """Question embeddings and answers cached for a single document."""
+
+    def __init__(self, dim: int):
+        self.embeddings = np.empty((0, dim), dtype=np.float32)
+        self.entries: List[Dict] = []
+
+
+class SemanticCache:
+    """
+    In-memory semantic answer cache, one small vector index per document.
+
+    Questions are stored as L2-normalized embeddings, so cosine similarity
+    is a single matrix-vector product. A cached answer is only reused for
+    the same namespace (model, n_results, prompt version).
+    """
+
+    def __init__(self, threshold: float = 0.92, max_per_document: int = 256, max_documents: int = 1000):
+        """
+        Args:
+            threshold: Minimum cosine similarity for a question to count as a hit
+            max_per_document: Entries kept per document (LRU evicted beyond this)
+            max_documents: Documents kept in memory (LRU evicted beyond this)
+        """
+        self.threshold = threshold
+        self.max_per_document = max_per_document
+        self.max_documents = max_documents
+        self._indexes: "OrderedDict[str, _DocumentIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "false_hits": 0,
+            "hit_similarity_sum": 0.0,
+        }
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, document_id: str, embedding: Sequence[float], namespace: Tuple) -> Optional[Dict]:
+        """
+        Find the most similar cached question for a document.
+
+        Args:
+            document_id: Document the question is asked about
+            embedding: Question embedding
+            namespace: (model, n_results, prompt_version) the answer must match
+
+        Returns:
+            Dict with 'entry_id', 'question', 'answer', 'sources', 'similarity'
+            or None if nothing is within the threshold
+        """
+        vector = self._normalize(embedding)
+
+        with self._lock:
+            index = self._indexes.get(document_id)
+            if index is None or not index.entries:
+                self._stats["misses"] += 1
+                return None
+
+            similarities = index.embeddings @ vector
+            best = None
+            for i in np.argsort(-similarities):
+                if similarities[i] < self.threshold:
+                    break
+                if index.entries[i]["namespace"] == namespace:
+                    best = int(i)
+                    break
+
+            if best is None:
+                self._stats["misses"] += 1
+                return None
+
+            entry = index.entries[best]
+            entry["last_used"] = time.time()
+            entry["hits"] += 1
+            self._indexes.move_to_end(document_id)
+
+            similarity = float(similarities[best])
+            self._stats["hits"] += 1
+            self._stats["hit_similarity_sum"] += similarity
+
+            return {
+                "entry_id": entry["entry_id"],
+                "question": entry["question"],
+                "answer": entry["answer"],
+                "sources": entry["sources"],
+                "similarity": round(similarity, 4),
+            }
+
+    def store(
+        self,
+        document_id: str,
+        embedding: Sequence[float],
+        namespace: Tuple,
+        question: str,
+        answer: str,
+        sources: List[str]
+    ) -> str:
+        """
+        Add a question/answer pair to a document's index.
+
+        Returns:
+            str: entry_id of the new entry
+        """
+        vector = self._normalize(embedding)
+        entry_id = uuid.uuid4().hex
+
+        with self._lock:
+            index = self._indexes.get(document_id)
+            if index is None:
+                index = _DocumentIndex(vector.shape[0])
+                self._indexes[document_id] = index
+            self._indexes.move_to_end(document_id)
+
+            if len(index.entries) >= self.max_per_document:
+                lru = min(range(len(index.entries)), key=lambda i: index.entries[i]["last_used"])
+                self._remove(index, lru)
+                self._stats["evictions"] += 1
+
+            index.embeddings = np.vstack([index.embeddings, vector[np.newaxis, :]])
+            index.entries.append({
+                "entry_id": entry_id,
+                "namespace": namespace,
+                "question": question,
+                "answer": answer,
+                "sources": sources,
+                "last_used": time.time(),
+                "hits": 0,
+            })
+            self._stats["stores"] += 1
+
+            while len(self._indexes) > self.max_documents:
+                _, evicted = self._indexes.popitem(last=False)
+                self._stats["evictions"] += len(evicted.entries)
+
+        return entry_id
+
+    def report_false_hit(self, document_id: str, entry_id: str) -> bool:
+        """
+        Record that a semantic hit returned a wrong answer and drop the entry.
+
+        Returns:
+            bool: True if the entry was found and removed
+        """
+        with self._lock:
+            self._stats["false_hits"] += 1
+            index = self._indexes.get(document_id)
+            if index is None:
+                return False
+            for i, entry in enumerate(index.entries):
+                if entry["entry_id"] == entry_id:
+                    self._remove(index, i)
+                    return True
+            return False
+
+    def invalidate(self, document_id: str) -> None:
+        """Drop every cached answer for a document."""
+        with self._lock:
+            self._indexes.pop(document_id, None)
+
+    @staticmethod
+    def _remove(index: _DocumentIndex, position: int) -> None:
+        index.embeddings = np.delete(index.embeddings, position, axis=0)
+        del index.entries[position]
+
+    def stats(self) -> Dict:
+        """Hit/miss/false-hit telemetry and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            similarity_sum = stats.pop("hit_similarity_sum")
+            hits = stats["hits"]
+            lookups = hits + stats["misses"]
+            stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+            stats["false_hit_rate"] = round(stats["false_hits"] / hits, 4) if hits else 0.0
+            stats["avg_hit_similarity"] = round(similarity_sum / hits, 4) if hits else 0.0
+            stats["documents"] = len(self._indexes)
+            stats["entries"] = sum(len(index.entries) for index in self._indexes.values())
+            stats["threshold"] = self.threshold
+            return stats
+
+
+class RetrievalCache:
+    """
+    Bounded LRU cache of vector search results.
+
+    Keyed by (collection_name, query hash, n_results). Every collection has
+    a generation counter that is bumped on invalidation, so a search that
+    started before a write can't repopulate the cache with stale results.
+    A name may be a "collection/document" namespace (one document of a
+    shared collection); invalidating the collection covers all of them.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        """
+        Args:
+            max_entries: Results kept in memory (LRU evicted beyond this)
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, int], Dict]" = OrderedDict()
+        self._keys_by_collection: Dict[str, set] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(collection_name: str, query: str, n_results: int) -> Tuple[str, str, int]:
+        query_hash = hashlib.sha256(query.encode("utf-8")).hexdigest()
+        return (collection_name, query_hash, int(n_results))
+
+    def _generation(self, collection_name: str) -> int:
+        # A document namespace also changes generation with its whole collection
+        generation = self._generations.get(collection_name, 0)
+        collection = collection_name.split("/", 1)[0]
+        if collection != collection_name:
+            generation += self._generations.get(collection, 0)
+        return generation
+
+    def generation(self, collection_name: str) -> int:
+        """Current generation of a collection (read before searching)."""
+        with self._lock:
+            return self._generation(collection_name)
+
+    def get(self, collection_name: str, query: str, n_results: int) -> Optional[Dict]:
+        """
+        Return a copy of the cached result, or None on miss.
+        """
+        key = self._key(collection_name, query, n_results)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return {field: list(values) for field, values in result.items()}
+
+    def put(self, collection_name: str, query: str, n_results: int, result: Dict, generation: int) -> None:
+        """
+        Cache a search result unless the collection changed since `generation`.
+        """
+        key = self._key(collection_name, query, n_results)
+        with self._lock:
+            if self._generation(collection_name) != generation:
+                return
+
+            self._entries[key] = {field: list(values) for field, values in result.items()}
+            self._entries.move_to_end(key)
+            self._keys_by_collection.setdefault(collection_name, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._keys_by_collection.get(old_key[0], set()).discard(old_key)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, collection_name: str) -> None:
+        """
+        Drop all results for a collection after it was modified or deleted,
+        including those of its "collection/document" namespaces.
+        """
+        prefix = f"{collection_name}/"
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            names = [name for name in self._keys_by_collection if name == collection_name or name.startswith(prefix)]
+            for name in names:
+                for key in self._keys_by_collection.pop(name):
+                    self._entries.pop(key, None)
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        """Hit/miss counts and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+            stats["entries"] = len(self._entries)
+            stats["max_entries"] = self.max_entries
+            return stats
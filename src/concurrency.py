@@ -0,0 +1,448 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """An in-flight call whose result is shared with waiting followers."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.followers = 0
+
+
+# Result a cancelled async leader hands its followers: run the call again
+_LEADER_CANCELLED = object()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into a single execution.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running (followers) block until it finishes and get
+    the same result, or the same exception. Nothing is cached afterwards:
+    the next call after completion runs the function again.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        """
+        Args:
+            name: Label used in logs and stats
+        """
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"executions": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once per key across concurrent callers.
+
+        Args:
+            key: Identity of the work (e.g. file hash, answer cache key)
+            fn: Zero-argument callable doing the work
+
+        Returns:
+            (result, shared): shared is True when this caller was a follower
+            and received the leader's result
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["executions"] += 1
+            else:
+                call.followers += 1
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            logger.info("[%s] Waiting on in-flight call for %s...", self.name, str(key)[:8])
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Async counterpart of do() for coroutines on the event loop.
+
+        Followers await the leader's future instead of blocking a thread.
+        Sync and async callers are tracked separately. If the leader is
+        cancelled (e.g. its client disconnected), its followers are not:
+        they start over, and the first of them to get back leads.
+
+        Args:
+            key: Identity of the work
+            fn: Zero-argument callable returning an awaitable
+
+        Returns:
+            (result, shared) as in do()
+        """
+        while True:
+            with self._lock:
+                future = self._async_calls.get(key)
+                leader = future is None
+                if leader:
+                    future = asyncio.get_running_loop().create_future()
+                    self._async_calls[key] = future
+                    self._stats["executions"] += 1
+
+            if leader:
+                break
+            # shield: a follower that gets cancelled must not cancel the shared call
+            try:
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                raise
+            except BaseException:
+                self._count_coalesced()
+                raise
+            if result is not _LEADER_CANCELLED:
+                self._count_coalesced()
+                return result, True
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            # Only this caller went away: hand the work to the followers
+            future.set_result(_LEADER_CANCELLED)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved so an unobserved error isn't logged twice
+            raise
+        finally:
+            with self._lock:
+                self._async_calls.pop(key, None)
+
+    def _count_coalesced(self) -> None:
+        # Async followers count once they get the leader's outcome, not when they start
+        # waiting: one that takes over from a cancelled leader is an execution instead
+        with self._lock:
+            self._stats["coalesced"] += 1
+
+    def stats(self) -> Dict:
+        """Execution and coalescing counts plus currently in-flight keys."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls) + len(self._async_calls)
+            return stats
+
+
+class AdmissionRejected(Exception):
+    """Raised when an LLM call can't be admitted; carries a Retry-After hint."""
+
+    def __init__(self, controller: str, reason: str, retry_after: float):
+        self.controller = controller
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{controller} is saturated ({reason}), retry after {retry_after:.0f}s")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, up to `burst` stored.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        Take one token, possibly from the future.
+
+        Returns:
+            Seconds to wait before using the token, or None (nothing taken)
+            if that would exceed max_wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+
+            wait = (1 - self._tokens) / self.rate
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+
+class _Waiter:
+    """A queued admission request, woken from a thread or the event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def grant(self) -> bool:
+        if self.cancelled:
+            return False
+        self.granted = True
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._resolve)
+        else:
+            self.event.set()
+        return True
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class AdmissionController:
+    """
+    Bounds concurrent LLM calls for one provider/model.
+
+    At most max_in_flight calls run at once; up to max_queue more wait in
+    FIFO order for at most queue_timeout seconds. An optional token bucket
+    caps the request rate. Anything that can't be admitted in time is
+    rejected immediately with AdmissionRejected instead of piling up and
+    turning provider 429s into slow 500s.
+
+    Works for both threads (admit) and coroutines (admit_async); both share
+    the same slots and queue.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int = 8,
+        max_queue: int = 32,
+        queue_timeout: float = 10.0,
+        rate_per_second: float = 0.0,
+        burst: float = None
+    ):
+        """
+        Args:
+            name: Label, usually "provider:model"
+            max_in_flight: Concurrent calls allowed
+            max_queue: Calls allowed to wait for a slot
+            queue_timeout: Longest a call may wait (slot + rate limit) before rejection
+            rate_per_second: Token-bucket rate; 0 disables rate limiting
+            burst: Token-bucket capacity (defaults to max_in_flight)
+        """
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.bucket = TokenBucket(rate_per_second, burst or max_in_flight) if rate_per_second > 0 else None
+
+        self._in_flight = 0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+        self._avg_service_time = 1.0
+        self._stats = {
+            "admitted": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+            "rejected_rate_limited": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def _retry_after(self) -> float:
+        """Rough time until a slot frees up, from the average call duration."""
+        backlog = len(self._waiters) + 1
+        return max(1.0, self._avg_service_time * backlog / self.max_in_flight)
+
+    def _reject(self, reason: str):
+        self._stats[f"rejected_{reason}"] += 1
+        raise AdmissionRejected(self.name, reason, self._retry_after())
+
+    def _enter_or_enqueue(self, waiter: _Waiter) -> bool:
+        """Take a slot now (True) or join the queue (False); reject if the queue is full."""
+        with self._lock:
+            if self._in_flight < self.max_in_flight and not self._waiters:
+                self._in_flight += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                self._reject("queue_full")
+            self._waiters.append(waiter)
+            return False
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Leave the queue after a timeout/cancel. True if a slot was granted meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            waiter.cancelled = True
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            return False
+
+    def _release(self, service_time: float = None):
+        with self._lock:
+            if service_time is not None:
+                self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * service_time
+            while self._waiters:
+                if self._waiters.popleft().grant():
+                    return  # slot handed straight to the next waiter
+            self._in_flight -= 1
+
+    def _admitted(self, waited: float):
+        with self._lock:
+            self._stats["admitted"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+
+    def _rate_delay(self, remaining: float) -> float:
+        """Seconds to wait for a rate-limit token; releases the slot and rejects if too long."""
+        if not self.bucket:
+            return 0.0
+        delay = self.bucket.reserve(max(0.0, remaining))
+        if delay is None:
+            self._release()
+            with self._lock:
+                self._reject("rate_limited")
+        return delay
+
+    @contextmanager
+    def admit(self):
+        """Hold an LLM slot for the duration of a blocking call."""
+        start = time.monotonic()
+        waiter = _Waiter()
+        if not self._enter_or_enqueue(waiter):
+            if not waiter.event.wait(self.queue_timeout) and not self._abandon(waiter):
+                with self._lock:
+                    self._reject("timeout")
+
+        delay = self._rate_delay(self.queue_timeout - (time.monotonic() - start))
+        if delay:
+            time.sleep(delay)
+
+        self._admitted(time.monotonic() - start)
+        call_start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - call_start)
+
+    @asynccontextmanager
+    async def admit_async(self):
+        """Hold an LLM slot for the duration of an awaited call or stream."""
+        start = time.monotonic()
+        waiter = _Waiter(asyncio.get_running_loop())
+        if not self._enter_or_enqueue(waiter):
+            try:
+                await asyncio.wait_for(waiter.future, self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    with self._lock:
+                        self._reject("timeout")
+            except BaseException:
+                # Caller cancelled while queued: give back a slot we may have been handed
+                if self._abandon(waiter):
+                    self._release()
+                raise
+
+        try:
+            delay = self._rate_delay(self.queue_timeout - (time.monotonic() - start))
+            if delay:
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self._release()
+            raise
+
+        self._admitted(time.monotonic() - start)
+        call_start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - call_start)
+
+    def stats(self) -> Dict:
+        """Current queue depth and in-flight calls plus admission counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["name"] = self.name
+            stats["in_flight"] = self._in_flight
+            stats["queue_depth"] = len(self._waiters)
+            stats["max_in_flight"] = self.max_in_flight
+            stats["max_queue"] = self.max_queue
+            stats["avg_wait_seconds"] = (
+                round(stats["wait_seconds_total"] / stats["admitted"], 4) if stats["admitted"] else 0.0
+            )
+            stats["avg_call_seconds"] = round(self._avg_service_time, 4)
+            return stats
+
+
+_admission_controllers: Dict[str, AdmissionController] = {}
+_admission_controllers_lock = threading.Lock()
+
+
+def _provider_setting(name: str, provider: str, default: str) -> str:
+    """Read NAME_<PROVIDER> if set, else NAME, else the default."""
+    return os.getenv(f"{name}_{provider.upper()}", os.getenv(name, default))
+
+
+def get_admission_controller(provider: str, model: str) -> AdmissionController:
+    """
+    Return the shared admission controller for a provider/model pair.
+
+    Limits come from LLM_MAX_IN_FLIGHT, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT_SECONDS,
+    LLM_RATE_PER_SECOND and LLM_RATE_BURST, each overridable per provider
+    with a suffix (e.g. LLM_MAX_IN_FLIGHT_GROQ).
+    """
+    key = f"{provider}:{model}"
+    controller = _admission_controllers.get(key)
+    if controller is None:
+        with _admission_controllers_lock:
+            controller = _admission_controllers.get(key)
+            if controller is None:
+                burst = _provider_setting("LLM_RATE_BURST", provider, "")
+                controller = AdmissionController(
+                    key,
+                    max_in_flight=int(_provider_setting("LLM_MAX_IN_FLIGHT", provider, "8")),
+                    max_queue=int(_provider_setting("LLM_MAX_QUEUE", provider, "32")),
+                    queue_timeout=float(_provider_setting("LLM_QUEUE_TIMEOUT_SECONDS", provider, "10")),
+                    rate_per_second=float(_provider_setting("LLM_RATE_PER_SECOND", provider, "0")),
+                    burst=float(burst) if burst else None,
+                )
+                _admission_controllers[key] = controller
+    return controller
+
+
+def admission_stats() -> List[Dict]:
+    """Stats for every admission controller created so far."""
+    with _admission_controllers_lock:
+        controllers = list(_admission_controllers.values())
+    return [controller.stats() for controller in controllers]
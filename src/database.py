@@ -1,13 +1,60 @@
+import os
 import sqlite3
 import uuid 
 import hashlib
 import logging
-from typing import Dict, List, Optional
+import re
+import json
+import time
+from typing import Any, Dict, List, Optional
 
 # FIX: Use proper logging instead of print statements
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Collections named like this hold exactly one document; any other collection is shared
+PER_DOCUMENT_COLLECTION_PREFIX = "doc_"
+
+
+def collection_name_for_document(
+    document_id: str,
+    layout: Optional[str] = None,
+    shared_name: Optional[str] = None,
+    shards: Optional[int] = None
+) -> str:
+    """
+    Chroma collection a new document's chunks are stored in.
+
+    With VECTOR_STORAGE_LAYOUT=per_document (default) every document gets
+    its own doc_<id> collection. With 'shared', documents go to
+    CHROMA_SHARED_COLLECTION, or to one of CHROMA_SHARED_SHARDS shards of
+    it picked by document ID, and are told apart by a document_id filter.
+
+    Args:
+        document_id: Document identifier
+        layout: 'per_document' or 'shared' (default: VECTOR_STORAGE_LAYOUT)
+        shared_name: Shared collection name (default: CHROMA_SHARED_COLLECTION)
+        shards: Number of shared collections (default: CHROMA_SHARED_SHARDS)
+
+    Returns:
+        str: Collection name
+    """
+    layout = layout or os.getenv("VECTOR_STORAGE_LAYOUT", "per_document")
+    if layout == "per_document":
+        return f"{PER_DOCUMENT_COLLECTION_PREFIX}{document_id[:16]}"
+    if layout != "shared":
+        raise ValueError(f"Unknown VECTOR_STORAGE_LAYOUT: {layout!r} (expected 'per_document' or 'shared')")
+
+    shared_name = shared_name or os.getenv("CHROMA_SHARED_COLLECTION", "rag_shared")
+    if shared_name.startswith(PER_DOCUMENT_COLLECTION_PREFIX):
+        # Searches in doc_* collections are not filtered by document
+        raise ValueError(f"Shared collection name must not start with {PER_DOCUMENT_COLLECTION_PREFIX!r}")
+    shards = shards or int(os.getenv("CHROMA_SHARED_SHARDS", "1"))
+    if shards <= 1:
+        return shared_name
+    shard = int(hashlib.sha256(document_id.encode("utf-8")).hexdigest(), 16) % shards
+    return f"{shared_name}-{shard:02d}"
+
 
 class RAGDatabase:
     """Handles all database operations for the RAG Engine"""
@@ -45,9 +92,9 @@ class RAGDatabase:
             self.conn.execute("PRAGMA foreign_keys = ON")
             self.conn.row_factory = sqlite3.Row  # Responsible for dict like behaviour
             self.cursor = self.conn.cursor()
-            logger.info(f"Connected to database: {self.db_path}")
+            logger.info("Connected to database: %s", self.db_path)
         except sqlite3.Error as e:
-            logger.error(f"Database connection error: {e}")
+            logger.error("Database connection error: %s", e)
             raise
 
     def create_tables(self):
@@ -59,6 +106,10 @@ class RAGDatabase:
         - documents: Stores unique document metadata
         - session_documents: Many-to-many relationship between sessions and documents
         - messages: Stores chat history for each session
+        - messages_fts: FTS5 index over message content, synced by triggers
+        - answer_cache: Exact-match LLM answers keyed by document/question/model
+        - session_summaries: Rolling summary of each session's older messages
+        - slow_requests: Requests over the slow threshold with their stage timings
         
         Also creates indexes on foreign keys for query performance
         
@@ -124,7 +175,114 @@ class RAGDatabase:
             )
             """)
             
+            # Table 6: Full-text index over message content (FTS5, external content)
+            # Shadows `messages` so search never needs a LIKE scan; kept in sync by triggers below
+            self.cursor.execute("""
+            SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'
+            """)
+            fts_existed = self.cursor.fetchone() is not None
+
+            self.cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                content,
+                content='messages',
+                content_rowid='message_id',
+                tokenize='porter unicode61'
+            )
+            """)
+
+            self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, content) VALUES (new.message_id, new.content);
+            END
+            """)
+
+            self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content)
+                VALUES ('delete', old.message_id, old.content);
+            END
+            """)
+
+            self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content)
+                VALUES ('delete', old.message_id, old.content);
+                INSERT INTO messages_fts(rowid, content) VALUES (new.message_id, new.content);
+            END
+            """)
+
+            # Backfill the index once for databases created before FTS existed
+            if not fts_existed:
+                self.cursor.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+                logger.info("Built full-text index for existing messages")
+
+            # Table 7: Exact-match answer cache (shared across sessions of a document)
+            self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS answer_cache(
+                cache_key TEXT PRIMARY KEY,
+                document_id TEXT NOT NULL,
+                question TEXT NOT NULL,
+                model TEXT,
+                n_results INTEGER,
+                prompt_version TEXT,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hit_count INTEGER DEFAULT 0,
+                FOREIGN KEY (document_id) REFERENCES documents(document_id) ON DELETE CASCADE
+            )
+            """)
+
+            # Table 8: Rolling conversation summary (covers messages up to last_message_id)
+            self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS session_summaries(
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                last_message_id INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                FOREIGN KEY (session_id) REFERENCES sessions(session_id) ON DELETE CASCADE
+            )
+            """)
+
+            # Table 9: Slow request log (no foreign keys: entries outlive deleted sessions)
+            self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS slow_requests(
+                request_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                trace_id TEXT NOT NULL,
+                method TEXT NOT NULL,
+                route TEXT NOT NULL,
+                status INTEGER,
+                duration_ms REAL NOT NULL,
+                session_id TEXT,
+                document_id TEXT,
+                chunk_count INTEGER,
+                context_chars INTEGER,
+                model TEXT,
+                cache TEXT,
+                question TEXT,
+                stages TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """)
+
             # Creates indexes for faster queries
+            self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_slow_requests_created
+            ON slow_requests(created_at)
+            """)
+
+            self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_answer_cache_last_used
+            ON answer_cache(last_used_at)
+            """)
+
+            self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_answer_cache_document
+            ON answer_cache(document_id)
+            """)
+
             self.cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_messages_session
             ON messages(session_id)
@@ -145,7 +303,7 @@ class RAGDatabase:
             logger.info("Database tables created/verified successfully")
             
         except sqlite3.Error as e:
-            logger.error(f"Error creating tables: {e}")
+            logger.error("Error creating tables: %s", e)
             raise
 
     def close(self):
@@ -155,7 +313,7 @@ class RAGDatabase:
                 self.conn.close()
                 logger.info("Database connection closed")
             except sqlite3.Error as e:
-                logger.error(f"Error closing database: {e}")
+                logger.error("Error closing database: %s", e)
 
 # =================================================================================
 # Helper Functions
@@ -266,11 +424,11 @@ class RAGDatabase:
             VALUES (?, datetime('now', 'localtime'), datetime('now', 'localtime'))
             """, (session_id,))
             self.conn.commit()
-            logger.info(f"Session created: {session_id[:8]}...")
+            logger.info("Session created: %s...", session_id[:8])
         except sqlite3.IntegrityError:
-            logger.warning(f"Session {session_id[:8]}... already exists")
+            logger.warning("Session %s... already exists", session_id[:8])
         except sqlite3.Error as e:
-            logger.error(f"Error creating session: {e}")
+            logger.error("Error creating session: %s", e)
             raise
 
     def get_session_info(self, session_id: str) -> Optional[Dict]:
@@ -308,7 +466,7 @@ class RAGDatabase:
             row = self.cursor.fetchone()
             
             if not row:
-                logger.warning(f"Session {session_id[:8]}... not found")
+                logger.warning("Session %s... not found", session_id[:8])
                 return None
             
             return {
@@ -319,7 +477,7 @@ class RAGDatabase:
                 'document_count': row['document_count']
             }
         except sqlite3.Error as e:
-            logger.error(f"Error getting session info: {e}")
+            logger.error("Error getting session info: %s", e)
             return None
     
     def update_last_active(self, session_id: str) -> None:
@@ -343,11 +501,11 @@ class RAGDatabase:
             self.conn.commit()
             
             if self.cursor.rowcount > 0:
-                logger.debug(f"Updated last_active for session {session_id[:8]}...")
+                logger.debug("Updated last_active for session %s...", session_id[:8])
             else:
-                logger.warning(f"Session {session_id[:8]}... not found for update")
+                logger.warning("Session %s... not found for update", session_id[:8])
         except sqlite3.Error as e:
-            logger.error(f"Error updating last_active: {e}")
+            logger.error("Error updating last_active: %s", e)
          
 # ================================================================================
 # Document Operations
@@ -388,7 +546,7 @@ class RAGDatabase:
 
             if existing_doc:
                 # Document exists, can reuse those chunks
-                logger.info(f"Document already exists (ID: {document_id[:8]}...)")
+                logger.info("Document already exists (ID: %s...)", document_id[:8])
 
                 collection_name = existing_doc['chromadb_collection_name']
 
@@ -409,18 +567,40 @@ class RAGDatabase:
             
             else:
                 # New document, processing needed
-                logger.info(f"New document detected, initializing... (ID: {document_id[:8]}...)")
+                logger.info("New document detected, initializing... (ID: %s...)", document_id[:8])
 
-                collection_name = f"doc_{document_id[:16]}"
+                collection_name = collection_name_for_document(document_id)
 
                 chunk_count = None
                 # This is a placeholder (None), will be updated after actual chunking
 
                 # Insert into documents table
-                self.cursor.execute("""
-                INSERT INTO documents(document_id, filename, file_hash, chunk_count, chromadb_collection_name)
-                VALUES(?, ?, ?, ?, ?)
-                """, (document_id, filename, file_hash, chunk_count, collection_name))
+                try:
+                    self.cursor.execute("""
+                    INSERT INTO documents(document_id, filename, file_hash, chunk_count, chromadb_collection_name)
+                    VALUES(?, ?, ?, ?, ?)
+                    """, (document_id, filename, file_hash, chunk_count, collection_name))
+                except sqlite3.IntegrityError:
+                    # Another worker registered the same content in the meantime: reuse it
+                    self.conn.rollback()
+                    logger.info("Document registered concurrently, reusing (ID: %s...)", document_id[:8])
+                    # Its collection may differ from ours (other storage layout, or already migrated)
+                    self.cursor.execute("""
+                        SELECT chromadb_collection_name FROM documents WHERE document_id = ?
+                    """, (document_id,))
+                    collection_name = self.cursor.fetchone()['chromadb_collection_name']
+                    self.cursor.execute("""
+                        INSERT OR IGNORE INTO session_documents(session_id, document_id)
+                        VALUES(?, ?)
+                    """, (session_id, document_id))
+                    self.conn.commit()
+
+                    return {
+                        'session_id': session_id,
+                        'document_id': document_id,
+                        'collection_name': collection_name,
+                        'was_processed': False
+                    }
 
                 # Link to session
                 self.cursor.execute("""
@@ -438,10 +618,10 @@ class RAGDatabase:
                 }
         
         except sqlite3.Error as e:
-            logger.error(f"Database error in process_file_upload: {e}")
+            logger.error("Database error in process_file_upload: %s", e)
             raise
         except Exception as e:
-            logger.error(f"Unexpected error in process_file_upload: {e}")
+            logger.error("Unexpected error in process_file_upload: %s", e)
             raise
 
     def get_document_by_session(self, session_id: str) -> Optional[Dict]:
@@ -485,7 +665,7 @@ class RAGDatabase:
             row = self.cursor.fetchone()
             
             if not row:
-                logger.warning(f"No document found for session {session_id[:8]}...")
+                logger.warning("No document found for session %s...", session_id[:8])
                 return None
             
             return {
@@ -498,7 +678,7 @@ class RAGDatabase:
                 'uploaded_at': row['uploaded_at']
             }
         except sqlite3.Error as e:
-            logger.error(f"Error getting document by session: {e}")
+            logger.error("Error getting document by session: %s", e)
             return None
 
     def update_chunk_count(self, document_id: str, chunk_count: int) -> None:
@@ -514,9 +694,73 @@ class RAGDatabase:
                 UPDATE documents SET chunk_count = ? WHERE document_id = ?
             """, (chunk_count, document_id))
             self.conn.commit()
-            logger.info(f"Updated chunk count for document {document_id[:8]}... to {chunk_count}")
+            logger.info("Updated chunk count for document %s... to %s", document_id[:8], chunk_count)
+        except sqlite3.Error as e:
+            logger.error("Error updating chunk count: %s", e)
+            raise
+
+    def list_documents(self) -> List[Dict]:
+        """
+        All documents with the collection their chunks are stored in
+
+        Returns:
+            List[Dict]: document_id, filename, chunk_count, collection_name
+        """
+        try:
+            self.cursor.execute("""
+                SELECT document_id, filename, chunk_count, chromadb_collection_name AS collection_name
+                FROM documents
+                ORDER BY rowid
+            """)
+            return [dict(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error("Error listing documents: %s", e)
+            return []
+
+    def get_recent_collections(self, limit: int = 5) -> List[str]:
+        """
+        Collections of the most recently used documents (by session activity,
+        or upload time for documents no session has used)
+
+        Args:
+            limit: Maximum number of collections
+
+        Returns:
+            List[str]: Collection names, most recently used first
+        """
+        try:
+            self.cursor.execute("""
+                SELECT d.chromadb_collection_name AS collection_name,
+                       MAX(COALESCE(s.last_active, d.upload_timestamp)) AS last_used
+                FROM documents d
+                LEFT JOIN session_documents sd ON sd.document_id = d.document_id
+                LEFT JOIN sessions s ON s.session_id = sd.session_id
+                WHERE d.chromadb_collection_name IS NOT NULL
+                GROUP BY d.chromadb_collection_name
+                ORDER BY last_used DESC
+                LIMIT ?
+            """, (limit,))
+            return [row["collection_name"] for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error("Error listing recent collections: %s", e)
+            return []
+
+    def update_collection_name(self, document_id: str, collection_name: str) -> None:
+        """
+        Point a document at the collection its chunks were moved to
+
+        Args:
+            document_id: Document identifier
+            collection_name: New ChromaDB collection name
+        """
+        try:
+            self.cursor.execute("""
+                UPDATE documents SET chromadb_collection_name = ? WHERE document_id = ?
+            """, (collection_name, document_id))
+            self.conn.commit()
+            logger.info("Document %s... now stored in %s", document_id[:8], collection_name)
         except sqlite3.Error as e:
-            logger.error(f"Error updating chunk count: {e}")
+            logger.error("Error updating collection name: %s", e)
             raise
 
     def check_document_exists(self, document_id: str) -> bool:
@@ -541,13 +785,13 @@ class RAGDatabase:
             exists = self.cursor.fetchone() is not None
             
             if exists:
-                logger.debug(f"Document {document_id[:8]}... exists")
+                logger.debug("Document %s... exists", document_id[:8])
             else:
-                logger.debug(f"Document {document_id[:8]}... not found")
+                logger.debug("Document %s... not found", document_id[:8])
             
             return exists
         except sqlite3.Error as e:
-            logger.error(f"Error checking document existence: {e}")
+            logger.error("Error checking document existence: %s", e)
             return False
 
 # =================================================================================
@@ -584,11 +828,11 @@ class RAGDatabase:
             # Commit the transaction
             self.conn.commit()
 
-            logger.info(f"Message added (ID: {message_id}, Role: {role})")
+            logger.info("Message added (ID: %s, Role: %s)", message_id, role)
 
             return message_id
         except sqlite3.Error as e:
-            logger.error(f"Error adding message: {e}")
+            logger.error("Error adding message: %s", e)
             return None
     
     def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[Dict]:
@@ -613,7 +857,7 @@ class RAGDatabase:
             SELECT message_id, session_id, role, content, timestamp
             FROM messages
             WHERE session_id = ?
-            ORDER BY timestamp ASC
+            ORDER BY timestamp ASC, message_id ASC
             """
             if limit:
                 query += f" LIMIT {int(limit)}"  # FIX: Ensure limit is integer
@@ -634,11 +878,11 @@ class RAGDatabase:
                     'timestamp': row['timestamp']
                 })
 
-            logger.info(f"Retrieved {len(messages)} messages for session {session_id[:8]}...")
+            logger.info("Retrieved %d messages for session %s...", len(messages), session_id[:8])
         
             return messages
         except sqlite3.Error as e:
-            logger.error(f"Error getting messages: {e}")
+            logger.error("Error getting messages: %s", e)
             return []
     
     def get_last_n_messages(self, session_id: str, n: int = 5) -> List[Dict]:
@@ -661,7 +905,7 @@ class RAGDatabase:
                 SELECT message_id, session_id, role, content, timestamp
                 FROM messages
                 WHERE session_id = ?
-                ORDER BY timestamp DESC
+                ORDER BY timestamp DESC, message_id DESC
                 LIMIT ?
             """, (session_id, n))
             
@@ -680,6 +924,429 @@ class RAGDatabase:
             # Reverse so oldest message is first (chat display order)
             return messages[::-1]
         except sqlite3.Error as e:
-            logger.error(f"Error getting last N messages: {e}")
+            logger.error("Error getting last N messages: %s", e)
+            return []
+        
+
+    def search_messages(
+        self,
+        query: str,
+        session_id: Optional[str] = None,
+        document_id: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[Dict]:
+        """
+        Full-text search over chat history across all sessions
+        
+        Args:
+            query: Free-text search terms (all terms must match)
+            session_id: Optional filter to a single session
+            document_id: Optional filter to sessions linked to a document
+            limit: Maximum number of hits to return
+            offset: Number of hits to skip (for pagination)
+        
+        Returns:
+            List of hit dictionaries, best match first
+            Each dict contains: message_id, session_id, document_id, role,
+            snippet, score, timestamp
+        
+        Note:
+            Uses the messages_fts index (BM25 ranking), so cost depends on the
+            number of matches rather than the size of the messages table
+        """
+        match_query = self._build_fts_query(query)
+        if not match_query:
+            return []
+
+        try:
+            sql = """
+            SELECT
+                m.message_id,
+                m.session_id,
+                m.role,
+                m.timestamp,
+                (SELECT sd.document_id FROM session_documents sd
+                 WHERE sd.session_id = m.session_id LIMIT 1) AS document_id,
+                snippet(messages_fts, 0, '<mark>', '</mark>', '...', 16) AS snippet,
+                bm25(messages_fts) AS score
+            FROM messages_fts
+            JOIN messages m ON m.message_id = messages_fts.rowid
+            WHERE messages_fts MATCH ?
+            """
+            params: List = [match_query]
+
+            if session_id:
+                sql += " AND m.session_id = ?"
+                params.append(session_id)
+
+            if document_id:
+                sql += """ AND m.session_id IN (
+                    SELECT session_id FROM session_documents WHERE document_id = ?
+                )"""
+                params.append(document_id)
+
+            sql += " ORDER BY rank LIMIT ? OFFSET ?"
+            params.extend([int(limit), int(offset)])
+
+            self.cursor.execute(sql, params)
+            rows = self.cursor.fetchall()
+
+            hits = []
+            for row in rows:
+                hits.append({
+                    'message_id': row['message_id'],
+                    'session_id': row['session_id'],
+                    'document_id': row['document_id'],
+                    'role': row['role'],
+                    'snippet': row['snippet'],
+                    'score': round(-row['score'], 4),  # bm25() is lower-is-better
+                    'timestamp': row['timestamp']
+                })
+
+            logger.info("Full-text search returned %d hits", len(hits))
+            return hits
+        except sqlite3.Error as e:
+            logger.error("Error searching messages: %s", e)
+            return []
+
+    @staticmethod
+    def _build_fts_query(query: str) -> str:
+        """
+        Turn free user text into a safe FTS5 MATCH expression
+        
+        Each word is quoted so FTS5 operators and punctuation in the
+        input can't cause syntax errors; terms are implicitly AND-ed.
+        """
+        terms = re.findall(r"\w+", query or "")
+        return " ".join(f'"{term}"' for term in terms)
+
+# =================================================================================
+# Answer Cache Operations
+
+    def get_cached_answer(self, cache_key: str, ttl_seconds: float) -> Optional[Dict]:
+        """
+        Look up a cached answer and record the hit
+        
+        Args:
+            cache_key: Key from cache.make_answer_cache_key
+            ttl_seconds: Entries older than this are treated as expired
+        
+        Returns:
+            Dictionary with 'answer', 'sources', 'created_at', 'hit_count'
+            or None on miss/expiry
+        """
+        try:
+            now = time.time()
+            self.cursor.execute("""
+                SELECT answer, sources, created_at, hit_count
+                FROM answer_cache
+                WHERE cache_key = ?
+            """, (cache_key,))
+
+            row = self.cursor.fetchone()
+
+            if not row:
+                return None
+
+            if ttl_seconds and now - row['created_at'] > ttl_seconds:
+                self.cursor.execute("DELETE FROM answer_cache WHERE cache_key = ?", (cache_key,))
+                self.conn.commit()
+                logger.debug("Answer cache entry %s... expired", cache_key[:8])
+                return None
+
+            self.cursor.execute("""
+                UPDATE answer_cache
+                SET last_used_at = ?, hit_count = hit_count + 1
+                WHERE cache_key = ?
+            """, (now, cache_key))
+            self.conn.commit()
+
+            return {
+                'answer': row['answer'],
+                'sources': json.loads(row['sources']),
+                'created_at': row['created_at'],
+                'hit_count': row['hit_count'] + 1
+            }
+        except sqlite3.Error as e:
+            logger.error("Error reading answer cache: %s", e)
+            return None
+
+    def save_cached_answer(
+        self,
+        cache_key: str,
+        document_id: str,
+        question: str,
+        model: Optional[str],
+        n_results: int,
+        prompt_version: str,
+        answer: str,
+        sources: List[str],
+        max_entries: int = 10000,
+        ttl_seconds: Optional[float] = None
+    ) -> None:
+        """
+        Store an answer and enforce TTL and size limits
+        
+        Args:
+            cache_key: Key from cache.make_answer_cache_key
+            document_id: Document the answer was grounded in
+            question: Normalized question (kept for inspection/debugging)
+            model: LLM model name
+            n_results: Number of retrieved chunks
+            prompt_version: Prompt template version tag
+            answer: LLM answer text
+            sources: Retrieved chunks returned alongside the answer
+            max_entries: Least recently used entries beyond this are evicted
+            ttl_seconds: If given, expired entries are purged as well
+        """
+        try:
+            now = time.time()
+            self.cursor.execute("""
+                INSERT OR REPLACE INTO answer_cache(
+                    cache_key, document_id, question, model, n_results, prompt_version,
+                    answer, sources, created_at, last_used_at, hit_count
+                )
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+            """, (cache_key, document_id, question, model, n_results, prompt_version,
+                  answer, json.dumps(sources), now, now))
+
+            if ttl_seconds:
+                self.cursor.execute(
+                    "DELETE FROM answer_cache WHERE created_at < ?",
+                    (now - ttl_seconds,)
+                )
+
+            # Size-based eviction: drop everything past the newest max_entries (LRU)
+            self.cursor.execute("""
+                DELETE FROM answer_cache WHERE cache_key IN (
+                    SELECT cache_key FROM answer_cache
+                    ORDER BY last_used_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (int(max_entries),))
+
+            self.conn.commit()
+            logger.debug("Cached answer %s... for document %s...", cache_key[:8], document_id[:8])
+        except sqlite3.Error as e:
+            logger.error("Error writing answer cache: %s", e)
+
+# =================================================================================
+# Conversation Summary Operations
+
+    def get_session_summary(self, session_id: str) -> Optional[Dict]:
+        """
+        Get the rolling summary of a session's older messages
+        
+        Args:
+            session_id: Session identifier
+        
+        Returns:
+            Dictionary with 'summary', 'last_message_id' (newest message the
+            summary covers) and 'updated_at', or None if there is none yet
+        """
+        try:
+            self.cursor.execute("""
+                SELECT summary, last_message_id, updated_at
+                FROM session_summaries
+                WHERE session_id = ?
+            """, (session_id,))
+
+            row = self.cursor.fetchone()
+
+            if not row:
+                return None
+
+            return {
+                'summary': row['summary'],
+                'last_message_id': row['last_message_id'],
+                'updated_at': row['updated_at']
+            }
+        except sqlite3.Error as e:
+            logger.error("Error getting session summary: %s", e)
+            return None
+
+    def save_session_summary(self, session_id: str, summary: str, last_message_id: int) -> None:
+        """
+        Store a session's rolling summary
+        
+        Args:
+            session_id: Session identifier
+            summary: Summary text
+            last_message_id: Newest message folded into the summary
+        """
+        try:
+            self.cursor.execute("""
+                INSERT INTO session_summaries(session_id, summary, last_message_id, updated_at)
+                VALUES(?, ?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    last_message_id = excluded.last_message_id,
+                    updated_at = excluded.updated_at
+                WHERE excluded.last_message_id > session_summaries.last_message_id
+            """, (session_id, summary, last_message_id, time.time()))
+            self.conn.commit()
+            logger.info("Summary saved for session %s... (up to message %s)", session_id[:8], last_message_id)
+        except sqlite3.Error as e:
+            logger.error("Error saving session summary: %s", e)
+
+    def get_messages_after(self, session_id: str, after_message_id: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Get a session's messages newer than a given message
+        
+        Args:
+            session_id: Session identifier
+            after_message_id: Only messages with a larger message_id are returned
+            limit: If given, only the newest `limit` of them
+        
+        Returns:
+            List of messages, ordered oldest to newest
+        """
+        try:
+            self.cursor.execute("""
+                SELECT message_id, session_id, role, content, timestamp
+                FROM messages
+                WHERE session_id = ? AND message_id > ?
+                ORDER BY message_id DESC
+                LIMIT ?
+            """, (session_id, after_message_id or 0, -1 if limit is None else int(limit)))
+
+            rows = self.cursor.fetchall()
+
+            messages = [{
+                'message_id': row['message_id'],
+                'session_id': row['session_id'],
+                'role': row['role'],
+                'content': row['content'],
+                'timestamp': row['timestamp']
+            } for row in rows]
+
+            return messages[::-1]
+        except sqlite3.Error as e:
+            logger.error("Error getting messages: %s", e)
+            return []
+
+# =================================================================================
+# Slow Request Log Operations
+
+    def record_slow_request(self, entry: Dict, max_rows: int = 10000) -> None:
+        """
+        Store a slow request and keep only the newest max_rows entries
+        
+        Args:
+            entry: Dictionary with 'trace_id', 'method', 'route', 'status',
+                   'duration_ms' and 'stages' (stage -> ms), plus optional
+                   'session_id', 'document_id', 'chunk_count', 'context_chars',
+                   'model', 'cache' and 'question'
+            max_rows: Older entries beyond this count are deleted
+        """
+        try:
+            self.cursor.execute("""
+                INSERT INTO slow_requests(
+                    trace_id, method, route, status, duration_ms, session_id, document_id,
+                    chunk_count, context_chars, model, cache, question, stages, created_at
+                )
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                entry["trace_id"], entry["method"], entry["route"], entry.get("status"),
+                entry["duration_ms"], entry.get("session_id"), entry.get("document_id"),
+                entry.get("chunk_count"), entry.get("context_chars"), entry.get("model"),
+                entry.get("cache"), entry.get("question"), json.dumps(entry.get("stages") or {}),
+                entry.get("created_at", time.time())
+            ))
+
+            self.cursor.execute("""
+                DELETE FROM slow_requests WHERE request_id IN (
+                    SELECT request_id FROM slow_requests
+                    ORDER BY request_id DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (int(max_rows),))
+
+            self.conn.commit()
+            logger.debug("Slow request logged: %s %.0f ms", entry["route"], entry["duration_ms"])
+        except sqlite3.Error as e:
+            logger.error("Error logging slow request: %s", e)
+
+    def get_slow_requests(
+        self,
+        since: float = 0,
+        route: Optional[str] = None,
+        document_id: Optional[str] = None,
+        limit: int = 20
+    ) -> List[Dict]:
+        """
+        Get the slowest logged requests
+        
+        Args:
+            since: Only requests logged at or after this UNIX timestamp
+            route: Optional route filter (e.g. '/query')
+            document_id: Optional document filter
+            limit: Maximum number of entries
+        
+        Returns:
+            List of entries ordered by duration (slowest first), with
+            'stages' decoded to a dict of stage -> ms
+        """
+        try:
+            conditions = ["created_at >= ?"]
+            params: List[Any] = [since]
+            if route:
+                conditions.append("route = ?")
+                params.append(route)
+            if document_id:
+                conditions.append("document_id = ?")
+                params.append(document_id)
+            params.append(int(limit))
+
+            self.cursor.execute(f"""
+                SELECT *
+                FROM slow_requests
+                WHERE {" AND ".join(conditions)}
+                ORDER BY duration_ms DESC
+                LIMIT ?
+            """, params)
+
+            entries = []
+            for row in self.cursor.fetchall():
+                entry = dict(row)
+                entry["stages"] = json.loads(entry["stages"] or "{}")
+                entries.append(entry)
+            return entries
+        except sqlite3.Error as e:
+            logger.error("Error getting slow requests: %s", e)
+            return []
+
+    def get_slow_documents(self, since: float = 0, limit: int = 20) -> List[Dict]:
+        """
+        Aggregate the slow request log per document
+        
+        Args:
+            since: Only requests logged at or after this UNIX timestamp
+            limit: Maximum number of documents
+        
+        Returns:
+            List of dicts with 'document_id', 'filename', 'chunk_count',
+            'slow_requests', 'avg_duration_ms' and 'max_duration_ms',
+            ordered by number of slow requests
+        """
+        try:
+            self.cursor.execute("""
+                SELECT
+                    s.document_id,
+                    d.filename,
+                    MAX(s.chunk_count) AS chunk_count,
+                    COUNT(*) AS slow_requests,
+                    ROUND(AVG(s.duration_ms), 2) AS avg_duration_ms,
+                    MAX(s.duration_ms) AS max_duration_ms
+                FROM slow_requests s
+                LEFT JOIN documents d ON d.document_id = s.document_id
+                WHERE s.created_at >= ? AND s.document_id IS NOT NULL
+                GROUP BY s.document_id
+                ORDER BY slow_requests DESC, max_duration_ms DESC
+                LIMIT ?
+            """, (since, int(limit)))
+            return [dict(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error("Error aggregating slow requests: %s", e)
             return []
-        
\ No newline at end of file
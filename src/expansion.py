@@ -0,0 +1,134 @@
+import re
+from typing import Dict, List
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from .cache import normalize_question
+
+# Words that carry no search signal on their own
+_STOPWORDS = frozenset(
+    "a an the and or but of to in on at by for with from about into over under between "
+    "is are was were be been being do does did has have had can could should would will "
+    "what which who whom whose when where why how whats tell me explain describe give list "
+    "i you we they it its this that these those there their my our your please any some "
+    "all each every more most other such than then so as if not no".split()
+)
+
+# Clause boundaries of broad, multi-part questions ("X and Y", "A vs B", "P; Q")
+_CLAUSE_SPLIT = re.compile(r"\s*(?:[;,?]|\band\b|\bor\b|\bversus\b|\bvs\b\.?|\balso\b)\s*", re.IGNORECASE)
+
+_WORD = re.compile(r"[\w'-]+")
+
+EXPANSION_PROMPT = ChatPromptTemplate.from_template(
+    "Write {count} short search queries that together cover everything needed to "
+    "answer the question below. Cover different aspects or sub-questions; keep names, "
+    "numbers and key terms. Return one query per line, nothing else."
+    "\n\nQuestion: {question}\n\nQueries:"
+)
+
+
+def _content_words(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def expand_query(question: str, max_queries: int = 4) -> List[str]:
+    """
+    Expand a question into sub-queries with local heuristics (no LLM call).
+
+    The original question always comes first, followed by its clauses when
+    it asks about several things, then a keyword-only form.
+
+    Args:
+        question: User (or condensed) question
+        max_queries: Upper bound on the returned queries, original included
+
+    Returns:
+        List[str]: Distinct queries, original first
+    """
+    queries = [question.strip()]
+    seen = {normalize_question(question)}
+
+    def add(query: str):
+        query = " ".join(query.split()).strip(" ,;")
+        key = normalize_question(query)
+        if key and key not in seen and len(queries) < max_queries:
+            seen.add(key)
+            queries.append(query)
+
+    clauses = [c for c in _CLAUSE_SPLIT.split(question) if c and _content_words(c)]
+    if len(clauses) > 1:
+        for clause in clauses:
+            add(clause)
+
+    keywords = _content_words(question)
+    if len(keywords) >= 2:
+        add(" ".join(keywords))
+
+    return queries
+
+
+def parse_expansions(question: str, text: str, max_queries: int = 4) -> List[str]:
+    """
+    Turn an LLM expansion reply into queries, original question first.
+
+    Strips list markers and quotes and drops duplicates and runaway lines.
+    """
+    queries = [question.strip()]
+    seen = {normalize_question(question)}
+    for line in (text or "").splitlines():
+        query = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip("\"'` ")
+        key = normalize_question(query)
+        if not key or key in seen or len(query) > 4 * max(len(question), 50):
+            continue
+        seen.add(key)
+        queries.append(query)
+        if len(queries) >= max_queries:
+            break
+    return queries
+
+
+def reciprocal_rank_fusion(results: List[Dict], n_results: int, k: int = 60) -> Dict:
+    """
+    Fuse ranked search results with reciprocal rank fusion.
+
+    Each chunk scores sum(1 / (k + rank)) over the result lists it appears
+    in, so chunks found by several sub-queries rise to the top.
+
+    Args:
+        results: Search results ('ids', 'documents', 'metadatas', 'distances')
+        n_results: Chunks to keep
+        k: RRF damping constant (60 in the original paper)
+
+    Returns:
+        Dict: Single result in the same shape, plus 'rrf_scores'
+    """
+    fused: Dict[str, Dict] = {}
+    for result in results:
+        if not result:
+            continue
+        ids = result.get("ids") or []
+        documents = result.get("documents") or []
+        metadatas = result.get("metadatas") or []
+        distances = result.get("distances") or []
+        for rank, chunk_id in enumerate(ids, start=1):
+            entry = fused.get(chunk_id)
+            if entry is None:
+                entry = fused[chunk_id] = {
+                    "score": 0.0,
+                    "document": documents[rank - 1] if rank - 1 < len(documents) else None,
+                    "metadata": metadatas[rank - 1] if rank - 1 < len(metadatas) else None,
+                    "distance": distances[rank - 1] if rank - 1 < len(distances) else None,
+                }
+            entry["score"] += 1.0 / (k + rank)
+            distance = distances[rank - 1] if rank - 1 < len(distances) else None
+            if distance is not None and (entry["distance"] is None or distance < entry["distance"]):
+                entry["distance"] = distance
+
+    ranked = sorted(fused.items(), key=lambda item: item[1]["score"], reverse=True)[:n_results]
+    return {
+        "ids": [chunk_id for chunk_id, _ in ranked],
+        "documents": [entry["document"] for _, entry in ranked],
+        "metadatas": [entry["metadata"] for _, entry in ranked],
+        "distances": [entry["distance"] for _, entry in ranked],
+        "rrf_scores": [round(entry["score"], 6) for _, entry in ranked],
+    }
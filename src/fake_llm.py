@@ -0,0 +1,107 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Answer vocabulary: plain words so token counts match word counts
+_WORDS = (
+    "the document states that this section covers policy terms for users and "
+    "describes how requests are handled by the service within the agreed period "
+    "according to the provided context including limits notices and exceptions"
+).split()
+
+
+def fake_llm_enabled() -> bool:
+    return os.getenv("FAKE_LLM_ENABLED", "false").lower() == "true"
+
+
+def is_fake_model(model: Optional[str]) -> bool:
+    return (model or "").lower().startswith("fake")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Local stand-in for a chat provider, for benchmarks and load tests.
+
+    Answers are deterministic (derived from a hash of the prompt), with a
+    configurable time to first token and token rate, so our own overhead
+    can be measured without network access or provider variance. Async
+    calls sleep with asyncio, like a real HTTP client waiting on a socket.
+    """
+
+    model_name: str = "fake"
+    latency_ms: float = 200.0
+    tokens_per_second: float = 50.0
+    response_tokens: int = 60
+    streaming: bool = True
+
+    @classmethod
+    def from_env(cls, model: str = "fake") -> "FakeChatModel":
+        """Build from FAKE_LLM_LATENCY_MS, FAKE_LLM_TOKENS_PER_S, FAKE_LLM_RESPONSE_TOKENS and FAKE_LLM_STREAMING."""
+        return cls(
+            model_name=model,
+            latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "200")),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_S", "50")),
+            response_tokens=int(os.getenv("FAKE_LLM_RESPONSE_TOKENS", "60")),
+            streaming=os.getenv("FAKE_LLM_STREAMING", "true").lower() == "true",
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        words = [rng.choice(_WORDS) for _ in range(max(1, self.response_tokens))]
+        words[0] = words[0].capitalize()
+        return [words[0]] + [f" {word}" for word in words[1:]]
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _total_seconds(self, tokens: int) -> float:
+        return self.latency_ms / 1000 + tokens * self._token_delay()
+
+    def _result(self, tokens: List[str]) -> ChatResult:
+        message = AIMessage(content="".join(tokens), response_metadata={"model_name": self.model_name})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self._total_seconds(len(tokens)))
+        return self._result(tokens)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self._total_seconds(len(tokens)))
+        return self._result(tokens)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens = self._tokens(messages)
+        if not self.streaming:
+            # Provider without streaming: the whole answer arrives at once
+            time.sleep(self._total_seconds(len(tokens)))
+            yield ChatGenerationChunk(message=AIMessageChunk(content="".join(tokens)))
+            return
+        time.sleep(self.latency_ms / 1000)
+        for token in tokens:
+            time.sleep(self._token_delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self._tokens(messages)
+        if not self.streaming:
+            await asyncio.sleep(self._total_seconds(len(tokens)))
+            yield ChatGenerationChunk(message=AIMessageChunk(content="".join(tokens)))
+            return
+        await asyncio.sleep(self.latency_ms / 1000)
+        for token in tokens:
+            await asyncio.sleep(self._token_delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -105,12 +105,6 @@ def save_uploaded_file(uploaded_file):
         st.error(f"Error saving file: {e}")
         return None
 
-def stream_text(text):
-    """Generator to simulate typing effect for responses"""
-    for word in text.split(" "):
-        yield word + " "
-        time.sleep(0.04)
-
 def change_page(page_name):
     """Navigate to different pages"""
     st.session_state.page = page_name
@@ -432,50 +426,55 @@ elif st.session_state.page == 'Chat':
         user_message = st.session_state.messages[-1]
         
         with st.chat_message("assistant"):
-            with st.spinner("🤖 Getting your answer and related chunks..."):
-                # FIX: Get assistant from session_state (now properly initialized) or cache
-                assistant = st.session_state.assistant or get_rag_assistant()
-                
-                if assistant:
-                    try:
-                        if not st.session_state.session_id:
-                            st.error("No active session found. Please re-upload the document.")
-                            st.stop()
+            # FIX: Get assistant from session_state (now properly initialized) or cache
+            assistant = st.session_state.assistant or get_rag_assistant()
+            
+            if assistant:
+                try:
+                    if not st.session_state.session_id:
+                        st.error("No active session found. Please re-upload the document.")
+                        st.stop()
 
-                        response = assistant.query(user_message["content"], session_id=st.session_state.session_id, n_results=3)
+                    # Stream tokens straight from the LLM as they are generated
+                    response_placeholder = st.empty()
+                    response_placeholder.markdown("🤖 Getting your answer and related chunks...")
+                    full_response = ""
+                    response = {"error": "No response received"}
+
+                    for event in assistant.stream_query(user_message["content"], session_id=st.session_state.session_id, n_results=3):
+                        if event["event"] == "token":
+                            full_response += event["data"]["content"]
+                            response_placeholder.markdown(full_response + "▌")
+                        elif event["event"] in ("done", "error"):
+                            response = event["data"]
+
+                    if "answer" in response:
+                        response_placeholder.markdown(response["answer"])
                         
-                        if "answer" in response:
-                            # Stream response
-                            response_placeholder = st.empty()
-                            full_response = ""
-                            for chunk in stream_text(response["answer"]):
-                                full_response += chunk
-                                response_placeholder.markdown(full_response + "▌")
-                            response_placeholder.markdown(full_response)
-                            
-                            # Append the complete assistant message to history
-                            st.session_state.messages.append({
-                                "role": "assistant",
-                                "content": full_response,
-                                "sources": response.get("sources", [])
-                            })
-                            # Rerun to let the history loop render the final sources expander
-                            st.rerun()
-                            
-                        else:
-                            error_msg = response.get("error", "Unknown error occurred")
-                            st.error(f"❌ {error_msg}")
-                            # Add error as a message
-                            st.session_state.messages.append({"role": "assistant", "content": f"Error: {error_msg}"})
-                            st.rerun()
-                            
-                    except Exception as e:
-                        st.error(f"❌ Error: {str(e)}")
-                        st.session_state.messages.append({"role": "assistant", "content": f"Error: {str(e)}"})
+                        # Append the complete assistant message to history
+                        st.session_state.messages.append({
+                            "role": "assistant",
+                            "content": response["answer"],
+                            "sources": response.get("sources", [])
+                        })
+                        # Rerun to let the history loop render the final sources expander
                         st.rerun()
-                else:
-                    st.error("Assistant not initialized. Please upload a document again.")
-                    st.stop()
+                        
+                    else:
+                        response_placeholder.empty()
+                        error_msg = response.get("error", "Unknown error occurred")
+                        st.error(f"❌ {error_msg}")
+                        # Add error as a message
+                        st.session_state.messages.append({"role": "assistant", "content": f"Error: {error_msg}"})
+                        st.rerun()
+                        
+                except Exception as e:
+                    st.error(f"❌ Error: {str(e)}")
+                    st.session_state.messages.append({"role": "assistant", "content": f"Error: {str(e)}"})
+                    st.rerun()
+            else:
+                st.error("Assistant not initialized. Please upload a document again.")
+                st.stop()
 
 elif st.session_state.page == 'Features':
     st.title("⚡ Key Features")
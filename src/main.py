@@ -1,7 +1,13 @@
 import os
+import hmac
+import json
+import logging
+import math
+import asyncio
 import shutil
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from dotenv import load_dotenv, set_key
@@ -10,6 +16,15 @@ from pathlib import Path
 
 from .app import RAGAssistant
 from .database import RAGDatabase
+from .vectordb import get_retrieval_cache, index_stats
+from .concurrency import admission_stats
+from .providers import get_llm_client_pool
+from .metrics import CACHE_LOOKUPS, ERRORS, HTTP_SECONDS, render_metrics, stage
+from .tracing import annotate, configure_logging, current_trace, end_trace, start_trace
+from .profiler import SamplingProfiler, release_profiler, try_acquire_profiler
+from .warmup import WarmUp
+
+logger = logging.getLogger(__name__)
 
 # -------------------------------------------------
 # App setup
@@ -26,8 +41,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Give every request a trace ID (X-Request-ID if the client sent a valid
+    one) and, once the response body has been sent, record its latency per
+    route template and write one structured log line with the stage totals.
+    """
+    trace, token = start_trace(request.headers.get("x-request-id"))
+
+    def finish(status: int):
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        duration_ms = trace.elapsed_ms
+        stages_ms = trace.stage_totals()
+        HTTP_SECONDS.observe(duration_ms / 1000, method=request.method, route=route, status=status)
+        logger.info("%s %s %s", request.method, route, status, extra={"trace_id": trace.trace_id, "fields": {
+            "method": request.method,
+            "route": route,
+            "status": status,
+            "duration_ms": duration_ms,
+            "stages_ms": stages_ms,
+        }})
+        if route in SLOW_REQUEST_ROUTES and 0 < SLOW_REQUEST_THRESHOLD_MS <= duration_ms:
+            log_slow_request(dict(
+                trace.attrs,
+                trace_id=trace.trace_id,
+                method=request.method,
+                route=route,
+                status=status,
+                duration_ms=duration_ms,
+                stages=stages_ms
+            ))
+
+    try:
+        try:
+            response = await call_next(request)
+        except Exception:
+            finish(500)
+            raise
+
+        response.headers["X-Trace-Id"] = trace.trace_id
+
+        # Streamed responses (SSE, NDJSON) are only finished when their body is
+        # fully sent, so the trace, metrics and slow-request log are recorded
+        # in the body iterator's finally
+        body = response.body_iterator
+
+        async def body_then_finish():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                finish(response.status_code)
+
+        response.body_iterator = body_then_finish()
+        return response
+    finally:
+        end_trace(token)
+
 # Load environment variables
 load_dotenv()
+configure_logging()
+
+# Requests slower than this are kept in the slow_requests table (0 disables)
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "5000"))
+SLOW_REQUEST_LOG_MAX_ROWS = int(os.getenv("SLOW_REQUEST_LOG_MAX_ROWS", "10000"))
+SLOW_REQUEST_ROUTES = {"/query", "/query/stream", "/messages", "/messages/stream", "/upload"}
 
 # Global variable to store the assistant instance
 assistant = None
@@ -69,12 +148,89 @@ def initialize_assistant():
             
         # Set the API key after initialization
             assistant.set_api_key(api_key, current_model)
-            print(f"✅ Assistant initialized from database with model: {current_model}")
+            logger.info("Assistant initialized from database with model: %s", current_model)
         else:
-            print("⚠️ No API key found in database - assistant ready but LLM not configured")
+            logger.warning("No API key found in database - assistant ready but LLM not configured")
     
     return assistant
 
+def request_llm(
+    x_llm_api_key: Optional[str] = Header(None),
+    x_llm_model: Optional[str] = Header(None)
+) -> dict:
+    """
+    Optional per-request LLM selection via X-LLM-API-Key / X-LLM-Model headers.
+    Clients are pooled per (provider, model, key hash), so repeat requests reuse
+    warm connections. Without the headers the server's configured LLM is used.
+    """
+    return {"api_key": x_llm_api_key or None, "model": x_llm_model or None}
+
+# References to in-flight slow-log writes, so they aren't garbage collected
+_slow_log_writes = set()
+
+def log_slow_request(entry: dict):
+    """Write a slow request to SQLite off the event loop (its own connection, like every worker thread)."""
+    logger.warning(
+        "Slow request: %s %s took %.0f ms", entry["method"], entry["route"], entry["duration_ms"],
+        extra={"trace_id": entry["trace_id"], "fields": {"stages_ms": entry["stages"]}}
+    )
+
+    def write():
+        slow_db = RAGDatabase(db.db_path)
+        slow_db.connect()
+        try:
+            slow_db.record_slow_request(entry, max_rows=SLOW_REQUEST_LOG_MAX_ROWS)
+        finally:
+            slow_db.close()
+
+    task = asyncio.ensure_future(asyncio.to_thread(write))
+    _slow_log_writes.add(task)
+    task.add_done_callback(_slow_log_writes.discard)
+
+def is_admin(token: Optional[str]) -> bool:
+    """True if `token` matches ADMIN_TOKEN; admin features are off while ADMIN_TOKEN is unset."""
+    expected = os.getenv("ADMIN_TOKEN", "")
+    return bool(expected) and bool(token) and hmac.compare_digest(token.encode(), expected.encode())
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency guarding admin endpoints with the X-Admin-Token header."""
+    if not os.getenv("ADMIN_TOKEN"):
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def request_timings(
+    timings: bool = Query(False, description="Include a per-stage timing breakdown in the response"),
+    x_debug_timings: Optional[str] = Header(None)
+) -> bool:
+    """Opt-in timing breakdown: ?timings=true or an X-Debug-Timings: 1 header."""
+    return timings or (x_debug_timings or "").lower() in ("1", "true", "yes")
+
+def with_timings(response: dict, include: bool, trace=None) -> dict:
+    """
+    Replace the assistant's stage timings with the request's trace (ID,
+    total and spans) when the caller opted in; drop them otherwise.
+    """
+    stages = response.pop("timings", None)
+    if include:
+        trace = trace or current_trace()
+        timings = dict(stages or {})
+        if trace is not None:
+            timings.update(trace.as_dict())
+        response["timings"] = timings
+    return response
+
+def raise_for_result(result: dict):
+    """Map a failed assistant result to an HTTP error (503 + Retry-After when overloaded)."""
+    if result.get("status") == "overloaded":
+        raise HTTPException(
+            status_code=503,
+            detail=result.get("error"),
+            headers={"Retry-After": str(math.ceil(result.get("retry_after", 1)))}
+        )
+    if result.get("status") != "success":
+        raise HTTPException(status_code=500, detail=result.get("error"))
+
 # Helper to get file info
 def get_file_info(filepath):
     """Extract metadata from a file"""
@@ -98,7 +254,7 @@ def get_file_info(filepath):
                 pdf = pypdf.PdfReader(f)
                 metadata["page_count"] = len(pdf.pages)
         except Exception as e:
-            print(f"Could not read PDF page count: {e}")
+            logger.warning("Could not read PDF page count: %s", e)
             metadata["page_count"] = 0
     else:
         # For text files, count lines as "pages"
@@ -107,7 +263,7 @@ def get_file_info(filepath):
                 lines = sum(1 for _ in f)
                 metadata["page_count"] = max(1, lines // 50)  # Estimate ~50 lines per page
         except Exception as e:
-            print(f"Could not count text lines: {e}")
+            logger.warning("Could not count text lines: %s", e)
             metadata["page_count"] = 0
     
     return metadata
@@ -115,6 +271,20 @@ def get_file_info(filepath):
 # Initialize assistant on startup if API keys are available
 initialize_assistant()
 
+# Preloads the embedding model and recent collections; /ready waits for it
+warmup = WarmUp.from_env()
+
+@app.on_event("startup")
+async def start_warmup():
+    """Warm up in the background, so /health answers while it runs."""
+    warmup.start()
+
+@app.on_event("shutdown")
+async def drain_background_writes():
+    """Let post-response history/cache writes finish before the process exits."""
+    if assistant is not None:
+        await assistant.drain_background()
+
 # -------------------------------------------------
 # Schemas
 # -------------------------------------------------
@@ -122,16 +292,29 @@ initialize_assistant()
 class MessageRequest(BaseModel):
     session_id: str
     content: str
+    use_cache: bool = True
 
 class QueryRequest(BaseModel):
     session_id: str
     question: str
     n_results: int = 3
+    use_cache: bool = True
+
+class BatchQueryRequest(BaseModel):
+    session_id: str
+    questions: List[str]
+    n_results: int = 3
+    use_cache: bool = True
+    max_concurrency: Optional[int] = None
 
 class ApiKeyRequest(BaseModel):
     api_key: str
     model: str
 
+class FalseHitRequest(BaseModel):
+    session_id: str
+    entry_id: str
+
 # -------------------------------------------------
 # Routes
 # -------------------------------------------------
@@ -140,10 +323,18 @@ class ApiKeyRequest(BaseModel):
 def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    """200 once the startup warm-up has finished, 503 until then (or if it failed)."""
+    status = warmup.status()
+    if status["status"] != "ready":
+        return JSONResponse(status_code=503, content=status)
+    return status
+
 # ---------- Upload document ----------
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), timings: bool = Depends(request_timings)):
     # 1. Check file extension
     if not file.filename.lower().endswith((".pdf", ".txt")):
         raise HTTPException(status_code=400, detail="Only PDF or TXT files allowed")
@@ -170,17 +361,21 @@ async def upload_file(file: UploadFile = File(...)):
 
     # 5. NOW save file (only if all checks pass)
     filepath = os.path.join(UPLOAD_DIR, file.filename)
-    with open(filepath, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    with stage("upload_write"):
+        with open(filepath, "wb") as f:
+            shutil.copyfileobj(file.file, f)
 
     # 6. Process document (utils.py validation happens here)
+    # Parsing and embedding are blocking: keep them off the event loop
     start_time = time.time()
-    file_metadata = get_file_info(filepath)
-    result = assistant_instance.upload_document(filepath)
+    with stage("file_info"):
+        file_metadata = await asyncio.to_thread(get_file_info, filepath)
+    result = await asyncio.to_thread(assistant_instance.upload_document, filepath)
     processing_time = time.time() - start_time
 
     # 7. Handle errors and cleanup
     if result.get("status") == "error":
+        ERRORS.inc(stage="upload")
         if os.path.exists(filepath):
             os.remove(filepath)
         raise HTTPException(status_code=500, detail=result.get("error"))
@@ -209,7 +404,7 @@ async def upload_file(file: UploadFile = File(...)):
         "uploaded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
     }
     
-    return response
+    return with_timings(response, timings)
 
 # API key endpoint with including the model
 @app.post("/api-key")
@@ -236,6 +431,8 @@ async def save_api_key(request: ApiKeyRequest):
             provider = "groq"
         elif "gpt" in model.lower():
             provider = "openai"
+        elif model.lower().startswith("fake"):
+            provider = "fake"
         else:
             provider = "unknown"
         
@@ -284,23 +481,32 @@ async def check_api_key_status():
 # ---------- Send message ----------
 
 @app.post("/messages")
-def send_message(body: MessageRequest, assistant_instance: RAGAssistant = Depends(get_assistant)):
+async def send_message(
+    body: MessageRequest,
+    assistant_instance: RAGAssistant = Depends(get_assistant),
+    llm: dict = Depends(request_llm),
+    timings: bool = Depends(request_timings)
+):
     if not body.content.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-    result = assistant_instance.query(
+    result = await assistant_instance.aquery(
         question=body.content,
         session_id=body.session_id,
-        n_results=3
+        n_results=3,
+        use_cache=body.use_cache,
+        **llm
     )
 
-    if result.get("status") != "success":
-        raise HTTPException(status_code=500, detail=result.get("error"))
+    raise_for_result(result)
+    annotate(cache=result.get("cache"))
 
-    return {
+    return with_timings({
         "message_id": None,
-        "content": result["answer"]
-    }
+        "content": result["answer"],
+        "cached": result.get("cached", False),
+        "timings": result.get("timings")
+    }, timings)
 
 # ---------- Get messages ----------
 
@@ -348,14 +554,320 @@ def get_document(session_id: str):
 # ---------- Query endpoint ----------
 
 @app.post("/query")
-def query_document(body: QueryRequest, assistant_instance: RAGAssistant = Depends(get_assistant)):
-    result = assistant_instance.query(
+async def query_document(
+    body: QueryRequest,
+    assistant_instance: RAGAssistant = Depends(get_assistant),
+    llm: dict = Depends(request_llm),
+    timings: bool = Depends(request_timings),
+    profile: bool = Query(False, description="Sample this request with the profiler (needs X-Admin-Token)"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    profiler = None
+    if profile:
+        if not is_admin(x_admin_token):
+            raise HTTPException(status_code=403, detail="Profiling a request requires a valid X-Admin-Token")
+        if not try_acquire_profiler():
+            raise HTTPException(status_code=409, detail="A profiling session is already running")
+        profiler = SamplingProfiler(interval=0.001).start()
+
+    try:
+        result = await assistant_instance.aquery(
+            question=body.question,
+            session_id=body.session_id,
+            n_results=body.n_results,
+            use_cache=body.use_cache,
+            **llm
+        )
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            release_profiler()
+
+    raise_for_result(result)
+    annotate(cache=result.get("cache"))
+
+    if profiler is not None:
+        # All threads are sampled, so concurrent requests show up too
+        result["profile"] = profiler.result()
+
+    return with_timings(result, timings)
+
+# ---------- Streaming (Server-Sent Events) ----------
+
+def sse_response(events, timings: bool = False):
+    """
+    Wrap an async iterator of {'event', 'data'} dicts as a text/event-stream
+    response; the 'done' event carries the timing breakdown if opted in.
+    """
+    trace = current_trace()
+
+    async def event_stream():
+        async for item in events:
+            if item["event"] == "done":
+                if trace is not None:
+                    trace.attrs["cache"] = item["data"].get("cache")
+                item = dict(item, data=with_timings(dict(item["data"]), timings, trace))
+            yield f"event: {item['event']}\ndata: {json.dumps(item['data'])}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/query/stream")
+async def query_document_stream(
+    body: QueryRequest,
+    assistant_instance: RAGAssistant = Depends(get_assistant),
+    llm: dict = Depends(request_llm),
+    timings: bool = Depends(request_timings)
+):
+    """
+    Same as /query, but tokens are pushed over SSE as the LLM generates them.
+    Events: sources, token (repeated), then done or error.
+    """
+    return sse_response(assistant_instance.astream_query(
         question=body.question,
         session_id=body.session_id,
-        n_results=body.n_results
-    )
+        n_results=body.n_results,
+        use_cache=body.use_cache,
+        **llm
+    ), timings)
+
+@app.post("/messages/stream")
+async def send_message_stream(
+    body: MessageRequest,
+    assistant_instance: RAGAssistant = Depends(get_assistant),
+    llm: dict = Depends(request_llm),
+    timings: bool = Depends(request_timings)
+):
+    if not body.content.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-    if result.get("status") != "success":
-        raise HTTPException(status_code=500, detail=result.get("error"))
+    return sse_response(assistant_instance.astream_query(
+        question=body.content,
+        session_id=body.session_id,
+        n_results=3,
+        use_cache=body.use_cache,
+        **llm
+    ), timings)
+
+# ---------- Batch questions ----------
+
+MAX_BATCH_QUESTIONS = 100
+MAX_BATCH_CONCURRENCY = 16
+
+@app.post("/query/batch")
+async def query_batch(
+    body: BatchQueryRequest,
+    assistant_instance: RAGAssistant = Depends(get_assistant),
+    llm: dict = Depends(request_llm)
+):
+    """
+    Answer many questions about one document in a single request.
+    Results are streamed as NDJSON (one JSON object per line) as they complete;
+    each line carries the question's `index` in the request.
+    """
+    questions = [q for q in body.questions if q.strip()]
+    if not questions:
+        raise HTTPException(status_code=400, detail="At least one non-empty question is required")
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"Too many questions (maximum is {MAX_BATCH_QUESTIONS})")
+
+    max_concurrency = body.max_concurrency
+    if max_concurrency is not None:
+        max_concurrency = min(max(1, max_concurrency), MAX_BATCH_CONCURRENCY)
+
+    async def ndjson():
+        async for result in assistant_instance.abatch_query(
+            questions,
+            session_id=body.session_id,
+            n_results=body.n_results,
+            use_cache=body.use_cache,
+            max_concurrency=max_concurrency,
+            **llm
+        ):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+# ---------- Search chat history ----------
+
+@app.get("/search")
+def search_messages(
+    q: str = Query(..., min_length=1),
+    session_id: Optional[str] = None,
+    document_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Full-text search over one session's chat history, ranked by relevance.
+    Hits carry session IDs, and a session ID is all it takes to read a
+    conversation, so searching across sessions (no session_id, optionally
+    narrowed by document_id) is for admins only.
+    """
+    if not session_id and not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="session_id is required (searching all sessions needs X-Admin-Token)")
+
+    # Own connection per request: sync handlers run in the threadpool
+    search_db = RAGDatabase(db.db_path)
+    search_db.connect()
+    try:
+        hits = search_db.search_messages(
+            q,
+            session_id=session_id,
+            document_id=document_id,
+            limit=limit,
+            offset=offset
+        )
+    finally:
+        search_db.close()
+
+    return {"query": q, "count": len(hits), "results": hits}
+
+# ---------- Answer cache telemetry ----------
+
+@app.get("/cache/stats")
+def cache_stats(assistant_instance: RAGAssistant = Depends(get_assistant)):
+    return {
+        "semantic": assistant_instance.semantic_cache.stats(),
+        "retrieval": get_retrieval_cache().stats(),
+        "rewrite": assistant_instance.rewrite_cache.stats(),
+        "singleflight": {
+            "ingest": assistant_instance.ingest_flight.stats(),
+            "query": assistant_instance.query_flight.stats()
+        }
+    }
+
+@app.post("/cache/false-hit")
+def report_false_hit(body: FalseHitRequest, assistant_instance: RAGAssistant = Depends(get_assistant)):
+    """
+    Report that a semantic cache hit answered the wrong question.
+    The entry is evicted and counted in the false-hit telemetry.
+    """
+    removed = assistant_instance.report_semantic_false_hit(body.session_id, body.entry_id)
+    return {"status": "success", "removed": removed}
+
+# ---------- Slow request log ----------
+
+@app.get("/slow-requests", dependencies=[Depends(require_admin)])
+def get_slow_requests(
+    window_seconds: float = Query(86400, gt=0),
+    route: Optional[str] = None,
+    document_id: Optional[str] = None,
+    group_by: Optional[str] = Query(None, pattern="^document$"),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """
+    Worst offenders among requests slower than SLOW_REQUEST_THRESHOLD_MS
+    over the last window_seconds, slowest first, with their stage timings.
+    group_by=document aggregates them per document instead. Admin only:
+    entries include question text and session IDs.
+    """
+    since = time.time() - window_seconds
+    slow_db = RAGDatabase(db.db_path)
+    slow_db.connect()
+    try:
+        if group_by == "document":
+            return {
+                "threshold_ms": SLOW_REQUEST_THRESHOLD_MS,
+                "documents": slow_db.get_slow_documents(since=since, limit=limit)
+            }
+        return {
+            "threshold_ms": SLOW_REQUEST_THRESHOLD_MS,
+            "requests": slow_db.get_slow_requests(
+                since=since, route=route, document_id=document_id, limit=limit
+            )
+        }
+    finally:
+        slow_db.close()
+
+# ---------- Admin: sampling profiler ----------
+
+MAX_PROFILE_SECONDS = 120
+
+@app.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    include_idle: bool = False,
+    format: str = Query("json", pattern="^(json|collapsed)$")
+):
+    """
+    Sample every thread of this worker for `seconds` and return the stacks.
+    format=collapsed returns plain text for flamegraph.pl / speedscope;
+    json adds the hottest functions and the profiler's own overhead.
+    """
+    if not try_acquire_profiler():
+        raise HTTPException(status_code=409, detail="A profiling session is already running")
+
+    profiler = SamplingProfiler(interval=interval_ms / 1000, include_idle=include_idle)
+    try:
+        profiler.start()
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+        release_profiler()
+
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed() + "\n")
+    return profiler.result()
+
+# ---------- Metrics ----------
+
+def _cache_lookup_counts():
+    """Hit/miss counts the in-memory caches already keep, exported at scrape time."""
+    if assistant is None:
+        caches = {"retrieval": get_retrieval_cache().stats()}
+    else:
+        caches = {
+            "semantic": assistant.semantic_cache.stats(),
+            "retrieval": get_retrieval_cache().stats(),
+            "rewrite": assistant.rewrite_cache.stats(),
+        }
+    for cache, stats in caches.items():
+        yield {"cache": cache, "result": "hit"}, stats["hits"]
+        yield {"cache": cache, "result": "miss"}, stats["misses"]
+
+CACHE_LOOKUPS.add_source(_cache_lookup_counts)
+
+@app.get("/metrics")
+def metrics():
+    """Stage latency histograms and counters in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ---------- LLM admission control ----------
+
+@app.get("/admission/stats")
+def get_admission_stats():
+    """Queue depth, in-flight calls, wait times and rejections per provider/model."""
+    return {"controllers": admission_stats()}
+
+# ---------- LLM providers ----------
+
+@app.get("/providers/stats")
+def get_provider_stats(assistant_instance: RAGAssistant = Depends(get_assistant)):
+    """
+    Circuit breaker state, failover/hedge counts and latency per LLM provider,
+    the same per key for requests with their own API key, plus the client pool.
+    """
+    return dict(
+        assistant_instance.providers.stats(),
+        request_keys=assistant_instance.key_pool_stats(),
+        clients=get_llm_client_pool().stats()
+    )
 
-    return result
+# ---------- Vector index ----------
+
+@app.get("/index/stats")
+def vector_index_stats(
+    collection: Optional[str] = Query(None, description="Only this collection"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Active and configured HNSW settings per Chroma collection, plus online rebuild status."""
+    stats = index_stats(collection, limit)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"Collection not found: {collection}")
+    return stats
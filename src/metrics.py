@@ -0,0 +1,255 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .tracing import record_span
+
+# Seconds; covers cache hits (ms) up to slow LLM calls and large uploads
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    Monotonic counter per label set.
+
+    Besides inc(), a counter can pull values from existing telemetry at
+    scrape time (add_source), so stats already kept elsewhere (cache
+    hit counts) cost nothing extra on the hot path.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._sources: List[Callable[[], Iterable[Tuple[Dict[str, str], float]]]] = []
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def add_source(self, source: Callable[[], Iterable[Tuple[Dict[str, str], float]]]) -> None:
+        """Register a callable returning (labels, value) pairs, read on every scrape."""
+        self._sources.append(source)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        for source in self._sources:
+            try:
+                for labels, value in source():
+                    key = self._key(labels)
+                    values[key] = values.get(key, 0.0) + value
+            except Exception:
+                # A broken source must not take the whole endpoint down
+                continue
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label set (Prometheus semantics)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block of code."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return int(sum(series[:-1])) if series else 0
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """(count, sum) per label set, e.g. to diff stage totals around a block of work."""
+        with self._lock:
+            return {key: (int(sum(values[:-1])), values[-1]) for key, values in self._series.items()}
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        lines = []
+        for key, values in sorted(series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), values[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, (("le", _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds",
+    "Duration of pipeline stages (upload, parse, chunk, embed, search, llm, db writes)",
+    ("stage", "model", "provider"),
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "rag_http_request_duration_seconds",
+    "HTTP request latency (until the response body is sent), by route",
+    ("method", "route", "status"),
+)
+ERRORS = REGISTRY.counter(
+    "rag_errors_total",
+    "Errors by pipeline stage",
+    ("stage", "model", "provider"),
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "rag_cache_lookups_total",
+    "Cache lookups by cache and result (hit/miss)",
+    ("cache", "result"),
+)
+CHUNKS = REGISTRY.counter(
+    "rag_chunks_indexed_total",
+    "Chunks embedded and added to the vector store",
+    ("model",),
+)
+LLM_CALLS = REGISTRY.counter(
+    "rag_llm_calls_total",
+    "LLM calls by outcome (success, failure, timeout, rejected)",
+    ("model", "provider", "outcome"),
+)
+
+
+@contextmanager
+def stage(name: str, model: str = "", provider: str = ""):
+    """
+    Time a pipeline stage into rag_stage_duration_seconds and the current
+    request's trace; exceptions are counted in rag_errors_total and re-raised.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage=name, model=model, provider=provider)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name, model=model, provider=provider)
+        record_span(name, elapsed, model=model, provider=provider)
+
+
+def render_metrics() -> str:
+    """Prometheus exposition of the process-wide registry."""
+    return REGISTRY.render()
@@ -0,0 +1,138 @@
+"""
+Move documents from per-document Chroma collections (doc_<id>) into the
+shared collection layout (VECTOR_STORAGE_LAYOUT=shared).
+
+    python -m src.migrate_storage --dry-run
+    python -m src.migrate_storage
+    python -m src.migrate_storage --delete-old
+
+Stored embeddings are copied as they are (no re-embedding) and tagged with
+document_id. A document is switched over in SQLite only after all of its
+chunks are in the shared collection. Stop the server first: Chroma's
+persistent storage does not support two processes writing to it at once.
+Old collections are kept unless --delete-old is given; a later run with
+--delete-old removes those no document points to any more.
+"""
+import sys
+import argparse
+import logging
+
+from .database import PER_DOCUMENT_COLLECTION_PREFIX, RAGDatabase, collection_name_for_document
+from .vectordb import _copy_rows, get_chroma_client, hnsw_settings
+
+logger = logging.getLogger(__name__)
+
+
+def _open_collection(client, name: str):
+    return client.get_or_create_collection(
+        name=name,
+        metadata={"description": "RAG document collection"},
+        configuration={"hnsw": hnsw_settings(name)},
+    )
+
+
+def migrate(
+    db_path: str = "rag_engine.db",
+    chroma_path: str = "./chroma_db",
+    shared_name: str = None,
+    shards: int = None,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+    delete_old: bool = False
+) -> dict:
+    """
+    Copy every per-document collection into its shared collection.
+
+    Args:
+        db_path: SQLite database of the app
+        chroma_path: Chroma storage path of the app
+        shared_name: Shared collection name (default: CHROMA_SHARED_COLLECTION)
+        shards: Number of shared collections (default: CHROMA_SHARED_SHARDS)
+        batch_size: Rows copied per Chroma call
+        dry_run: Only report what would be moved
+        delete_old: Delete per-document collections no document uses any more
+
+    Returns:
+        dict: Counts of 'migrated', 'skipped', 'failed' documents, 'chunks'
+        copied and 'deleted' collections
+    """
+    db = RAGDatabase(db_path)
+    db.connect()
+    client = get_chroma_client(chroma_path)
+    summary = {"migrated": 0, "skipped": 0, "failed": 0, "chunks": 0, "deleted": 0}
+
+    try:
+        for doc in db.list_documents():
+            source_name = doc["collection_name"] or ""
+            if not source_name.startswith(PER_DOCUMENT_COLLECTION_PREFIX):
+                continue
+            target_name = collection_name_for_document(doc["document_id"], "shared", shared_name, shards)
+
+            try:
+                source = client.get_collection(name=source_name)
+            except Exception:
+                logger.warning("Skipping %s (%s): collection %s not found", doc["document_id"][:8], doc["filename"], source_name)
+                summary["skipped"] += 1
+                continue
+
+            count = source.count()
+            if dry_run:
+                logger.info("Would move %s (%s, %d chunks): %s -> %s", doc["document_id"][:8], doc["filename"], count, source_name, target_name)
+                summary["migrated"] += 1
+                summary["chunks"] += count
+                continue
+
+            try:
+                target = _open_collection(client, target_name)
+                copied = _copy_rows(source, target, batch_size=batch_size, extra_metadata={"document_id": doc["document_id"]})
+                stored = len(target.get(where={"document_id": doc["document_id"]}, include=[])["ids"])
+                if stored < count:
+                    raise RuntimeError(f"only {stored} of {count} chunks arrived in {target_name}")
+                db.update_collection_name(doc["document_id"], target_name)
+                logger.info("Moved %s (%s, %d chunks): %s -> %s", doc["document_id"][:8], doc["filename"], copied, source_name, target_name)
+                summary["migrated"] += 1
+                summary["chunks"] += copied
+            except Exception as e:
+                logger.error("Moving %s (%s) failed, it stays in %s: %s", doc["document_id"][:8], doc["filename"], source_name, e)
+                summary["failed"] += 1
+
+        if delete_old and not dry_run:
+            in_use = {doc["collection_name"] for doc in db.list_documents()}
+            for collection in client.list_collections():
+                name = collection.name
+                # A running server's index rebuild owns doc_*-rebuild-* (being built) and
+                # doc_*-retired-* (still searched until its grace period ends, then dropped)
+                rebuilding = "-rebuild-" in name or "-retired-" in name
+                if name.startswith(PER_DOCUMENT_COLLECTION_PREFIX) and name not in in_use and not rebuilding:
+                    client.delete_collection(name=name)
+                    logger.info("Deleted old collection %s", name)
+                    summary["deleted"] += 1
+    finally:
+        db.close()
+
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Move per-document Chroma collections into the shared layout.")
+    parser.add_argument("--db", default="rag_engine.db", help="SQLite database path")
+    parser.add_argument("--chroma", default="./chroma_db", help="Chroma storage path")
+    parser.add_argument("--collection", help="Shared collection name (default: CHROMA_SHARED_COLLECTION)")
+    parser.add_argument("--shards", type=int, help="Number of shared collections (default: CHROMA_SHARED_SHARDS)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be moved")
+    parser.add_argument("--delete-old", action="store_true", help="Delete per-document collections no longer in use")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s", force=True)
+    summary = migrate(args.db, args.chroma, args.collection, args.shards, args.batch_size, args.dry_run, args.delete_old)
+    logger.info(
+        "%s %d document(s), %d chunk(s); %d skipped, %d failed, %d old collection(s) deleted",
+        "Would move" if args.dry_run else "Moved",
+        summary["migrated"], summary["chunks"], summary["skipped"], summary["failed"], summary["deleted"]
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+# Leaf functions of threads that are parked, not working (thread pools, selectors, locks)
+_IDLE_LEAVES = frozenset({
+    "wait", "_wait_for_tstate_lock", "select", "poll", "control", "accept", "_worker",
+})
+
+
+def _frame_label(code) -> str:
+    """'function (module/file.py:first_line)', stable per function across samples."""
+    filename = code.co_filename
+    parts = filename.replace("\\", "/").split("/")
+    short = "/".join(parts[-2:]) if len(parts) > 1 else filename
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Low-overhead wall-clock sampling profiler for all threads of the process.
+
+    A background thread wakes every `interval` seconds, reads every other
+    thread's current frame with sys._current_frames() and counts the
+    collapsed stack ("root;caller;callee"), the input format of
+    flamegraph.pl and speedscope. Nothing is installed in the profiled
+    threads (no sys.setprofile), so they run at full speed; the cost is the
+    sampler holding the GIL while it walks the stacks, which it measures.
+    """
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False, max_depth: int = 128):
+        """
+        Args:
+            interval: Seconds between samples
+            include_idle: Keep stacks of threads parked in waits/selects
+            max_depth: Frames kept per stack (innermost)
+        """
+        self.interval = max(0.001, interval)
+        self.include_idle = include_idle
+        self.max_depth = max_depth
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._sampling_seconds = 0.0
+        self._thread_names: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started: Optional[float] = None
+        self._stopped: Optional[float] = None
+        self._cpu_started: Optional[float] = None
+        self._cpu_stopped: Optional[float] = None
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            if not self.include_idle and frame.f_code.co_name in _IDLE_LEAVES:
+                continue
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            name = self._thread_names.get(thread_id)
+            if name is None:
+                self._thread_names = {t.ident: t.name for t in threading.enumerate()}
+                name = self._thread_names.get(thread_id, str(thread_id))
+            labels.append(f"thread:{name}")
+            self._stacks[";".join(reversed(labels))] += 1
+
+    def _run(self) -> None:
+        next_at = time.perf_counter()
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            self._sample()
+            self._samples += 1
+            self._sampling_seconds += time.perf_counter() - start
+            next_at += self.interval
+            delay = next_at - time.perf_counter()
+            if delay < 0:
+                # Fell behind (e.g. GIL contention): skip missed ticks instead of bursting
+                next_at = time.perf_counter()
+                delay = 0
+            self._stop.wait(delay)
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._stopped = time.perf_counter()
+        self._cpu_stopped = time.process_time()
+        return self
+
+    def __enter__(self) -> "SamplingProfiler":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, one 'frame;frame;frame count' line each, heaviest first."""
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+    def result(self, top: int = 20) -> Dict:
+        """
+        Collapsed stacks plus the profiler's own measured cost.
+
+        Returns:
+            Dict with 'duration_seconds', 'interval_ms', 'samples',
+            'collapsed', 'top_functions' (innermost frame -> samples) and
+            'overhead': time spent sampling, per sample and as a share of
+            the wall time and of the process CPU time
+        """
+        end = self._stopped or time.perf_counter()
+        duration = end - (self._started or end)
+        cpu = (self._cpu_stopped or time.process_time()) - (self._cpu_started or 0.0)
+
+        leaves: Counter = Counter()
+        for stack, count in self._stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+
+        return {
+            "pid": os.getpid(),
+            "duration_seconds": round(duration, 3),
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": self._samples,
+            "stacks": len(self._stacks),
+            "top_functions": [{"function": name, "samples": count} for name, count in leaves.most_common(top)],
+            "collapsed": self.collapsed(),
+            "overhead": {
+                "sampling_seconds": round(self._sampling_seconds, 4),
+                "per_sample_us": round(self._sampling_seconds / self._samples * 1e6, 1) if self._samples else 0.0,
+                "wall_percent": round(self._sampling_seconds / duration * 100, 3) if duration else 0.0,
+                "cpu_percent": round(self._sampling_seconds / cpu * 100, 3) if cpu else 0.0,
+            },
+        }
+
+
+# One profiling session per process at a time: overlapping samplers would skew each other
+_profile_lock = threading.Lock()
+
+
+def try_acquire_profiler() -> bool:
+    """Reserve the process-wide profiling slot; False if a session is already running."""
+    return _profile_lock.acquire(blocking=False)
+
+
+def release_profiler() -> None:
+    _profile_lock.release()
@@ -0,0 +1,879 @@
+import os
+import time
+import hashlib
+import asyncio
+import logging
+import contextvars
+import threading
+import concurrent.futures
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_openai import ChatOpenAI
+from langchain_groq import ChatGroq
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from langchain_core.output_parsers import StrOutputParser
+
+from .concurrency import AdmissionRejected, get_admission_controller
+from .fake_llm import FakeChatModel, fake_llm_enabled, is_fake_model
+from .metrics import ERRORS, LLM_CALLS, STAGE_SECONDS
+from .tracing import record_span
+
+logger = logging.getLogger(__name__)
+
+# Environment variable holding the API key of each provider (used for fallbacks)
+PROVIDER_KEY_ENV = {
+    "google": "GOOGLE_API_KEY",
+    "groq": "GROQ_API_KEY",
+    "openai": "OPENAI_API_KEY",
+    "fake": "FAKE_LLM_API_KEY",
+}
+
+# How often a pending call is checked for having been admitted (its timeout starts then)
+_ADMISSION_POLL_SECONDS = 0.05
+
+# Blocking chain.invoke calls run here so they can be timed out and hedged
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_SYNC_WORKERS", "32")),
+    thread_name_prefix="llm"
+)
+
+
+def provider_for_model(model: str) -> str:
+    """
+    Guess the provider serving a model name.
+
+    Args:
+        model: Model name (e.g. 'gemini-2.0-flash-exp', 'llama-3.1-8b-instant')
+
+    Returns:
+        str: 'google', 'groq', 'openai' or 'fake'
+    """
+    name = (model or "").lower()
+    if is_fake_model(name):
+        return "fake"
+    if "gemini" in name:
+        return "google"
+    if "llama" in name or "groq" in name:
+        return "groq"
+    return "openai"
+
+
+def provider_name(llm: Any) -> str:
+    """Provider of an LLM instance, used to pick its admission controller."""
+    return {
+        "ChatGoogleGenerativeAI": "google",
+        "ChatGroq": "groq",
+        "ChatOpenAI": "openai",
+        "FakeChatModel": "fake",
+    }.get(type(llm).__name__, type(llm).__name__.lower())
+
+
+def default_model_for_key(api_key: str) -> str:
+    """Default model for an API key, guessed from the key format."""
+    if api_key.startswith("gsk_"):
+        return "llama-3.1-8b-instant"
+    if api_key.startswith("AIz"):
+        return "gemini-2.0-flash-exp"
+    return "gpt-4o-mini"
+
+
+def create_llm(api_key: str, model: str = None):
+    """
+    Build the chat model for an API key.
+
+    The provider is picked from the model name; without a model it is
+    guessed from the key format. Prefer get_llm_client(), which reuses
+    clients (and their open connections) across calls.
+
+    Args:
+        api_key: Provider API key
+        model: Model name, or None for the provider's default
+
+    Returns:
+        A LangChain chat model
+    """
+    model = model or default_model_for_key(api_key)
+    if is_fake_model(model):
+        # Local fake provider for benchmarks; off unless explicitly enabled
+        if not fake_llm_enabled():
+            raise ValueError("Fake LLM models are disabled. Set FAKE_LLM_ENABLED=true to use them.")
+        logger.info("Creating fake local chat model: %s", model)
+        return FakeChatModel.from_env(model)
+    if "gemini" in model.lower():
+        logger.info("Creating Google Gemini client for model: %s", model)
+        return ChatGoogleGenerativeAI(google_api_key=api_key, model=model, temperature=0.1)
+    if "llama" in model.lower() or "groq" in model.lower():
+        logger.info("Creating Groq client for model: %s", model)
+        return ChatGroq(api_key=api_key, model=model, temperature=0.1)
+    if "gpt" in model.lower():
+        logger.info("Creating OpenAI client for model: %s", model)
+        return ChatOpenAI(api_key=api_key, model=model, temperature=0.1)
+    # Default to OpenAI
+    logger.info("Creating generic OpenAI-compatible client for model: %s", model)
+    return ChatOpenAI(api_key=api_key, model=model, temperature=0.1)
+
+
+def client_key(api_key: str, model: str) -> tuple:
+    """(provider, model, key hash) identifying a pooled client; the key itself is not kept."""
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return (provider_for_model(model), model, key_hash)
+
+
+class LLMClientPool:
+    """
+    Chat model clients shared across requests, keyed by
+    (provider, model, API key hash).
+
+    Each LangChain client owns an HTTP connection pool, so reusing the
+    instance keeps connections (and TLS sessions) warm instead of paying a
+    handshake on every /api-key call or per-request key. Clients idle for
+    longer than idle_seconds, or least recently used beyond max_clients,
+    are dropped; their connections close when the client is collected.
+    Keys themselves are never stored, only their SHA256.
+    """
+
+    def __init__(self, max_clients: int = 64, idle_seconds: float = 900.0):
+        """
+        Args:
+            max_clients: Clients kept (LRU evicted beyond this)
+            idle_seconds: Clients unused for this long are evicted (0 = never)
+        """
+        self.max_clients = max_clients
+        self.idle_seconds = idle_seconds
+        self._clients: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(api_key: str, model: str) -> tuple:
+        return client_key(api_key, model)
+
+    def get(self, api_key: str, model: str = None) -> Any:
+        """
+        Return the pooled client for a key/model, creating it on first use.
+
+        Args:
+            api_key: Provider API key
+            model: Model name, or None for the key's default model
+
+        Returns:
+            A LangChain chat model
+        """
+        model = model or default_model_for_key(api_key)
+        key = self._key(api_key, model)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                entry["last_used"] = now
+                entry["uses"] += 1
+                self._clients.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry["llm"]
+            self._stats["misses"] += 1
+
+        # Build outside the lock; a concurrent first use may build twice, the first stored wins
+        llm = create_llm(api_key, model)
+
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = {"llm": llm, "created": now, "last_used": now, "uses": 1}
+                self._clients[key] = entry
+                while len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+                    self._stats["evictions"] += 1
+            return entry["llm"]
+
+    def _evict_idle(self, now: float) -> None:
+        if not self.idle_seconds:
+            return
+        for key in [k for k, e in self._clients.items() if now - e["last_used"] > self.idle_seconds]:
+            del self._clients[key]
+            self._stats["evictions"] += 1
+
+    def stats(self) -> Dict:
+        """Pool size, hit/miss counts and per-client usage (no keys)."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            stats = dict(self._stats)
+            stats["clients"] = [
+                {
+                    "provider": key[0],
+                    "model": key[1],
+                    "key_hash": key[2],
+                    "uses": entry["uses"],
+                    "idle_seconds": round(now - entry["last_used"], 1),
+                }
+                for key, entry in self._clients.items()
+            ]
+            stats["size"] = len(self._clients)
+            stats["max_clients"] = self.max_clients
+            return stats
+
+
+_client_pool: Optional[LLMClientPool] = None
+_client_pool_lock = threading.Lock()
+
+
+def get_llm_client_pool() -> LLMClientPool:
+    """Process-wide client pool, sized by LLM_CLIENT_POOL_MAX / LLM_CLIENT_IDLE_SECONDS."""
+    global _client_pool
+    if _client_pool is None:
+        with _client_pool_lock:
+            if _client_pool is None:
+                _client_pool = LLMClientPool(
+                    max_clients=int(os.getenv("LLM_CLIENT_POOL_MAX", "64")),
+                    idle_seconds=float(os.getenv("LLM_CLIENT_IDLE_SECONDS", "900")),
+                )
+    return _client_pool
+
+
+def get_llm_client(api_key: str, model: str = None) -> Any:
+    """Shortcut for get_llm_client_pool().get(api_key, model)."""
+    return get_llm_client_pool().get(api_key, model)
+
+
+class ProvidersUnavailable(AdmissionRejected):
+    """Raised when every provider's circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("llm-providers", "circuit_open", retry_after)
+        self.args = (f"All LLM providers are unavailable (circuit open), retry after {retry_after:.0f}s",)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed    -> calls flow; failure_threshold failures in a row open it
+    open      -> calls are skipped until reset_timeout has passed
+    half_open -> a single probe call is let through; success closes the
+                 breaker, failure opens it again
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout: Seconds the breaker stays open before a probe
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def available(self) -> bool:
+        """Whether a call would be allowed right now (doesn't claim the probe)."""
+        with self._lock:
+            state = self._current_state()
+            return state == self.CLOSED or (state == self.HALF_OPEN and not self._probing)
+
+    def allow(self) -> bool:
+        """Claim permission for one call (the probe when half-open)."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back a claimed probe without an outcome (call was rejected or cancelled)."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("Circuit opened after %d consecutive failures", self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a probe through."""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+
+class LatencyTracker:
+    """Rolling window of successful call durations with an EWMA."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+        self._ewma: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self._ewma = seconds if self._ewma is None else 0.8 * self._ewma + 0.2 * seconds
+
+    @property
+    def count(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    @property
+    def ewma(self) -> Optional[float]:
+        with self._lock:
+            return self._ewma
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q-th percentile (0-100) of the window, None without samples."""
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class Provider:
+    """One LLM deployment in the pool: its chain, breaker and latency stats."""
+
+    def __init__(self, llm: Any, chain: Any, model: str, breaker: CircuitBreaker):
+        self.llm = llm
+        self.chain = chain
+        self.model = model
+        self.provider = provider_name(llm)
+        self.name = f"{self.provider}:{model}"
+        self.breaker = breaker
+        self.latency = LatencyTracker()
+        self._chains: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "successes": 0, "failures": 0, "timeouts": 0, "hedges": 0, "hedges_won": 0}
+
+    def chain_for(self, prompt: Any = None) -> Any:
+        """The RAG chain, or prompt | llm | StrOutputParser() for another prompt."""
+        if prompt is None:
+            return self.chain
+        with self._lock:
+            chain = self._chains.get(id(prompt))
+            if chain is None:
+                chain = prompt | self.llm | StrOutputParser()
+                self._chains[id(prompt)] = chain
+            return chain
+
+    def admission(self):
+        """Admission controller bounding calls to this provider/model."""
+        return get_admission_controller(self.provider, self.model)
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            self._stats[field] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        ewma = self.latency.ewma
+        stats.update({
+            "name": self.name,
+            "state": self.breaker.state,
+            "latency_samples": self.latency.count,
+            "latency_ewma_seconds": round(ewma, 4) if ewma is not None else None,
+            "latency_p50_seconds": round(p50, 4) if p50 is not None else None,
+            "latency_p95_seconds": round(p95, 4) if p95 is not None else None,
+        })
+        return stats
+
+
+class _Attempt:
+    """A single call to one provider; its deadline starts once it is admitted."""
+
+    def __init__(self, provider: Provider, timeout: float, hedge: bool = False):
+        self.provider = provider
+        self.timeout = timeout
+        self.hedge = hedge
+        self.started: Optional[float] = None
+        self.abandoned = False
+        # Calls with another prompt (e.g. query rewrites) don't feed the latency stats
+        self.auxiliary = False
+
+    def begin(self) -> None:
+        self.started = time.monotonic()
+
+    @property
+    def deadline(self) -> Optional[float]:
+        if self.started is None or not self.timeout:
+            return None
+        return self.started + self.timeout
+
+
+class ProviderPool:
+    """
+    Ordered LLM providers with failover, per-call timeouts, circuit breakers
+    and optional hedging.
+
+    The primary provider is tried first unless latency stats show a faster
+    healthy one. A provider whose call fails or times out is skipped for the
+    next one; repeated failures open its breaker so it isn't tried until
+    reset. With hedging enabled, a backup call goes to the next provider when
+    the first hasn't answered within its p95 latency, and the first answer
+    wins.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 60.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        hedge_enabled: bool = False,
+        hedge_min_delay: float = 0.5,
+        hedge_default_delay: float = 2.0,
+        prefer_fastest: bool = True,
+        min_latency_samples: int = 5
+    ):
+        """
+        Args:
+            timeout: Seconds an admitted call may take (0 disables)
+            failure_threshold: Consecutive failures that open a provider's breaker
+            reset_timeout: Seconds an open breaker waits before a probe
+            hedge_enabled: Send a backup request to a second provider on slow calls
+            hedge_min_delay: Lower bound of the hedge delay
+            hedge_default_delay: Hedge delay until a provider has enough samples
+            prefer_fastest: Order healthy providers by observed latency
+            min_latency_samples: Samples needed before latency stats are trusted
+        """
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.prefer_fastest = prefer_fastest
+        self.min_latency_samples = min_latency_samples
+        self._providers: List[Provider] = []
+        self._primary: Optional[Provider] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ProviderPool":
+        """Pool configured from the LLM_* environment variables."""
+        return cls(
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "60")),
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+            hedge_enabled=os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true",
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5")),
+            hedge_default_delay=float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "2")),
+            prefer_fastest=os.getenv("LLM_PREFER_FASTEST", "true").lower() == "true",
+        )
+
+    def _make_provider(self, llm: Any, chain: Any, model: str) -> Provider:
+        return Provider(llm, chain, model, CircuitBreaker(self.failure_threshold, self.reset_timeout))
+
+    def set_primary(self, llm: Any, chain: Any, model: str) -> None:
+        """
+        Make llm the first provider. A no-op if it already is, so breaker
+        and latency state survive repeated calls.
+        """
+        with self._lock:
+            current = self._primary
+            if current is not None and current.llm is llm and current.chain is chain:
+                return
+            provider = self._make_provider(llm, chain, model)
+            if current is not None:
+                self._providers.remove(current)
+            self._providers.insert(0, provider)
+            self._primary = provider
+
+    def add_fallback(self, llm: Any, chain: Any, model: str) -> Provider:
+        """
+        Append a provider tried after the primary.
+
+        Args:
+            llm: Chat model
+            chain: Runnable producing the answer string (prompt | llm | parser)
+            model: Model name
+        """
+        provider = self._make_provider(llm, chain, model)
+        with self._lock:
+            self._providers.append(provider)
+        return provider
+
+    def candidates(self) -> List[Provider]:
+        """Providers whose breaker currently allows a call, best first."""
+        with self._lock:
+            providers = list(enumerate(self._providers))
+        healthy = [(i, p) for i, p in providers if p.breaker.available()]
+        if self.prefer_fastest:
+            # Providers without enough samples keep their configured position behind measured ones
+            healthy.sort(key=lambda item: (
+                item[1].latency.ewma if item[1].latency.count >= self.min_latency_samples else float("inf"),
+                item[0]
+            ))
+        return [p for _, p in healthy]
+
+    def hedge_delay(self, provider: Provider) -> float:
+        """Seconds to wait for provider before hedging: its p95 latency."""
+        if provider.latency.count < self.min_latency_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, provider.latency.percentile(95))
+
+    def _unavailable(self) -> ProvidersUnavailable:
+        with self._lock:
+            providers = list(self._providers)
+        waits = [p.breaker.retry_after() for p in providers]
+        return ProvidersUnavailable(max(1.0, min(waits) if waits else self.reset_timeout))
+
+    @staticmethod
+    def _failure(errors: List[BaseException], unavailable: Callable[[], Exception]) -> BaseException:
+        """Error to raise after every provider failed: a real failure beats a rejection."""
+        for error in reversed(errors):
+            if not isinstance(error, AdmissionRejected):
+                return error
+        return errors[-1] if errors else unavailable()
+
+    def _succeeded(self, attempt: _Attempt) -> None:
+        provider = attempt.provider
+        provider.breaker.record_success()
+        elapsed = time.monotonic() - attempt.started
+        if not attempt.auxiliary:
+            provider.latency.record(elapsed)
+        provider.count("successes")
+        if attempt.hedge:
+            provider.count("hedges_won")
+        stage = "llm_aux" if attempt.auxiliary else "llm"
+        STAGE_SECONDS.observe(elapsed, stage=stage, model=provider.model, provider=provider.provider)
+        LLM_CALLS.inc(model=provider.model, provider=provider.provider, outcome="success")
+        record_span(
+            f"{stage}_call", elapsed,
+            model=provider.model, provider=provider.provider, outcome="success", hedge=attempt.hedge
+        )
+
+    def _failed(self, attempt: _Attempt, timed_out: bool = False) -> None:
+        provider = attempt.provider
+        provider.breaker.record_failure()
+        provider.count("timeouts" if timed_out else "failures")
+        stage = "llm_aux" if attempt.auxiliary else "llm"
+        outcome = "timeout" if timed_out else "failure"
+        LLM_CALLS.inc(model=provider.model, provider=provider.provider, outcome=outcome)
+        ERRORS.inc(stage=stage, model=provider.model, provider=provider.provider)
+        if attempt.started is not None:
+            record_span(
+                f"{stage}_call", time.monotonic() - attempt.started,
+                model=provider.model, provider=provider.provider, outcome=outcome
+            )
+        logger.warning("LLM provider %s %s", provider.name, "timed out" if timed_out else "failed")
+
+    def _rejected(self, attempt: _Attempt) -> None:
+        provider = attempt.provider
+        provider.breaker.release()
+        LLM_CALLS.inc(model=provider.model, provider=provider.provider, outcome="rejected")
+
+    def _wait_time(self, attempts, hedge_at: Optional[float]) -> Optional[float]:
+        """Time until the next deadline or hedge; polls while a call still waits for admission."""
+        attempts = list(attempts)
+        wake = [a.deadline for a in attempts if a.deadline is not None]
+        if hedge_at is not None:
+            wake.append(hedge_at)
+        if self.timeout and any(a.started is None for a in attempts):
+            wake.append(time.monotonic() + _ADMISSION_POLL_SECONDS)
+        return max(0.0, min(wake) - time.monotonic()) if wake else None
+
+    def _next(self, pending: List[Provider], hedge: bool = False) -> Optional[_Attempt]:
+        """Claim the next provider whose breaker lets a call through."""
+        while pending:
+            provider = pending.pop(0)
+            if provider.breaker.allow():
+                provider.count("calls")
+                if hedge:
+                    provider.count("hedges")
+                return _Attempt(provider, self.timeout, hedge)
+        return None
+
+    # ---------- Blocking calls ----------
+
+    def _call(self, attempt: _Attempt, inputs: Dict, prompt: Any = None) -> Any:
+        """Runs in the executor: admission, the call itself and bookkeeping."""
+        provider = attempt.provider
+        attempt.auxiliary = prompt is not None
+        try:
+            with provider.admission().admit():
+                attempt.begin()
+                result = provider.chain_for(prompt).invoke(inputs)
+        except AdmissionRejected:
+            self._rejected(attempt)
+            raise
+        except Exception:
+            if attempt.abandoned:
+                provider.breaker.release()
+            else:
+                self._failed(attempt)
+            raise
+        if attempt.abandoned:
+            provider.breaker.release()
+        else:
+            self._succeeded(attempt)
+        return result
+
+    def invoke(self, inputs: Dict, prompt: Any = None) -> Any:
+        """
+        Blocking call with failover, timeouts and optional hedging.
+
+        Args:
+            inputs: Prompt variables passed to the chain
+            prompt: Prompt template to use instead of the RAG chain's
+
+        Returns:
+            The first successful chain output
+
+        Raises:
+            AdmissionRejected: every provider was saturated or broken
+            Exception: the last provider error when all providers failed
+        """
+        pending = self.candidates()
+        running: Dict[concurrent.futures.Future, _Attempt] = {}
+        errors: List[BaseException] = []
+        hedge_at = None
+
+        def launch(hedge: bool = False) -> Optional[_Attempt]:
+            attempt = self._next(pending, hedge)
+            if attempt is not None:
+                # Copy the context so the call's span lands in the caller's trace
+                running[_executor.submit(contextvars.copy_context().run, self._call, attempt, inputs, prompt)] = attempt
+            return attempt
+
+        first = launch()
+        if first is not None and self.hedge_enabled:
+            hedge_at = time.monotonic() + self.hedge_delay(first.provider)
+
+        while running:
+            wait = self._wait_time(running.values(), hedge_at if pending else None)
+            done, _ = concurrent.futures.wait(running, timeout=wait, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                attempt = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                for other in running.values():
+                    other.abandoned = True
+                return result
+
+            now = time.monotonic()
+            for future, attempt in list(running.items()):
+                if attempt.deadline is not None and now >= attempt.deadline:
+                    # The worker thread can't be interrupted; its late result is ignored
+                    attempt.abandoned = True
+                    del running[future]
+                    self._failed(attempt, timed_out=True)
+                    errors.append(TimeoutError(f"{attempt.provider.name} timed out after {self.timeout:.0f}s"))
+
+            if not running:
+                launch()  # failover
+            elif hedge_at is not None and pending and now >= hedge_at:
+                hedge_at = None
+                launch(hedge=True)
+
+        raise self._failure(errors, self._unavailable)
+
+    def stream(self, inputs: Dict) -> Iterator[Any]:
+        """
+        Blocking token stream. Fails over to the next provider only until the
+        first chunk has been yielded; no hedging or timeout on this path.
+        """
+        pending = self.candidates()
+        errors: List[BaseException] = []
+
+        while True:
+            attempt = self._next(pending)
+            if attempt is None:
+                raise self._failure(errors, self._unavailable)
+            provider = attempt.provider
+            yielded = False
+            try:
+                with provider.admission().admit():
+                    attempt.begin()
+                    for chunk in provider.chain.stream(inputs):
+                        yielded = True
+                        yield chunk
+            except AdmissionRejected as e:
+                self._rejected(attempt)
+                errors.append(e)
+                continue
+            except GeneratorExit:
+                provider.breaker.release()
+                raise
+            except Exception as e:
+                self._failed(attempt)
+                if yielded:
+                    raise
+                errors.append(e)
+                continue
+            self._succeeded(attempt)
+            return
+
+    # ---------- Async calls ----------
+
+    async def _acall(self, attempt: _Attempt, inputs: Dict, prompt: Any = None) -> Any:
+        provider = attempt.provider
+        attempt.auxiliary = prompt is not None
+        try:
+            async with provider.admission().admit_async():
+                attempt.begin()
+                result = await provider.chain_for(prompt).ainvoke(inputs)
+        except AdmissionRejected:
+            self._rejected(attempt)
+            raise
+        except asyncio.CancelledError:
+            if not attempt.abandoned:
+                provider.breaker.release()
+            raise
+        except Exception:
+            self._failed(attempt)
+            raise
+        self._succeeded(attempt)
+        return result
+
+    async def ainvoke(self, inputs: Dict, prompt: Any = None) -> Any:
+        """Async counterpart of invoke(); timed-out and losing calls are cancelled."""
+        pending = self.candidates()
+        running: Dict[asyncio.Task, _Attempt] = {}
+        errors: List[BaseException] = []
+        hedge_at = None
+
+        def launch(hedge: bool = False) -> Optional[_Attempt]:
+            attempt = self._next(pending, hedge)
+            if attempt is not None:
+                running[asyncio.ensure_future(self._acall(attempt, inputs, prompt))] = attempt
+            return attempt
+
+        try:
+            first = launch()
+            if first is not None and self.hedge_enabled:
+                hedge_at = time.monotonic() + self.hedge_delay(first.provider)
+
+            while running:
+                wait = self._wait_time(running.values(), hedge_at if pending else None)
+                done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    running.pop(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        continue
+                    return task.result()
+
+                now = time.monotonic()
+                for task, attempt in list(running.items()):
+                    if attempt.deadline is not None and now >= attempt.deadline:
+                        attempt.abandoned = True
+                        del running[task]
+                        task.cancel()
+                        self._failed(attempt, timed_out=True)
+                        errors.append(TimeoutError(f"{attempt.provider.name} timed out after {self.timeout:.0f}s"))
+
+                if not running:
+                    launch()  # failover
+                elif hedge_at is not None and pending and now >= hedge_at:
+                    hedge_at = None
+                    launch(hedge=True)
+
+            raise self._failure(errors, self._unavailable)
+        finally:
+            # Losing hedge, or the caller went away: stop paying for it
+            for task in running:
+                task.cancel()
+
+    async def astream(self, inputs: Dict) -> AsyncIterator[Any]:
+        """
+        Async token stream. Fails over until the first chunk arrives; the
+        wait for the first chunk is bounded by the call timeout.
+        """
+        pending = self.candidates()
+        errors: List[BaseException] = []
+
+        while True:
+            attempt = self._next(pending)
+            if attempt is None:
+                raise self._failure(errors, self._unavailable)
+            provider = attempt.provider
+            yielded = False
+            try:
+                async with provider.admission().admit_async():
+                    attempt.begin()
+                    chunks = provider.chain.astream(inputs).__aiter__()
+                    try:
+                        first = await asyncio.wait_for(chunks.__anext__(), self.timeout or None)
+                    except StopAsyncIteration:
+                        first = None
+                    if first is not None:
+                        yielded = True
+                        yield first
+                        async for chunk in chunks:
+                            yield chunk
+            except AdmissionRejected as e:
+                self._rejected(attempt)
+                errors.append(e)
+                continue
+            except asyncio.TimeoutError as e:
+                self._failed(attempt, timed_out=True)
+                if yielded:
+                    raise
+                errors.append(TimeoutError(f"{provider.name} sent no tokens within {self.timeout:.0f}s"))
+                continue
+            except (asyncio.CancelledError, GeneratorExit):
+                provider.breaker.release()
+                raise
+            except Exception as e:
+                self._failed(attempt)
+                if yielded:
+                    raise
+                errors.append(e)
+                continue
+            self._succeeded(attempt)
+            return
+
+    def stats(self) -> Dict:
+        """Per-provider breaker state, call counts and latency percentiles."""
+        with self._lock:
+            providers = list(self._providers)
+            primary = self._primary
+        return {
+            "hedge_enabled": self.hedge_enabled,
+            "timeout_seconds": self.timeout,
+            "order": [p.name for p in self.candidates()],
+            "providers": [dict(p.stats(), primary=p is primary) for p in providers],
+        }
@@ -0,0 +1,126 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from .cache import normalize_question
+
+# Words that usually point back at something said earlier in the conversation
+_REFERENCE_WORDS = re.compile(
+    r"\b(it|its|they|them|their|theirs|this|that|these|those|he|him|his|she|her|hers"
+    r"|former|latter|above|previous|earlier|same|one|ones|another|other|others|else)\b"
+)
+
+# Openers of follow-ups that lean on the previous turn ("and the second one?")
+_FOLLOW_UP_OPENERS = (
+    "and ", "but ", "so ", "also ", "then ", "ok ", "okay ",
+    "what about", "how about", "what else", "why not",
+)
+
+REWRITE_PROMPT = ChatPromptTemplate.from_template(
+    "Given the conversation below and a follow-up question, rewrite the follow-up "
+    "as a standalone search query that can be understood without the conversation. "
+    "Keep names, numbers and key terms. Return only the query."
+    "\n\nConversation:\n{history}\n\nFollow-up question: {question}\n\nStandalone query:"
+)
+
+
+def is_self_contained(question: str) -> bool:
+    """
+    Cheap check whether a question can be searched without chat history.
+
+    Conservative: short questions, follow-up openers and pronouns or other
+    back-references all count as needing a rewrite.
+
+    Args:
+        question: Raw user question
+
+    Returns:
+        bool: True if the question can be used as the search query as-is
+    """
+    text = normalize_question(question)
+    if len(text.split()) <= 3:
+        return False
+    if text.startswith(_FOLLOW_UP_OPENERS):
+        return False
+    return not _REFERENCE_WORDS.search(text)
+
+
+def format_history(messages: List[Dict], max_chars: int = 500) -> str:
+    """Render messages as 'User: ...' / 'Assistant: ...' lines, each truncated."""
+    lines = []
+    for message in messages:
+        content = " ".join(message["content"].split())
+        if len(content) > max_chars:
+            content = content[:max_chars] + "..."
+        lines.append(f"{message['role'].capitalize()}: {content}")
+    return "\n".join(lines)
+
+
+def clean_rewrite(question: str, rewritten: str) -> str:
+    """
+    Sanity-check an LLM rewrite, falling back to the original question.
+
+    Keeps the first non-empty line without surrounding quotes; rejects
+    empty or runaway (more than 4x longer) outputs.
+    """
+    lines = [line.strip() for line in (rewritten or "").splitlines() if line.strip()]
+    if not lines:
+        return question
+    candidate = lines[0].strip("\"'` ")
+    if candidate.lower().startswith("standalone query:"):
+        candidate = candidate[len("standalone query:"):].strip()
+    if not candidate or len(candidate) > 4 * max(len(question), 50):
+        return question
+    return candidate
+
+
+class RewriteCache:
+    """
+    Bounded LRU of condensed questions keyed by (session, turn, question).
+
+    The turn is the ID of the newest history message the rewrite was based
+    on, so a retried or repeated follow-up in the same turn reuses the
+    rewrite, while the same words after a new turn get a fresh one.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "fast_path": 0, "rewrites": 0, "failures": 0}
+
+    @staticmethod
+    def key(session_id: str, turn: Optional[int], question: str) -> Tuple:
+        return (session_id, turn, normalize_question(question))
+
+    def get(self, key: Tuple) -> Optional[str]:
+        with self._lock:
+            rewritten = self._entries.get(key)
+            if rewritten is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return rewritten
+
+    def put(self, key: Tuple, rewritten: str) -> None:
+        with self._lock:
+            self._entries[key] = rewritten
+            self._entries.move_to_end(key)
+            self._stats["rewrites"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            self._stats[field] += 1
+
+    def stats(self) -> Dict:
+        """Fast-path, cache hit and LLM rewrite counts."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            return stats
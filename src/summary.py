@@ -0,0 +1,68 @@
+from typing import Dict, List, Optional
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from .rewrite import format_history
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_template(
+    "You maintain a running summary of a conversation about a document. "
+    "Update the summary with the new messages. Keep the questions asked, the key "
+    "facts in the answers and anything the user may refer back to. Be concise: "
+    "at most {max_words} words. Return only the summary."
+    "\n\nCurrent summary:\n{summary}\n\nNew messages:\n{messages}\n\nUpdated summary:"
+)
+
+NO_HISTORY = "(no previous conversation)"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def build_prompt_history(summary: Optional[str], messages: List[Dict], max_tokens: int) -> str:
+    """
+    Render the conversation for the prompt within a token budget.
+
+    The summary comes first (truncated if it alone exceeds the budget), then
+    as many of the most recent messages as still fit, oldest first.
+
+    Args:
+        summary: Rolling summary of older messages, if any
+        messages: Unsummarized messages, oldest to newest
+        max_tokens: Token budget for the whole history block
+
+    Returns:
+        str: History text, or NO_HISTORY when there is nothing to include
+    """
+    parts = []
+    budget = max_tokens
+
+    if summary:
+        summary_text = f"Summary of earlier conversation: {summary.strip()}"
+        if estimate_tokens(summary_text) > budget:
+            summary_text = summary_text[:budget * 4] + "..."
+        parts.append(summary_text)
+        budget -= estimate_tokens(summary_text)
+
+    recent = []
+    for message in reversed(messages):
+        line = format_history([message])
+        cost = estimate_tokens(line) + 1
+        if cost > budget:
+            break
+        recent.append(line)
+        budget -= cost
+
+    if recent:
+        parts.append("Recent messages:\n" + "\n".join(reversed(recent)))
+
+    return "\n".join(parts) if parts else NO_HISTORY
+
+
+def clean_summary(summary: str, max_words: int) -> str:
+    """Trim an LLM summary to max_words (with a little slack) and strip whitespace."""
+    words = (summary or "").split()
+    if len(words) > max_words * 1.5:
+        words = words[:int(max_words * 1.5)] + ["..."]
+    return " ".join(words)
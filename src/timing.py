@@ -0,0 +1,46 @@
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Dict, TypeVar
+
+from .tracing import record_span
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """
+    Wall-clock durations of the named stages of one request.
+
+    Stages may overlap (they run concurrently in the async query path), so
+    their sum can exceed 'total_ms'.
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block of code as stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = round(elapsed * 1000, 2)
+            record_span(name, elapsed)
+
+    def mark(self, name: str):
+        """Record the time elapsed since the request started as stage `name`."""
+        self.stages[name] = round((time.perf_counter() - self._start) * 1000, 2)
+
+    async def run(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Await `awaitable`, timing it as stage `name`."""
+        with self.stage(name):
+            return await awaitable
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage durations in milliseconds plus the total so far."""
+        timings = {f"{name}_ms": ms for name, ms in self.stages.items()}
+        timings["total_ms"] = round((time.perf_counter() - self._start) * 1000, 2)
+        return timings
@@ -0,0 +1,161 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Incoming X-Request-ID values are echoed into logs, so only accept plain IDs
+_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Trace:
+    """
+    Trace ID and spans of one request.
+
+    Spans are appended from the request's task and from worker threads that
+    inherited its context (asyncio.to_thread, the LLM executor); list
+    appends are atomic, so no lock is needed.
+    """
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id if trace_id and _TRACE_ID.match(trace_id) else uuid.uuid4().hex[:16]
+        self._start = time.perf_counter()
+        self.spans: List[Dict] = []
+        # Request details worth keeping with its timings (document, model, cache status, ...)
+        self.attrs: Dict = {}
+
+    def add_span(self, name: str, duration: float, **attrs) -> None:
+        """Record a span of `duration` seconds that ended just now."""
+        end = time.perf_counter() - self._start
+        span = {
+            "name": name,
+            "start_ms": round((end - duration) * 1000, 2),
+            "duration_ms": round(duration * 1000, 2),
+        }
+        span.update((key, value) for key, value in attrs.items() if value)
+        self.spans.append(span)
+
+    @property
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self._start) * 1000, 2)
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Milliseconds per span name (summed when a step ran several times)."""
+        totals: Dict[str, float] = {}
+        for span in list(self.spans):
+            totals[span["name"]] = round(totals.get(span["name"], 0.0) + span["duration_ms"], 2)
+        return totals
+
+    def as_dict(self) -> Dict:
+        spans = sorted(list(self.spans), key=lambda span: span["start_ms"])
+        return {"trace_id": self.trace_id, "total_ms": self.elapsed_ms, "spans": spans}
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("rag_trace", default=None)
+
+
+def start_trace(trace_id: Optional[str] = None) -> Tuple[Trace, contextvars.Token]:
+    """Begin a trace for the current request; pass the token to end_trace()."""
+    trace = Trace(trace_id)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token: contextvars.Token) -> None:
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def annotate(**attrs) -> None:
+    """Attach request details to the current trace; a no-op outside a request."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def record_span(name: str, duration: float, **attrs) -> None:
+    """Add a finished span to the current trace; a no-op outside a request."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, duration, **attrs)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block of code as a span of the current trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start, **attrs)
+
+
+# ---------- Structured logging ----------
+
+class TraceIdFilter(logging.Filter):
+    """Stamp every log record with the trace ID of the request it belongs to."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # An explicit extra={'trace_id': ...} wins (e.g. logged after the request's context ended)
+        if not hasattr(record, "trace_id"):
+            trace = _current_trace.get()
+            record.trace_id = trace.trace_id if trace is not None else "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed as extra={'fields': {...}} become keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            "message": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with the trace ID and key=value fields appended."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "trace_id"):
+            record.trace_id = "-"
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(
+                f"{key}={json.dumps(value, default=str) if isinstance(value, (dict, list)) else value}"
+                for key, value in fields.items()
+            )
+        return line
+
+
+def configure_logging() -> None:
+    """
+    Set up root logging from LOG_LEVEL (default INFO) and LOG_FORMAT
+    ('text' or 'json'). Debug output is skipped before formatting when
+    its level is disabled.
+    """
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceIdFilter())
+    handler.setFormatter(JsonFormatter() if os.getenv("LOG_FORMAT", "text").lower() == "json" else TextFormatter())
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        handlers=[handler],
+        force=True
+    )
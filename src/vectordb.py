@@ -1,61 +1,517 @@
 import os
+import json
+import time
+import uuid
+import fnmatch
 import chromadb
 import logging
-from typing import List, Dict, Any, Union
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Tuple, Union, Optional
 from sentence_transformers import SentenceTransformer
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from .cache import RetrievalCache
+from .database import PER_DOCUMENT_COLLECTION_PREFIX
+from .expansion import reciprocal_rank_fusion
+from .metrics import CHUNKS, stage
+
 # FIX: Use proper logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Embedding models are expensive to load, so share one instance per model name
+_embedding_models: Dict[str, SentenceTransformer] = {}
+_embedding_models_lock = threading.Lock()
+
+
+def get_embedding_model(model_name: str) -> SentenceTransformer:
+    """
+    Return a process-wide SentenceTransformer, loading it on first use.
+
+    Args:
+        model_name: HuggingFace model name
+
+    Returns:
+        SentenceTransformer: Shared model instance
+    """
+    model = _embedding_models.get(model_name)
+    if model is None:
+        with _embedding_models_lock:
+            model = _embedding_models.get(model_name)
+            if model is None:
+                logger.info("Loading embedding model: %s", model_name)
+                model = SentenceTransformer(model_name)
+                _embedding_models[model_name] = model
+    return model
+
+
+def default_embedding_model_name() -> str:
+    """Embedding model configured by EMBEDDING_MODEL."""
+    return os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+def embed_queries(queries: List[str], model_name: str = None) -> List[List[float]]:
+    """
+    Embed query strings without opening a collection.
+
+    Lets callers compute query embeddings before they know which
+    collection will be searched (e.g. while the session is looked up).
+
+    Args:
+        queries: list of query strings
+        model_name: HuggingFace model name (default: EMBEDDING_MODEL)
+
+    Returns:
+        List[List[float]]: one embedding per query
+    """
+    model_name = model_name or default_embedding_model_name()
+    model = get_embedding_model(model_name)
+    with stage("query_embed", model=model_name, provider="sentence-transformers"):
+        embeddings = model.encode(queries)
+    try:
+        return embeddings.tolist()
+    except Exception:
+        return [list(e) for e in embeddings]
+
+
+# Opening a PersistentClient is not free, and VectorDB is created per request
+_chroma_clients: Dict[str, Any] = {}
+_chroma_clients_lock = threading.Lock()
+
+
+def get_chroma_client(path: str = "./chroma_db"):
+    """Return a process-wide ChromaDB client for a storage path."""
+    client = _chroma_clients.get(path)
+    if client is None:
+        with _chroma_clients_lock:
+            client = _chroma_clients.get(path)
+            if client is None:
+                client = chromadb.PersistentClient(path=path)
+                _chroma_clients[path] = client
+    return client
+
+
+# Search results shared across VectorDB instances (they are created per request)
+_retrieval_cache: Optional[RetrievalCache] = None
+_retrieval_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """
+    Return the process-wide retrieval result cache, creating it on first use.
+
+    Size comes from RETRIEVAL_CACHE_MAX_ENTRIES; 0 disables caching.
+    """
+    global _retrieval_cache
+    if _retrieval_cache is None:
+        with _retrieval_cache_lock:
+            if _retrieval_cache is None:
+                _retrieval_cache = RetrievalCache(
+                    max_entries=int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "2048"))
+                )
+    return _retrieval_cache
+
+
+# ---------- HNSW index settings ----------
+
+# Chroma can change these on a live index; the rest only apply to a newly built one
+HNSW_MUTABLE = ("ef_search", "num_threads", "batch_size", "sync_threshold", "resize_factor")
+HNSW_KEYS = ("space", "max_neighbors", "ef_construction") + HNSW_MUTABLE
+
+_hnsw_overrides: Optional[List] = None
+
+_index_rebuilds: Dict[str, Dict[str, Any]] = {}
+_index_rebuilds_lock = threading.Lock()
+# A failed rebuild is not retried on every collection open
+_REBUILD_RETRY_SECONDS = 300
+
+
+class _CollectionWrites:
+    """
+    Writes to one collection name, as seen by an index rebuild.
+
+    `cond` guards the rest. Writers count themselves in `in_flight` while
+    they write (the lock is only held to resolve the collection), and while
+    a rebuild copies rows they log what they changed in `log`, so the
+    rebuild can replay exactly those changes instead of diffing the two
+    indexes. `swapping` holds off new writers while the rebuild waits for
+    the in-flight ones, replays the rest of the log and renames.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.in_flight = 0
+        self.swapping = False
+        # (ids upserted, where filter deleted) per write, or None when no rebuild is copying
+        self.log: Optional[List[Tuple[Optional[List[str]], Optional[Dict[str, Any]]]]] = None
+
+
+_collection_writes: Dict[str, _CollectionWrites] = {}
+_collection_writes_lock = threading.Lock()
+
+
+def _writes_for(collection_name: str) -> _CollectionWrites:
+    with _collection_writes_lock:
+        writes = _collection_writes.get(collection_name)
+        if writes is None:
+            writes = _collection_writes[collection_name] = _CollectionWrites()
+        return writes
+
+
+def _collection_hnsw_overrides() -> List:
+    """
+    Per-collection settings from CHROMA_HNSW_COLLECTIONS, a JSON object of
+    collection name patterns (fnmatch) to HNSW settings, e.g.
+    {"doc_*": {"ef_search": 20}, "rag_shared": {"max_neighbors": 32, "ef_search": 200}}.
+    """
+    global _hnsw_overrides
+    if _hnsw_overrides is None:
+        raw = os.getenv("CHROMA_HNSW_COLLECTIONS", "").strip()
+        overrides = []
+        if raw:
+            try:
+                for pattern, settings in json.loads(raw).items():
+                    unknown = set(settings) - set(HNSW_KEYS)
+                    if unknown:
+                        logger.warning("Ignoring unknown HNSW settings for %s: %s", pattern, sorted(unknown))
+                    overrides.append((pattern, {k: v for k, v in settings.items() if k in HNSW_KEYS}))
+            except (ValueError, AttributeError) as e:
+                logger.error("Invalid CHROMA_HNSW_COLLECTIONS, using defaults: %s", e)
+                overrides = []
+        _hnsw_overrides = overrides
+    return _hnsw_overrides
+
+
+def hnsw_settings(collection_name: str, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    HNSW settings a collection should have.
+
+    Deployment defaults (CHROMA_HNSW_SPACE, CHROMA_HNSW_M,
+    CHROMA_HNSW_CONSTRUCTION_EF, CHROMA_HNSW_SEARCH_EF), then every
+    matching CHROMA_HNSW_COLLECTIONS pattern in order, then `overrides`.
+    The space defaults to cosine: MiniLM embeddings are normalized.
+
+    Args:
+        collection_name: Collection the settings are for
+        overrides: Explicit settings that win over the environment
+
+    Returns:
+        Dict of Chroma HNSW configuration keys
+    """
+    settings = {
+        "space": os.getenv("CHROMA_HNSW_SPACE", "cosine"),
+        "max_neighbors": int(os.getenv("CHROMA_HNSW_M", "16")),
+        "ef_construction": int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "100")),
+        "ef_search": int(os.getenv("CHROMA_HNSW_SEARCH_EF", "100")),
+    }
+    for pattern, values in _collection_hnsw_overrides():
+        if fnmatch.fnmatchcase(collection_name, pattern):
+            settings.update(values)
+    settings.update(overrides or {})
+    return settings
+
+
+def active_hnsw_settings(collection) -> Dict[str, Any]:
+    """HNSW settings a Chroma collection was built/configured with."""
+    configuration = getattr(collection, "configuration", None) or {}
+    return dict(configuration.get("hnsw") or {})
+
+
+def _copy_rows(
+    source,
+    target,
+    ids: Optional[List[str]] = None,
+    batch_size: int = 1000,
+    extra_metadata: Optional[Dict[str, Any]] = None
+) -> int:
+    """
+    Copy stored embeddings, documents and metadata (no re-embedding).
+    Upserts, so an interrupted copy can simply be run again.
+    """
+    copied = 0
+    offset = 0
+    while True:
+        if ids is not None:
+            if offset >= len(ids):
+                return copied
+            batch = source.get(ids=ids[offset:offset + batch_size], include=["embeddings", "documents", "metadatas"])
+        else:
+            batch = source.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            return copied
+        documents, metadatas = batch.get("documents"), batch.get("metadatas")
+        if extra_metadata:
+            metadatas = [dict(metadata or {}, **extra_metadata) for metadata in (metadatas or [None] * len(batch["ids"]))]
+        target.upsert(
+            ids=batch["ids"],
+            embeddings=batch["embeddings"],
+            documents=documents if documents and None not in documents else None,
+            metadatas=metadatas if metadatas and None not in metadatas else None,
+        )
+        copied += len(batch["ids"])
+        offset += batch_size
+
+
+def _drop_collection(client, name: str) -> None:
+    try:
+        client.delete_collection(name=name)
+        logger.info("Dropped retired index %s", name)
+    except Exception as e:
+        logger.warning("Could not drop retired index %s: %s", name, e)
+
+
+def _replay_writes(old, new, log) -> int:
+    """Apply logged writes to the new index, in order; rows are re-read from the old one."""
+    rows = 0
+    for ids, where in log:
+        if ids:
+            # Copied as they are now, so a row updated after the bulk copy read it is fresh too
+            rows += _copy_rows(old, new, ids=ids)
+        if where:
+            new.delete(where=where)
+    return rows
+
+
+def _rebuild_index(client, collection_name: str, settings: Dict[str, Any]) -> None:
+    """
+    Build a new index with `settings` next to the live one, then swap it in.
+
+    Searches keep using the old index while rows are copied. Writes made
+    meanwhile (adds, updates and deletes) are logged and replayed on the
+    new index before the swap; the old index is dropped after
+    CHROMA_REBUILD_GRACE_SECONDS so searches that already hold it finish
+    (writes always re-resolve the collection by name, see VectorDB._live_collection).
+    """
+    status = _index_rebuilds[collection_name]
+    writes = _writes_for(collection_name)
+    start = time.perf_counter()
+    temp_name = f"{collection_name}-rebuild-{uuid.uuid4().hex[:8]}"
+    try:
+        old = client.get_collection(name=collection_name)
+        metadata = {k: v for k, v in (old.metadata or {}).items() if not k.startswith("hnsw:")}
+        new = client.create_collection(name=temp_name, metadata=metadata or None, configuration={"hnsw": settings})
+        with writes.cond:
+            writes.log = []
+        rows = _copy_rows(old, new)
+
+        # Catch up without holding off writers, then only on what arrived meanwhile
+        with writes.cond:
+            log, writes.log = writes.log, []
+        rows += _replay_writes(old, new, log)
+
+        with writes.cond:
+            writes.swapping = True
+            writes.cond.wait_for(lambda: writes.in_flight == 0)
+            log, writes.log = writes.log, None
+            rows += _replay_writes(old, new, log)
+            retired = f"{collection_name}-retired-{uuid.uuid4().hex[:8]}"
+            old.modify(name=retired)
+            new.modify(name=collection_name)
+            writes.swapping = False
+            writes.cond.notify_all()
+
+        get_retrieval_cache().invalidate(collection_name)
+        grace = float(os.getenv("CHROMA_REBUILD_GRACE_SECONDS", "30"))
+        timer = threading.Timer(grace, _drop_collection, (client, retired))
+        timer.daemon = True
+        timer.start()
+
+        status.update(state="done", rows=rows, seconds=round(time.perf_counter() - start, 3), finished_at=time.time())
+        logger.info("Rebuilt index %s (%d rows) in %ss with %s", collection_name, rows, status["seconds"], settings)
+    except Exception as e:
+        with writes.cond:
+            writes.log = None
+            writes.swapping = False
+            writes.cond.notify_all()
+        status.update(state="failed", error=str(e), finished_at=time.time())
+        logger.error("Rebuilding index %s failed: %s", collection_name, e)
+        _drop_collection(client, temp_name)
+
+
+def schedule_index_rebuild(client, collection_name: str, settings: Dict[str, Any]) -> bool:
+    """
+    Rebuild a collection's index in the background (one rebuild per
+    collection at a time).
+
+    Returns:
+        bool: True if a rebuild was started, False if one is already running
+        (or failed less than _REBUILD_RETRY_SECONDS ago)
+    """
+    with _index_rebuilds_lock:
+        previous = _index_rebuilds.get(collection_name, {})
+        if previous.get("state") == "running":
+            return False
+        if previous.get("state") == "failed" and time.time() - previous["finished_at"] < _REBUILD_RETRY_SECONDS:
+            return False
+        _index_rebuilds[collection_name] = {"state": "running", "settings": dict(settings), "started_at": time.time()}
+    threading.Thread(
+        target=_rebuild_index, args=(client, collection_name, settings),
+        name=f"index-rebuild-{collection_name}", daemon=True
+    ).start()
+    return True
+
+
+def index_stats(collection_name: str = None, limit: int = 100) -> Optional[Dict[str, Any]]:
+    """
+    Active vs configured HNSW settings per collection, with rebuild status.
+
+    Args:
+        collection_name: One collection, or None for up to `limit` collections
+
+    Returns:
+        Dict with 'collections' (one entry each), or None if the named
+        collection doesn't exist
+    """
+    client = get_chroma_client("./chroma_db")
+    if collection_name:
+        try:
+            collections = [client.get_collection(name=collection_name)]
+        except Exception:
+            return None
+    else:
+        collections = client.list_collections(limit=limit)
+
+    entries = []
+    for collection in collections:
+        active = active_hnsw_settings(collection)
+        configured = hnsw_settings(collection.name)
+        entries.append({
+            "name": collection.name,
+            "count": collection.count(),
+            "active": active,
+            "configured": configured,
+            "pending": sorted(k for k, v in configured.items() if active.get(k) != v),
+            "rebuild": dict(_index_rebuilds.get(collection.name) or {}) or None,
+        })
+    return {"collections": entries}
+
 
 class VectorDB:
     """
     A simple vector database wrapper using ChromaDB with HuggingFace embeddings.
     """
-    def __init__(self, collection_name: str = None, embedding_model: str = None):
+    def __init__(
+        self,
+        collection_name: str = None,
+        embedding_model: str = None,
+        chunk_size: int = None,
+        chunk_overlap: int = None,
+        hnsw: Optional[Dict[str, Any]] = None,
+        document_id: str = None
+    ):
         """
         Initialize the vector database.
 
         Args:
             collection_name: Name of the ChromaDB collection
             embedding_model: HuggingFace model name for embeddings
+            chunk_size: Characters per chunk when adding documents (default: CHUNK_SIZE)
+            chunk_overlap: Characters shared by neighbouring chunks (default: CHUNK_OVERLAP)
+            hnsw: HNSW settings overriding the deployment/per-collection ones (see hnsw_settings)
+            document_id: Document this instance works on; in a shared collection
+                searches, counts and deletes are limited to its chunks
         """
         self.collection_name = collection_name or os.getenv(
             "CHROMA_COLLECTION_NAME", "rag_documents"
         )
-        self.embedding_model_name = embedding_model or os.getenv(
-            "EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
-        )
+        self.embedding_model_name = embedding_model or default_embedding_model_name()
+        self.chunk_size = chunk_size or int(os.getenv("CHUNK_SIZE", "1500"))
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else int(os.getenv("CHUNK_OVERLAP", "150"))
+        self.hnsw = hnsw_settings(self.collection_name, hnsw)
+
+        # Shared collections hold many documents: filter by document, and keep
+        # each document's cached results apart (per-document collections need neither)
+        self.document_id = document_id
+        shared = not self.collection_name.startswith(PER_DOCUMENT_COLLECTION_PREFIX)
+        self.where = {"document_id": document_id} if document_id and shared else None
+        self.cache_namespace = f"{self.collection_name}/{document_id}" if self.where else self.collection_name
 
         try:
-            # Initialize ChromaDB client
-            self.client = chromadb.PersistentClient(path="./chroma_db")
+            # Initialize ChromaDB client (shared across VectorDB instances)
+            self.client = get_chroma_client("./chroma_db")
 
-            # Load embedding model
-            logger.info(f"Loading embedding model: {self.embedding_model_name}")
-            self.embedding_model = SentenceTransformer(self.embedding_model_name)
+            # Load embedding model (shared across VectorDB instances)
+            self.embedding_model = get_embedding_model(self.embedding_model_name)
 
-            # Get or create collection
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"description": "RAG document collection"},
-            )
+            # Get or create collection (new ones are built with the configured HNSW settings)
+            try:
+                self.collection = self.client.get_collection(name=self.collection_name)
+            except Exception:
+                # Missing, or renamed away for a moment by an index swap: never create it mid-swap
+                writes = _writes_for(self.collection_name)
+                with writes.cond:
+                    writes.cond.wait_for(lambda: not writes.swapping)
+                    self.collection = self.client.get_or_create_collection(
+                        name=self.collection_name,
+                        metadata={"description": "RAG document collection"},
+                        configuration={"hnsw": self.hnsw},
+                    )
+            self._apply_index_settings()
 
-            logger.info(f"Vector database initialized with collection: {self.collection_name}")
+            logger.info("Vector database initialized with collection: %s", self.collection_name)
         except Exception as e:
-            logger.error(f"Error initializing VectorDB: {e}")
+            logger.error("Error initializing VectorDB: %s", e)
             raise
 
-    def chunk_text(self, text: str, chunk_size: int = 1500, chunk_overlap: int = 150) -> List[str]:
+    def _apply_index_settings(self) -> None:
+        """
+        Bring an existing collection in line with its configured HNSW
+        settings: search-time ones are changed in place, build-time ones
+        (space, max_neighbors, ef_construction) start an online rebuild.
+        """
+        try:
+            active = active_hnsw_settings(self.collection)
+            if not active:
+                return
+            changed = {k: v for k, v in self.hnsw.items() if active.get(k) != v}
+            if not changed:
+                return
+            if any(k not in HNSW_MUTABLE for k in changed):
+                if schedule_index_rebuild(self.client, self.collection_name, self.hnsw):
+                    logger.info("Rebuilding index %s: %s -> %s", self.collection_name, active, self.hnsw)
+                return
+            self.collection.modify(configuration={"hnsw": changed})
+            logger.info("Updated index settings of %s: %s", self.collection_name, changed)
+        except Exception as e:
+            # Serving from the current index beats failing the request
+            logger.warning("Could not apply index settings to %s: %s", self.collection_name, e)
+
+    @contextmanager
+    def _live_collection(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        """
+        The collection currently named self.collection_name, to write to.
+        self.collection may be an index that a rebuild has since retired
+        (and will drop), so writes never go through it. The write is
+        counted as in flight (an index swap waits for it) and logged for a
+        rebuild that is copying rows; no lock is held while it runs.
+
+        Args:
+            ids: Ids the write adds or updates
+            where: Filter of the rows the write deletes
+        """
+        writes = _writes_for(self.collection_name)
+        with writes.cond:
+            writes.cond.wait_for(lambda: not writes.swapping)
+            self.collection = self.client.get_collection(name=self.collection_name)
+            writes.in_flight += 1
+        try:
+            yield self.collection
+        finally:
+            with writes.cond:
+                writes.in_flight -= 1
+                if writes.log is not None:
+                    writes.log.append((ids, where))
+                writes.cond.notify_all()
+
+    def chunk_text(self, text: str, chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
         """
         Split text into chunks using RecursiveCharacterTextSplitter.
 
         Args:
             text: Input text (str)
-            chunk_size: Approximate number of characters per chunk
-            chunk_overlap: Number of overlapping characters between chunks
+            chunk_size: Approximate number of characters per chunk (default: self.chunk_size)
+            chunk_overlap: Number of overlapping characters between chunks (default: self.chunk_overlap)
 
         Returns:
             List[str]: list of text chunks
@@ -71,15 +527,15 @@ class VectorDB:
         
         try:
             text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
+                chunk_size=chunk_size or self.chunk_size,
+                chunk_overlap=chunk_overlap if chunk_overlap is not None else self.chunk_overlap,
             )
             chunks = text_splitter.split_text(text)
             
-            logger.info(f"Text split into {len(chunks)} chunks")
+            logger.info("Text split into %d chunks", len(chunks))
             return chunks
         except Exception as e:
-            logger.error(f"Error chunking text: {e}")
+            logger.error("Error chunking text: %s", e)
             return []
 
     def add_document(self, document_text: str, document_id: str = None) -> int:
@@ -105,15 +561,17 @@ class VectorDB:
 
         try:
             # Chunk the text
-            chunks = self.chunk_text(document_text)
+            with stage("chunk"):
+                chunks = self.chunk_text(document_text)
             
             if not chunks:
                 logger.warning("No chunks generated from document")
                 return 0
 
             # Generate embeddings
-            logger.info(f"Generating embeddings for {len(chunks)} chunks...")
-            embeddings = self.embedding_model.encode(chunks)
+            logger.info("Generating embeddings for %d chunks...", len(chunks))
+            with stage("embed", model=self.embedding_model_name, provider="sentence-transformers"):
+                embeddings = self.embedding_model.encode(chunks)
             
             # FIX: Safely convert to list
             try:
@@ -132,6 +590,7 @@ class VectorDB:
             metadatas = [
                 {
                     "source": document_id,
+                    "document_id": document_id,
                     "chunk_index": i,
                     "chunk_size": len(chunks[i])
                 }
@@ -140,43 +599,62 @@ class VectorDB:
 
             # FIX: Try to add, handle duplicates gracefully
             try:
-                self.collection.add(
-                    ids=ids,
-                    embeddings=emb_list,
-                    documents=chunks,
-                    metadatas=metadatas,
-                )
-                logger.info(f"Successfully added {len(chunks)} chunks to vector database")
+                with stage("chroma_add", provider="chroma"), self._live_collection(ids=ids) as collection:
+                    collection.add(
+                        ids=ids,
+                        embeddings=emb_list,
+                        documents=chunks,
+                        metadatas=metadatas,
+                    )
+                logger.info("Successfully added %d chunks to vector database", len(chunks))
+                get_retrieval_cache().invalidate(self.cache_namespace)
+                CHUNKS.inc(len(chunks), model=self.embedding_model_name)
                 return len(chunks)
             
             except Exception as add_error:
                 # If chunks already exist, try upserting instead
                 if "already exists" in str(add_error).lower():
-                    logger.warning(f"Chunks already exist, attempting to update...")
+                    logger.warning("Chunks already exist, attempting to update...")
                     try:
-                        self.collection.upsert(
-                            ids=ids,
-                            embeddings=emb_list,
-                            documents=chunks,
-                            metadatas=metadatas,
-                        )
-                        logger.info(f"Successfully updated {len(chunks)} chunks in vector database")
+                        with stage("chroma_add", provider="chroma"), self._live_collection(ids=ids) as collection:
+                            collection.upsert(
+                                ids=ids,
+                                embeddings=emb_list,
+                                documents=chunks,
+                                metadatas=metadatas,
+                            )
+                        logger.info("Successfully updated %d chunks in vector database", len(chunks))
+                        get_retrieval_cache().invalidate(self.cache_namespace)
+                        CHUNKS.inc(len(chunks), model=self.embedding_model_name)
                         return len(chunks)
                     except Exception as upsert_error:
-                        logger.error(f"Error upserting chunks: {upsert_error}")
+                        logger.error("Error upserting chunks: %s", upsert_error)
                         return 0
                 else:
-                    logger.error(f"Error adding chunks: {add_error}")
+                    logger.error("Error adding chunks: %s", add_error)
                     return 0
 
         except Exception as e:
-            logger.error(f"Error in add_document: {e}")
+            logger.error("Error in add_document: %s", e)
             return 0
 
+    def encode_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed query strings with the collection's embedding model.
+
+        Args:
+            queries: list of query strings
+
+        Returns:
+            List[List[float]]: one embedding per query
+        """
+        return embed_queries(queries, self.embedding_model_name)
+
     def search(
         self, 
         query: Union[str, List[str]], 
-        n_results: int = 5
+        n_results: int = 5,
+        query_embeddings: Optional[List[List[float]]] = None
     ) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
         """
         Search for similar documents in the vector database.
@@ -184,6 +662,7 @@ class VectorDB:
         Args:
             query: single query string or list of query strings
             n_results: number of results per query
+            query_embeddings: precomputed embeddings for the queries (skips encoding)
 
         Returns:
             If query is a string -> dict with keys: 
@@ -197,7 +676,7 @@ class VectorDB:
         
         # FIX: Handle edge case of n_results
         if n_results <= 0:
-            logger.warning(f"Invalid n_results: {n_results}, setting to 1")
+            logger.warning("Invalid n_results: %s, setting to 1", n_results)
             n_results = 1
         
         single_query = isinstance(query, str)
@@ -211,62 +690,122 @@ class VectorDB:
             return {"ids": [], "documents": [], "metadatas": [], "distances": []}
 
         try:
-            # Encode queries as list
-            logger.info(f"Searching for {len(queries)} quer{'y' if len(queries)==1 else 'ies'}...")
-            query_embeddings = self.embedding_model.encode(queries)
-            
-            # FIX: Safely convert to list
-            try:
-                emb_list = query_embeddings.tolist()
-            except Exception:
-                emb_list = list(query_embeddings)
+            # Serve repeated queries from the retrieval cache
+            cache = get_retrieval_cache()
+            use_cache = cache.max_entries > 0
+            generation = cache.generation(self.cache_namespace)
 
-            # Query the collection
-            results = self.collection.query(
-                query_embeddings=emb_list,
-                n_results=n_results,
-            )
+            qcount = len(queries)
+            out: List[Dict[str, Any]] = [None] * qcount
+            missing = []
+            for i, q in enumerate(queries):
+                cached = cache.get(self.cache_namespace, q, n_results) if use_cache else None
+                if cached is not None:
+                    out[i] = cached
+                else:
+                    missing.append(i)
+
+            if missing:
+                # Encode queries as list
+                logger.info("Searching for %d quer%s...", len(missing), "y" if len(missing)==1 else "ies")
+                if query_embeddings is not None and len(query_embeddings) == qcount:
+                    emb_list = [list(query_embeddings[i]) for i in missing]
+                else:
+                    emb_list = self.encode_queries([queries[i] for i in missing])
 
-            # Extract results
-            ids = results.get("ids", [])
-            documents = results.get("documents", [])
-            metadatas = results.get("metadatas", [])
-            distances = results.get("distances", [])
+                # Query the collection
+                with stage("search", provider="chroma"):
+                    results = self.collection.query(
+                        query_embeddings=emb_list,
+                        n_results=n_results,
+                        where=self.where,
+                    )
+
+                # Extract results
+                ids = results.get("ids", [])
+                documents = results.get("documents", [])
+                metadatas = results.get("metadatas", [])
+                distances = results.get("distances", [])
+
+                # Build output structure
+                for j, i in enumerate(missing):
+                    out[i] = {
+                        "ids": ids[j] if j < len(ids) else [],
+                        "documents": documents[j] if j < len(documents) else [],
+                        "metadatas": metadatas[j] if j < len(metadatas) else [],
+                        "distances": distances[j] if j < len(distances) else [],
+                    }
+                    if use_cache and out[i]["ids"]:
+                        cache.put(self.cache_namespace, queries[i], n_results, out[i], generation)
+            else:
+                logger.info("Retrieval cache hit for %d quer%s", qcount, "y" if qcount==1 else "ies")
 
             # FIX: Handle case where no results found
-            if not ids or not any(ids):
+            if not any(r["ids"] for r in out):
                 logger.warning("No results found for query")
                 return {"ids": [], "documents": [], "metadatas": [], "distances": []}
 
-            # Build output structure
-            qcount = len(queries)
-            out: List[Dict[str, Any]] = []
-            
-            for i in range(qcount):
-                out.append({
-                    "ids": ids[i] if i < len(ids) else [],
-                    "documents": documents[i] if i < len(documents) else [],
-                    "metadatas": metadatas[i] if i < len(metadatas) else [],
-                    "distances": distances[i] if i < len(distances) else [],
-                })
-
             result = out[0] if single_query else out
             
             # FIX: Log search results
             if single_query and result.get("documents"):
-                logger.info(f"Found {len(result['documents'])} results for query")
+                logger.info("Found %d results for query", len(result["documents"]))
             
             return result
 
         except Exception as e:
-            logger.error(f"Error during search: {e}")
+            logger.error("Error during search: %s", e)
             # Return empty results structure on error
             empty_result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
             return empty_result if single_query else [empty_result]
 
+    def search_fused(
+        self,
+        query_groups: List[List[str]],
+        n_results: int = 5,
+        query_embeddings: Optional[List[List[float]]] = None,
+        rrf_k: int = 60
+    ) -> List[Dict[str, Any]]:
+        """
+        Multi-query search: every group of sub-queries is answered with one
+        result fused by reciprocal rank fusion.
+
+        All sub-queries of all groups go through a single search() call, i.e.
+        one batched encode and one multi-query collection.query.
+
+        Args:
+            query_groups: one list of sub-queries per question
+            n_results: results per sub-query and per fused result
+            query_embeddings: precomputed embeddings for the flattened sub-queries
+            rrf_k: RRF damping constant
+
+        Returns:
+            List of fused result dicts (one per group), each shaped like a
+            search() result plus 'rrf_scores'
+        """
+        flat = [query for group in query_groups for query in group]
+        if not flat:
+            return [{"ids": [], "documents": [], "metadatas": [], "distances": []} for _ in query_groups]
+
+        results = self.search(flat, n_results=n_results, query_embeddings=query_embeddings)
+
+        # search() collapses "nothing found" (or an error) into a single empty dict
+        if isinstance(results, dict) or len(results) != len(flat):
+            results = [{}] * len(flat)
+
+        fused = []
+        offset = 0
+        for group in query_groups:
+            fused.append(reciprocal_rank_fusion(results[offset:offset + len(group)], n_results, rrf_k))
+            offset += len(group)
+
+        logger.info("Fused %d sub-queries into %d result(s)", len(flat), len(query_groups))
+        return fused
+
     def delete_collection(self) -> bool:
         """
-        Delete the current collection from ChromaDB.
+        Delete the current collection from ChromaDB. In a shared collection
+        only this instance's document's chunks are deleted.
         
         Returns:
             bool: True if successful, False otherwise
@@ -276,11 +815,18 @@ class VectorDB:
             - Reset the database
         """
         try:
+            if self.where:
+                with self._live_collection(where=self.where) as collection:
+                    collection.delete(where=self.where)
+                get_retrieval_cache().invalidate(self.cache_namespace)
+                logger.info("Deleted document %s... from %s", self.document_id[:8], self.collection_name)
+                return True
             self.client.delete_collection(name=self.collection_name)
-            logger.info(f"Deleted collection: {self.collection_name}")
+            get_retrieval_cache().invalidate(self.collection_name)
+            logger.info("Deleted collection: %s", self.collection_name)
             return True
         except Exception as e:
-            logger.error(f"Error deleting collection: {e}")
+            logger.error("Error deleting collection: %s", e)
             return False
 
     def get_collection_count(self) -> int:
@@ -288,14 +834,17 @@ class VectorDB:
         Get the number of documents in the collection.
         
         Returns:
-            int: Number of chunks in the collection
+            int: Number of chunks in the collection (of this document, in a shared one)
         """
         try:
-            count = self.collection.count()
-            logger.info(f"Collection {self.collection_name} contains {count} chunks")
+            if self.where:
+                count = len(self.collection.get(where=self.where, include=[])["ids"])
+            else:
+                count = self.collection.count()
+            logger.info("Collection %s contains %d chunks", self.collection_name, count)
             return count
         except Exception as e:
-            logger.error(f"Error getting collection count: {e}")
+            logger.error("Error getting collection count: %s", e)
             return 0
 
     def collection_exists(self) -> bool:
@@ -310,5 +859,5 @@ class VectorDB:
             exists = any(c.name == self.collection_name for c in collections)
             return exists
         except Exception as e:
-            logger.error(f"Error checking collection existence: {e}")
+            logger.error("Error checking collection existence: %s", e)
             return False
\ No newline at end of file
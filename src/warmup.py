@@ -0,0 +1,148 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from .database import RAGDatabase
+from .vectordb import default_embedding_model_name, get_chroma_client, get_embedding_model
+
+logger = logging.getLogger(__name__)
+
+# One query-sized and one chunk-sized input, so both the query and the upload path find their buffers allocated
+_WARMUP_TEXTS = ["warm-up query", "warm-up passage " * 100]
+
+
+class WarmUp:
+    """
+    Startup warm-up, run in a background thread so /health answers at once.
+
+    Loads the embedding model and runs a dummy encode (first-call JIT and
+    allocations), opens the Chroma client and then the most recently used
+    collections, each with one search so its HNSW index is read into
+    memory. /ready reports ready once this has finished. Only loading the
+    embedding model can fail the warm-up: a collection that cannot be
+    opened is logged and skipped.
+    """
+
+    def __init__(self, enabled: bool = True, collections: int = 5, db_path: str = "rag_engine.db", chroma_path: str = "./chroma_db"):
+        """
+        Args:
+            enabled: Run the warm-up (when False, ready immediately)
+            collections: Number of recently used collections to open
+            db_path: SQLite database the recent collections are read from
+            chroma_path: Chroma storage path
+        """
+        self.enabled = enabled
+        self.collections = max(0, collections)
+        self.db_path = db_path
+        self.chroma_path = chroma_path
+        self._lock = threading.Lock()
+        self._state = "pending" if enabled else "ready"
+        self._steps: Dict[str, Dict[str, Any]] = {}
+        self._error: Optional[str] = None
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "WarmUp":
+        """Build from WARMUP_ENABLED and WARMUP_COLLECTIONS."""
+        return cls(
+            enabled=os.getenv("WARMUP_ENABLED", "true").lower() == "true",
+            collections=int(os.getenv("WARMUP_COLLECTIONS", "5")),
+        )
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return self._state == "ready"
+
+    def start(self) -> None:
+        """Start the warm-up thread (once; later calls do nothing)."""
+        with self._lock:
+            if self._state != "pending":
+                return
+            self._state = "running"
+            self._started = time.time()
+        self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the warm-up has finished; True if ready."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _step(self, name: str, func: Callable[[], Dict[str, Any]]) -> None:
+        start = time.perf_counter()
+        details = func() or {}
+        seconds = round(time.perf_counter() - start, 3)
+        with self._lock:
+            self._steps[name] = dict(details, seconds=seconds)
+        logger.info("Warm-up: %s done in %.2fs", name, seconds)
+
+    def _load_embedding_model(self) -> Dict[str, Any]:
+        model_name = default_embedding_model_name()
+        model = get_embedding_model(model_name)
+        model.encode(_WARMUP_TEXTS)
+        return {"model": model_name}
+
+    def _open_client(self) -> Dict[str, Any]:
+        get_chroma_client(self.chroma_path)
+        return {}
+
+    def _recent_collections(self) -> List[str]:
+        db = RAGDatabase(self.db_path)
+        db.connect()
+        try:
+            return db.get_recent_collections(self.collections)
+        finally:
+            db.close()
+
+    def _open_collections(self) -> Dict[str, Any]:
+        names = self._recent_collections() if self.collections else []
+        embedding = get_embedding_model(default_embedding_model_name()).encode(_WARMUP_TEXTS[:1]).tolist()
+        client = get_chroma_client(self.chroma_path)
+        opened, failed = [], []
+        for name in names:
+            try:
+                # Read-only: never recreate a collection or start an index rebuild from here
+                collection = client.get_collection(name=name)
+                if collection.count():
+                    collection.query(query_embeddings=embedding, n_results=1, include=[])
+                opened.append(name)
+            except Exception as e:
+                logger.warning("Warm-up: could not open collection %s: %s", name, e)
+                failed.append(name)
+        return {"opened": opened, "failed": failed}
+
+    def run(self) -> None:
+        """Run every warm-up step in order (normally in the thread started by start())."""
+        with self._lock:
+            self._state = "running"
+            self._started = self._started or time.time()
+        logger.info("Warm-up started")
+        try:
+            self._step("embedding_model", self._load_embedding_model)
+            self._step("chroma_client", self._open_client)
+            self._step("collections", self._open_collections)
+        except Exception as e:
+            logger.error("Warm-up failed: %s", e)
+            with self._lock:
+                self._state, self._error, self._finished = "failed", str(e), time.time()
+            return
+        with self._lock:
+            self._state, self._finished = "ready", time.time()
+        logger.info("Warm-up finished in %.2fs, ready", self._finished - self._started)
+
+    def status(self) -> Dict[str, Any]:
+        """State ('pending', 'running', 'ready' or 'failed'), per-step results and timing."""
+        with self._lock:
+            status = {"status": self._state, "steps": {name: dict(step) for name, step in self._steps.items()}}
+            if self._error:
+                status["error"] = self._error
+            if self._started is not None:
+                end = self._finished if self._finished is not None else time.time()
+                status["seconds"] = round(end - self._started, 3)
+            return status
@@ -0,0 +1,50 @@
+import hashlib
+
+import numpy as np
+import pytest
+from chromadb.api.client import SharedSystemClient
+
+from src import vectordb
+
+
+class HashEmbeddings:
+    """Bag-of-words hash embeddings: deterministic, normalized, no model download."""
+
+    dim = 64
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in a scratch directory with fresh process-wide Chroma clients and caches."""
+    monkeypatch.chdir(tmp_path)
+    # Chroma keeps one system per path string, and "./chroma_db" is relative
+    SharedSystemClient.clear_system_cache()
+    monkeypatch.setattr(vectordb, "_chroma_clients", {})
+    monkeypatch.setattr(vectordb, "_retrieval_cache", None)
+    monkeypatch.setattr(vectordb, "_index_rebuilds", {})
+    monkeypatch.setattr(vectordb, "_collection_writes", {})
+    return tmp_path
+
+
+@pytest.fixture
+def hash_embeddings(monkeypatch):
+    """Replace the sentence-transformer with HashEmbeddings."""
+    model = HashEmbeddings()
+    monkeypatch.setattr(vectordb, "get_embedding_model", lambda model_name: model)
+    return model
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Enable the local fake LLM provider with no artificial latency."""
+    monkeypatch.setenv("FAKE_LLM_ENABLED", "true")
+    monkeypatch.setenv("FAKE_LLM_LATENCY_MS", "0")
+    monkeypatch.setenv("FAKE_LLM_TOKENS_PER_S", "0")
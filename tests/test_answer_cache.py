@@ -0,0 +1,47 @@
+from src.app import RAGAssistant
+
+DOCUMENT = (
+    "Refund policy: customers can ask for a refund within 30 days of purchase.\n\n"
+    "Support hours: the help desk is open from 9 to 17 on weekdays.\n\n"
+    "Data retention: account data is deleted 90 days after the account is closed.\n"
+)
+
+
+def _assistant(workdir, monkeypatch):
+    monkeypatch.setenv("CONVERSATION_HISTORY_ENABLED", "true")
+    monkeypatch.setenv("QUERY_REWRITE_ENABLED", "false")
+    assistant = RAGAssistant(require_api_key=False, model=None)
+    assistant.set_api_key("fake-key", "fake")
+    path = workdir / "policy.txt"
+    path.write_text(DOCUMENT)
+    return assistant, str(path)
+
+
+def test_follow_up_answers_are_not_shared_between_sessions(workdir, hash_embeddings, fake_llm, monkeypatch):
+    assistant, path = _assistant(workdir, monkeypatch)
+    first = assistant.upload_document(path)["session_id"]
+    second = assistant.upload_document(path)["session_id"]
+    assert first != second
+
+    assistant.query("What is the refund policy?", session_id=first)
+    answer_1 = assistant.query("and the second one?", session_id=first)
+
+    assistant.query("When is support open?", session_id=second)
+    answer_2 = assistant.query("and the second one?", session_id=second)
+
+    assert answer_1["status"] == answer_2["status"] == "success"
+    assert answer_2["cached"] is False
+    assert answer_2["answer"] != answer_1["answer"]
+
+
+def test_questions_without_history_still_share_answers(workdir, hash_embeddings, fake_llm, monkeypatch):
+    assistant, path = _assistant(workdir, monkeypatch)
+    first = assistant.upload_document(path)["session_id"]
+    second = assistant.upload_document(path)["session_id"]
+
+    answer_1 = assistant.query("What is the refund policy?", session_id=first)
+    answer_2 = assistant.query("What is the refund policy?", session_id=second)
+
+    assert answer_1["cached"] is False
+    assert answer_2["cache"] == "exact"
+    assert answer_2["answer"] == answer_1["answer"]
@@ -0,0 +1,46 @@
+import sqlite3
+
+from src.database import RAGDatabase
+
+
+class _MissFirstLookup:
+    """Cursor whose first existing-document lookup finds nothing, as if another worker inserted right after it."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._missed = False
+
+    def execute(self, sql, params=()):
+        if not self._missed and "SELECT document_id, chromadb_collection_name" in sql:
+            self._missed = True
+            sql = sql.replace("WHERE document_id = ?", "WHERE 0 AND document_id = ?")
+        return self._cursor.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def test_concurrently_registered_document_keeps_its_collection(workdir, monkeypatch):
+    monkeypatch.setenv("VECTOR_STORAGE_LAYOUT", "per_document")
+    db = RAGDatabase(str(workdir / "rag_engine.db"))
+    db.connect()
+    db.create_tables()
+    content = b"Refunds are possible within 30 days of purchase."
+    document_id = db.generate_document_id(content)
+
+    # The other worker stored it in the shared layout (or it was migrated since)
+    other = sqlite3.connect(db.db_path)
+    other.execute(
+        "INSERT INTO documents(document_id, filename, file_hash, chunk_count, chromadb_collection_name) "
+        "VALUES(?, ?, ?, ?, ?)",
+        (document_id, "policy.txt", db.compute_checksum(content), 1, "rag_shared"),
+    )
+    other.commit()
+    other.close()
+    db.cursor = _MissFirstLookup(db.cursor)
+
+    upload = db.process_file_upload(content, "policy.txt")
+
+    assert upload["was_processed"] is False
+    assert upload["collection_name"] == "rag_shared"
+    db.close()
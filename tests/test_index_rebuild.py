@@ -0,0 +1,88 @@
+import time
+import threading
+
+from src import vectordb
+from src.cache import RetrievalCache
+from src.vectordb import VectorDB, get_chroma_client
+
+
+def _wait_for_rebuild(name: str, timeout: float = 30.0) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = vectordb._index_rebuilds.get(name, {})
+        if status.get("state") in ("done", "failed"):
+            return status
+        time.sleep(0.05)
+    raise TimeoutError(f"rebuild of {name} did not finish")
+
+
+def test_writes_through_a_handle_opened_before_the_swap_are_kept(workdir, hash_embeddings, monkeypatch):
+    monkeypatch.setenv("CHROMA_HNSW_SPACE", "cosine")
+    monkeypatch.setenv("CHROMA_REBUILD_GRACE_SECONDS", "0")
+    monkeypatch.setattr(vectordb, "_hnsw_overrides", None)
+
+    # An index built with other settings: opening it starts an online rebuild
+    get_chroma_client("./chroma_db").create_collection(name="doc_rebuild", configuration={"hnsw": {"space": "l2"}})
+    stale = VectorDB(collection_name="doc_rebuild")
+    assert _wait_for_rebuild("doc_rebuild")["state"] == "done"
+    time.sleep(0.2)  # the retired index is dropped after the (zero) grace period
+
+    added = stale.add_document("Refunds are possible within 30 days of purchase.", document_id="late_doc")
+
+    assert added == 1
+    fresh = VectorDB(collection_name="doc_rebuild")
+    assert fresh.get_collection_count() == 1
+    assert fresh.collection.configuration["hnsw"]["space"] == "cosine"
+
+
+def test_writes_made_while_rows_are_copied_reach_the_new_index(workdir, hash_embeddings, monkeypatch):
+    monkeypatch.setenv("CHROMA_REBUILD_GRACE_SECONDS", "0")
+    monkeypatch.setattr(vectordb, "_hnsw_overrides", None)
+    monkeypatch.setenv("CHROMA_HNSW_SPACE", "l2")
+    for document_id, text in (("policy", "Refunds within 30 days."), ("old", "Shipping takes a week.")):
+        VectorDB(collection_name="rag_shared", document_id=document_id).add_document(text, document_id=document_id)
+
+    # Pause the rebuild right after its bulk copy, so the writes below land on the old index only
+    copied, resume = threading.Event(), threading.Event()
+    copy_rows = vectordb._copy_rows
+
+    def copy_then_pause(source, target, ids=None, **kwargs):
+        rows = copy_rows(source, target, ids=ids, **kwargs)
+        if ids is None:
+            copied.set()
+            resume.wait(10)
+        return rows
+
+    monkeypatch.setattr(vectordb, "_copy_rows", copy_then_pause)
+    monkeypatch.setenv("CHROMA_HNSW_SPACE", "cosine")
+    db = VectorDB(collection_name="rag_shared", document_id="policy")
+    assert copied.wait(10)
+    embedding = hash_embeddings.encode(["Refunds within 60 days."]).tolist()
+    with db._live_collection(ids=["policy_chunk_0"]) as collection:
+        collection.upsert(ids=["policy_chunk_0"], embeddings=embedding, documents=["Refunds within 60 days."])
+    VectorDB(collection_name="rag_shared", document_id="support").add_document("Support is open on weekdays.", document_id="support")
+    VectorDB(collection_name="rag_shared", document_id="old").delete_collection()
+    resume.set()
+    assert _wait_for_rebuild("rag_shared")["state"] == "done"
+
+    fresh = VectorDB(collection_name="rag_shared")
+    assert fresh.collection.configuration["hnsw"]["space"] == "cosine"
+    rows = fresh.collection.get()
+    assert dict(zip(rows["ids"], rows["documents"])) == {
+        "policy_chunk_0": "Refunds within 60 days.",
+        "support_chunk_0": "Support is open on weekdays.",
+    }
+
+
+def test_invalidating_a_collection_covers_its_document_namespaces():
+    cache = RetrievalCache(max_entries=10)
+    result = {"ids": ["a"], "documents": ["text"], "metadatas": [{}], "distances": [0.1]}
+    generation = cache.generation("rag_shared/doc1")
+    cache.put("rag_shared/doc1", "question", 3, result, generation)
+
+    cache.invalidate("rag_shared")
+
+    assert cache.get("rag_shared/doc1", "question", 3) is None
+    # A search that started before the invalidation can't bring the old result back
+    cache.put("rag_shared/doc1", "question", 3, result, generation)
+    assert cache.get("rag_shared/doc1", "question", 3) is None
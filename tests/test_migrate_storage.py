@@ -0,0 +1,33 @@
+from src.database import RAGDatabase
+from src.migrate_storage import migrate
+from src.vectordb import VectorDB, get_chroma_client
+
+TEXT = "Refunds are possible within 30 days of purchase."
+
+
+def test_migration_moves_documents_and_spares_rebuild_collections(workdir, hash_embeddings, monkeypatch):
+    monkeypatch.setenv("VECTOR_STORAGE_LAYOUT", "per_document")
+    db = RAGDatabase("rag_engine.db")
+    db.connect()
+    db.create_tables()
+    upload = db.process_file_upload(TEXT.encode(), "policy.txt")
+    VectorDB(collection_name=upload["collection_name"]).add_document(TEXT, upload["document_id"])
+    db.close()
+
+    client = get_chroma_client("./chroma_db")
+    # Left behind by an online index rebuild that is still in its grace period / still building
+    client.create_collection(name="doc_0123456789abcdef-retired-1a2b3c4d")
+    client.create_collection(name="doc_0123456789abcdef-rebuild-5e6f7a8b")
+
+    summary = migrate(shared_name="rag_shared", shards=1, delete_old=True)
+
+    assert summary["migrated"] == 1 and summary["failed"] == 0
+    assert summary["deleted"] == 1
+    names = {collection.name for collection in client.list_collections()}
+    assert names == {
+        "rag_shared",
+        "doc_0123456789abcdef-retired-1a2b3c4d",
+        "doc_0123456789abcdef-rebuild-5e6f7a8b",
+    }
+    moved = VectorDB(collection_name="rag_shared", document_id=upload["document_id"])
+    assert moved.get_collection_count() == 1
@@ -0,0 +1,21 @@
+from src.app import RAGAssistant
+
+
+def test_per_request_keys_keep_their_provider_pool(workdir, fake_llm, monkeypatch):
+    monkeypatch.setenv("LLM_CLIENT_POOL_MAX", "2")
+    assistant = RAGAssistant(require_api_key=False, model=None)
+
+    first, model = assistant._resolve_llm("key-a", "fake")
+    again, _ = assistant._resolve_llm("key-a", "fake")
+    other, _ = assistant._resolve_llm("key-b", "fake")
+
+    assert model == "fake"
+    assert first is again
+    assert other is not first
+    stats = assistant.key_pool_stats()
+    assert [(entry["provider"], entry["model"]) for entry in stats] == [("fake", "fake"), ("fake", "fake")]
+    assert all("key-" not in str(entry) for entry in stats)
+
+    # Least recently used pools are dropped beyond LLM_CLIENT_POOL_MAX
+    assistant._resolve_llm("key-c", "fake")
+    assert assistant._resolve_llm("key-a", "fake")[0] is not first
@@ -0,0 +1,50 @@
+import asyncio
+
+from src.concurrency import SingleFlight
+
+
+def test_followers_take_over_when_the_async_leader_is_cancelled():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = []
+        started = asyncio.Event()
+
+        async def work():
+            calls.append(1)
+            started.set()
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        leader = asyncio.create_task(flight.do_async("key", work))
+        await started.wait()
+        followers = [asyncio.create_task(flight.do_async("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        return leader, results, len(calls), flight.stats()
+
+    leader, results, executions, stats = asyncio.run(scenario())
+
+    assert leader.cancelled()
+    # One follower re-ran the call, the other shared its result
+    assert sorted(results, key=lambda result: result[1]) == [(2, False), (2, True)]
+    assert executions == 2
+    assert stats["executions"] == 2
+    assert stats["coalesced"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_async_followers_share_the_leaders_result():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        return await asyncio.gather(*(flight.do_async("key", work) for _ in range(3)))
+
+    results = asyncio.run(scenario())
+
+    assert sorted(results, key=lambda result: result[1]) == [("answer", False), ("answer", True), ("answer", True)]